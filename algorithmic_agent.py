@@ -11,12 +11,41 @@ No LLM decision-making - pure algorithmic approach.
 """
 
 import os
+import re
 import json
+import argparse
 import sqlite3
 import logging
 from pathlib import Path
 from typing import List, Dict, Optional, Tuple
-from search import find_definition, find_theorem, find_definition_by_term, find_theorem_by_name
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from search import (
+    find_definitions_batch, find_theorems_batch, resolve_definition, resolve_theorem,
+    find_exact_definition, find_exact_theorem, cluster_definitions, cluster_theorems, shortlist_definitions,
+    shortlist_theorems,
+    index_definition, index_theorem
+)
+from search_index import forget_indexes, save_indexes
+from term_linker import (
+    TermLinker, TheoremNameLinker, THEOREM_WORD, get_term_linker, get_theorem_linker, forget_term_linkers,
+    term_stems, theorem_name_forms, mention_span
+)
+from mention_index import index_item, ensure_mention_index, items_mentioning
+from lsh_index import add_item as add_to_lsh, ensure_lsh_index
+from pipeline import LecturePipeline
+from llm_cache import get_verdict_cache
+from calibration import get_calibration
+from text_processing import normalize_key, split_overlapping
+from db import get_connection, transaction
+from create_database import migrate_database
+from edge_buffer import EdgeBuffer
+from lecture_reader import iter_items
+from manifest import (
+    STATUS_DONE, STATUS_INSERTED, file_hash, get_entry, start_file, checkpoint_file, finish_file, fail_file,
+    insert_file, finish_linking,
+    item_hash, get_item_ids, reset_items, record_items
+)
+from llm_gateway import get_gateway, estimate_tokens, CHARS_PER_TOKEN
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -32,14 +61,48 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Items written between two checkpoints of a lecture file (see manifest.py)
+CHECKPOINT_ITEMS = 25
+
+# Ways to find connections: LLM prompts, literal term mentions, or mentions first and the LLM for ambiguous ones
+LINKERS = ('llm', 'terms', 'hybrid')
+
+# Token budget of one batched connection prompt; larger batches are split in halves
+LINK_PROMPT_TOKENS = int(os.getenv("LINK_PROMPT_TOKENS", 6000))
+
+# Proof analysis: chunk size and overlap, prompt tokens one theorem's proof may use, parallel LLM calls
+PROOF_CHUNK_TOKENS = int(os.getenv("PROOF_CHUNK_TOKENS", 800))
+PROOF_CHUNK_OVERLAP_TOKENS = int(os.getenv("PROOF_CHUNK_OVERLAP_TOKENS", 100))
+PROOF_TOKEN_BUDGET = int(os.getenv("PROOF_TOKEN_BUDGET", 8000))
+PROOF_WORKERS = int(os.getenv("PROOF_WORKERS", 4))
+
 class AlgorithmicAgent:
     """Deterministic agent that processes mathematical content algorithmically."""
     
-    def __init__(self, db_name: str = 'math_base.db', lectures_dir: str = 'parsed_lections'):
+    def __init__(self, db_name: str = 'math_base.db', lectures_dir: str = 'parsed_lections', workers: int = 1,
+                 pipeline: bool = False, linker: str = 'llm', link_batch_size: int = 1,
+                 analyze_proofs: bool = False):
         self.db_name = db_name
         self.lectures_dir = lectures_dir
+        # Number of files read and checked against the database in parallel
+        self.workers = max(1, workers)
+        # Run the stages as an asyncio pipeline (see pipeline.py)
+        self.pipeline = pipeline
+        # How connections are found: 'llm', 'terms' (term_linker.py only) or 'hybrid'
+        if linker not in LINKERS:
+            raise ValueError(f"Unknown linker '{linker}', expected one of {LINKERS}")
+        self.linker = linker
+        # Number of new items analyzed for connections in one LLM request
+        self.link_batch_size = max(1, link_batch_size)
+        # Ask the LLM for the definitions and theorems used in the proofs of new theorems
+        if analyze_proofs and linker == 'terms':
+            logger.warning("Proof analysis uses the LLM and is skipped with the 'terms' linker, "
+                           "which already links term mentions in proofs")
+        self.analyze_proofs = analyze_proofs and linker != 'terms'
         self.stats = {
             'files_processed': 0,
+            'files_unchanged': 0,
+            'items_unchanged': 0,
             'definitions_processed': 0,
             'definitions_added': 0,
             'definitions_duplicates': 0,
@@ -51,6 +114,22 @@ class AlgorithmicAgent:
         # Track newly added items for connection analysis
         self.newly_added_definitions = []  # Store newly added definition data
         self.newly_added_theorems = []     # Store newly added theorem data
+        # Edges found in the current file, written in bulk at its end
+        self.edges = EdgeBuffer()
+        # Times queued edges were dropped; a file linked across a drop is not marked done
+        self.edge_resets = 0
+        # Checkpoint state of the file being written (see _write_file)
+        self._checkpoint = None
+    
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Long-lived connection of this thread, shared with the lookups in search.py."""
+        return get_connection(self.db_name)
+    
+    @property
+    def _verifies_while_preparing(self) -> bool:
+        """Whether duplicate candidates are verified before the file reaches the writer."""
+        return self.workers > 1 or self.pipeline
     
     def run(self):
         """Main algorithmic workflow."""
@@ -65,9 +144,22 @@ class AlgorithmicAgent:
         
         logger.info(f"Found {len(lecture_files)} lecture files to process")
         
+        # Older databases get the current schema (key columns, manifest, indexes) before the first insert
+        migrate_database(self.conn)
+        # Items stored before the mention index and the LSH buckets existed are indexed once
+        ensure_mention_index(self.conn)
+        ensure_lsh_index(self.conn)
+        
         # Step 2: Process each file systematically
-        for file_path in lecture_files:
-            self._process_file(file_path)
+        if self.pipeline:
+            LecturePipeline(self, workers=self.workers).run(lecture_files)
+        elif self.workers > 1:
+            self._run_parallel(lecture_files)
+        else:
+            for file_path in lecture_files:
+                self._process_file(file_path)
+                # Persist search indexes so the next run does not rebuild them
+                save_indexes()
         
         # Step 3: Report final statistics
         self._report_final_stats()
@@ -86,272 +178,894 @@ class AlgorithmicAgent:
             logger.error(f"Error reading lectures directory: {e}")
             return []
     
+    def _run_parallel(self, lecture_files: List[str]):
+        """
+        Prepare files on a pool of worker threads (parsing, candidate retrieval and LLM
+        verification against the committed database) while this thread is the only
+        writer: it re-checks each item against rows inserted since the worker's
+        snapshot, inserts new items and links them, one transaction per file.
+        """
+        logger.info(f"Preparing files with {self.workers} workers")
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='lecture') as pool:
+            futures = {pool.submit(self._prepare_file, file_path): file_path for file_path in lecture_files}
+            for future in as_completed(futures):
+                file_path = futures[future]
+                try:
+                    prepared = future.result()
+                except Exception as e:
+                    logger.error(f"Error preparing file {file_path}: {e}")
+                    prepared = None
+                self._write_file(file_path, prepared)
+                # Persist search indexes so the next run does not rebuild them
+                save_indexes()
+    
     def _process_file(self, file_path: str):
         """Process a single JSON file algorithmically."""
-        logger.info(f"📂 Processing file: {file_path}")
-        self.stats['files_processed'] += 1
-        
+        self._write_file(file_path, self._prepare_file(file_path))
+    
+    def _read_items(self, file_path: str) -> Optional[Tuple[List[Dict], List[Dict]]]:
+        """
+        Stream the definitions and theorems of a lecture file (see lecture_reader.py) and
+        collect them. The items of one file are held in memory on purpose: copy clustering
+        (cluster_definitions) compares every item of the file with all the others in one
+        similarity matrix, and the duplicate lookup of the file runs as one batch. Only the
+        raw JSON of the file is never loaded whole. Returns None if the file cannot be read.
+        """
         try:
             # Check if file exists and has content
             if not os.path.exists(file_path):
                 logger.error(f"File not found: {file_path}")
-                return
-                
-            # Check if file is empty
+                return None
             if os.path.getsize(file_path) == 0:
                 logger.warning(f"Empty file: {file_path}, skipping")
-                return
+                return None
             
-            # Try multiple encodings
-            for encoding in ['utf-8', 'latin1', 'cp1251']:
-                try:
-                    with open(file_path, 'r', encoding=encoding) as f:
-                        # Handle empty or malformed JSON
-                        try:
-                            data = json.load(f)
-                            # If we reach here, the file loaded successfully
-                            logger.info(f"Successfully loaded {file_path} with {encoding} encoding")
-                            break
-                        except json.JSONDecodeError as je:
-                            logger.error(f"Invalid JSON in {file_path} with encoding {encoding}: {je}")
-                            continue
-                except UnicodeDecodeError:
-                    # Try the next encoding
-                    logger.warning(f"Encoding {encoding} failed for {file_path}, trying another")
-                    continue
+            definitions = []
+            theorems = []
+            for kind, item in iter_items(file_path):
+                (definitions if kind == 'definition' else theorems).append(item)
+            logger.info(f"Successfully loaded {file_path}: {len(definitions)} definitions, {len(theorems)} theorems")
+            return definitions, theorems
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to read {file_path}, skipping file: {e}")
+            return None
+    
+    def _prepare_file(self, file_path: str) -> Optional[Dict]:
+        """
+        Read a file and check its items against the committed database.
+        Does not write, so several files can be prepared at the same time.
+        Returns None if the file cannot be read.
+        """
+        logger.info(f"📂 Processing file: {file_path}")
+        state = self._check_manifest(file_path)
+        if state is None or state['unchanged']:
+            return state
+        
+        items = self._read_items(file_path)
+        if items is None:
+            return None
+        
+        definitions, theorems = items
+        return self._prepare_items(state, definitions, theorems)
+    
+    def _check_manifest(self, file_path: str) -> Optional[Dict]:
+        """
+        Compare a file with its manifest entry. Returns the content hash, whether the file
+        is unchanged since it was fully processed and, for a file that failed part way, the
+        position to resume from and the IDs it added before. Returns None if it cannot be read.
+        """
+        content_hash = file_hash(file_path)
+        if content_hash is None:
+            return None
+        
+        entry = get_entry(self.conn, file_path)
+        same_content = entry is not None and entry['content_hash'] == content_hash
+        if same_content and entry['status'] == STATUS_DONE:
+            logger.info(f"⏭️  Unchanged since the last run, skipping {file_path}")
+            return {'content_hash': content_hash, 'unchanged': True}
+        
+        # Items already ingested from an earlier version of the file are not processed again
+        state = {'content_hash': content_hash, 'unchanged': False, 'start': 0, 'added_ids': {},
+                 'known_items': get_item_ids(self.conn, file_path)}
+        if same_content and entry['next_item']:
+            if entry['status'] == STATUS_INSERTED:
+                logger.info(f"↩️  {file_path} was inserted but not linked, linking its items again")
             else:
-                # If we get here, all encodings failed
-                logger.error(f"Failed to decode {file_path} with any encoding, skipping file")
-                return
+                logger.info(f"↩️  Resuming {file_path} from item {entry['next_item']}")
+            state.update(start=entry['next_item'], added_ids=entry['added_ids'])
+        return state
+    
+    def _prepare_items(self, state: Dict, definitions: List[Dict], theorems: List[Dict]) -> Dict:
+        """
+        Check the collected items of a file, skipping the ones committed before a failure
+        and the ones unchanged since the file was last ingested.
+        Items are numbered definitions first, then theorems.
+        """
+        start, known = state['start'], state['known_items']
+        return dict(
+            state,
+            definitions=self._prepare_definitions(definitions, start, known),
+            theorems=self._prepare_theorems(theorems, max(0, start - len(definitions)), offset=len(definitions),
+                                            known=known),
+        )
+    
+    def _write_file(self, file_path: str, prepared: Optional[Dict], link: bool = True):
+        """
+        Insert the new items of a prepared file and, unless `link` is False, link them.
+        The writes are committed at the end and at a checkpoint every CHECKPOINT_ITEMS items,
+        together with the file's manifest entry. Returns the definitions and theorems added
+        from this file, or None if the file could not be read or was rolled back.
+        """
+        self.stats['files_processed'] += 1
+        if prepared is None:
+            return None
+        if prepared['unchanged']:
+            self.stats['files_unchanged'] += 1
+            return [], []
+        
+        # A failure rolls back to the last checkpoint; the manifest keeps its position
+        added_before = len(self.newly_added_definitions), len(self.newly_added_theorems)
+        self._checkpoint = {'file_path': file_path, 'added_before': added_before,
+                            'stats': dict(self.stats), 'items': 0}
+        try:
+            with transaction(self.db_name):
+                start_file(self.conn, file_path, prepared['content_hash'], prepared['start'],
+                           prepared['added_ids'])
+                self._record_unchanged(file_path, prepared)
+                # Items committed before a failure are linked together with the rest of the file
+                self._restore_added(prepared['added_ids'])
+                
+                # Process definitions first, then theorems
+                if prepared['definitions']['items']:
+                    logger.info(f"   📝 Processing {len(prepared['definitions']['items'])} definitions...")
+                    self._write_definitions(prepared['definitions'])
+                if prepared['theorems']['items']:
+                    logger.info(f"   🔍 Processing {len(prepared['theorems']['items'])} theorems...")
+                    self._write_theorems(prepared['theorems'])
+                
+                # After processing all items, analyze connections for newly added items
+                if link:
+                    logger.info(f"   🔗 Finding connections...")
+                    self._find_connections_for_new_items(self.newly_added_theorems[added_before[1]:],
+                                                         self.newly_added_definitions[added_before[0]:])
+                    self.edges.flush(self.conn)
+                item_count = prepared['definitions']['count'] + prepared['theorems']['count']
+                added_ids = self._added_ids()
+                if link or not any(added_ids.values()):
+                    finish_file(self.conn, file_path, item_count)
+                else:
+                    # The link stage marks the file done in the transaction that writes its edges
+                    insert_file(self.conn, file_path, item_count, added_ids)
         except Exception as e:
-            logger.error(f"Error reading file {file_path}: {e}")
-            return
+            logger.error(f"Error processing {file_path}, changes rolled back to the last checkpoint: {e}")
+            # Connections of earlier files may be counted concurrently when linking runs separately
+            self.stats.update({key: value for key, value in self._checkpoint['stats'].items()
+                               if link or key != 'connections_created'})
+            if link:
+                self.edges.reset()
+            # Rolled back rows were already indexed; reload the indexes from disk
+            forget_indexes(self.db_name)
+            forget_term_linkers(self.db_name)
+            # Rows committed at a checkpoint are linked when the file is resumed
+            del self.newly_added_definitions[added_before[0]:]
+            del self.newly_added_theorems[added_before[1]:]
+            self._mark_failed(file_path)
+            return None
+        finally:
+            self._checkpoint = None
         
-        # Handle various JSON structures with flexible nested data
-        logger.info(f"   Parsing JSON structure...")
+        logger.info(f"✅ Completed processing {file_path}")
+        return self.newly_added_definitions[added_before[0]:], self.newly_added_theorems[added_before[1]:]
+    
+    def _added_ids(self) -> Dict[str, List[int]]:
+        """IDs added from the file being written, including the ones restored on resume."""
+        added_before = self._checkpoint['added_before']
+        return {
+            'definitions': [item['id'] for item in self.newly_added_definitions[added_before[0]:]],
+            'theorems': [item['id'] for item in self.newly_added_theorems[added_before[1]:]],
+        }
+    
+    def _maybe_checkpoint(self, next_item: int):
+        """Commit the file's writes so far every CHECKPOINT_ITEMS items, recording where to resume."""
+        if self._checkpoint is None:
+            return
+        self._checkpoint['items'] += 1
+        if self._checkpoint['items'] < CHECKPOINT_ITEMS:
+            return
+        checkpoint_file(self.conn, self._checkpoint['file_path'], next_item, self._added_ids())
+        self.conn.commit()
+        self._checkpoint.update(stats=dict(self.stats), items=0)
+        logger.info(f"   💾 Checkpoint at item {next_item}")
+    
+    def _restore_added(self, added_ids: Dict[str, List[int]]):
+        """Reload the rows a resumed file added before it failed, so they get linked."""
+        definition_ids = added_ids.get('definitions') or []
+        theorem_ids = added_ids.get('theorems') or []
+        if definition_ids:
+            placeholders = ', '.join('?' * len(definition_ids))
+            rows = self.conn.execute(
+                f"SELECT id, term_ru, definition_ru FROM definitions WHERE id IN ({placeholders}) ORDER BY id",
+                definition_ids
+            ).fetchall()
+            self.newly_added_definitions.extend(
+                {'id': row[0], 'term_ru': row[1], 'definition_ru': row[2]} for row in rows
+            )
+        if theorem_ids:
+            placeholders = ', '.join('?' * len(theorem_ids))
+            rows = self.conn.execute(
+                f"SELECT id, name_ru, statement_ru FROM theorems WHERE id IN ({placeholders}) ORDER BY id",
+                theorem_ids
+            ).fetchall()
+            self.newly_added_theorems.extend(
+                {'id': row[0], 'name_ru': row[1], 'statement_ru': row[2]} for row in rows
+            )
+    
+    def _record_unchanged(self, file_path: str, prepared: Dict):
+        """Move the provenance of items unchanged since the last ingestion to their new positions."""
+        if not prepared['start']:
+            # Provenance of the earlier version is rewritten; a resumed file keeps its committed part
+            reset_items(self.conn, file_path)
+        unchanged = prepared['definitions']['unchanged'] + prepared['theorems']['unchanged']
+        if unchanged:
+            logger.info(f"   ⏭️  {len(unchanged)} items unchanged since the last run")
+            self.stats['items_unchanged'] += len(unchanged)
+            record_items(self.conn, file_path, unchanged)
+    
+    def _mark_failed(self, file_path: str):
+        """Record a failed file in the manifest so the next run resumes it."""
+        try:
+            with transaction(self.db_name):
+                fail_file(self.conn, file_path)
+        except Exception as e:
+            logger.error(f"Error updating the manifest entry of {file_path}: {e}")
+    
+    def _flush_edges(self, file_path: Optional[str] = None, resets: Optional[int] = None):
+        """
+        Write the buffered connections in their own transaction. With `file_path`, an
+        inserted file is marked done in the same transaction, unless queued edges were
+        dropped since `resets` (the value of edge_resets when its linking started).
+        """
+        try:
+            with transaction(self.db_name):
+                self.edges.flush(self.conn)
+                if file_path is not None and resets == self.edge_resets:
+                    finish_linking(self.conn, file_path)
+        except Exception as e:
+            logger.error(f"Error writing connections, changes rolled back: {e}")
+            self.edges.reset()
+            self.edge_resets += 1
+    
+    def _find_connections_for_new_items(self, theorems: List[Dict], definitions: List[Dict]):
+        """Find connections only for the theorems and definitions added from the current file."""
+        theorem_jobs, definition_jobs = self._plan_links(theorems, definitions)
         
-        # CASE 1: Array with data field containing list of outputs
-        if isinstance(data, list) and len(data) > 0 and isinstance(data[0], dict) and 'data' in data[0]:
-            logger.info(f"   Found outer array with 'data' field")
-            data_items = data[0].get('data', [])
-            
-            for i, item in enumerate(data_items, 1):
-                logger.info(f"   Processing data item {i}/{len(data_items)}")
-                if 'output' in item:
-                    output = item['output']
-                    
-                    # Process definitions first (one by one)
-                    if 'definitions' in output and output['definitions']:
-                        logger.info(f"   📝 Processing {len(output['definitions'])} definitions...")
-                        for definition in output['definitions']:
-                            self._process_definition(definition)
-                    
-                    # Process theorems (one by one)  
-                    if 'theorems' in output and output['theorems']:
-                        logger.info(f"   🔍 Processing {len(output['theorems'])} theorems...")
-                        for theorem in output['theorems']:
-                            self._process_theorem(theorem)
-        
-        # CASE 2: Standard array of items with output field
-        elif isinstance(data, list):
-            logger.info(f"   Found standard array structure")
-            for i, item in enumerate(data, 1):
-                logger.info(f"   Processing item {i}/{len(data)}")
-                if 'output' in item:
-                    output = item['output']
-                    
-                    # Process definitions first (one by one)
-                    if 'definitions' in output and output['definitions']:
-                        logger.info(f"   📝 Processing {len(output['definitions'])} definitions...")
-                        for definition in output['definitions']:
-                            self._process_definition(definition)
-                    
-                    # Process theorems (one by one)  
-                    if 'theorems' in output and output['theorems']:
-                        logger.info(f"   🔍 Processing {len(output['theorems'])} theorems...")
-                        for theorem in output['theorems']:
-                            self._process_theorem(theorem)
-        
-        # CASE 3: Single object with direct definitions/theorems
+        # Several items share one request and one candidate list
+        if self.link_batch_size > 1:
+            batches = self._link_batches(theorem_jobs, definition_jobs)
+            if batches:
+                logger.info(f"🔗 Analyzing {sum(len(batch) for batch in batches)} new items for connections "
+                            f"in {len(batches)} requests...")
+            for batch in batches:
+                self._analyze_batch_for_connections(batch)
         else:
-            logger.info(f"   Found single object structure")
-            # Process definitions first (one by one)
-            if 'definitions' in data and data['definitions']:
-                logger.info(f"   📝 Processing {len(data['definitions'])} definitions...")
-                for definition in data['definitions']:
-                    self._process_definition(definition)
+            # Analyze newly added theorems for connections to definitions
+            if theorem_jobs:
+                logger.info("🔗 Starting connection analysis for newly added theorems...")
+                for theorem, definitions in theorem_jobs:
+                    logger.info(f"   🔗 Analyzing theorem: '{theorem['name_ru']}'")
+                    self._analyze_theorem_text_for_connections(theorem['id'], theorem['statement_ru'], 'statement',
+                                                               definitions)
             
-            # Process theorems (one by one)
-            if 'theorems' in data and data['theorems']:
-                logger.info(f"   🔍 Processing {len(data['theorems'])} theorems...")
-                for theorem in data['theorems']:
-                    self._process_theorem(theorem)
+            # Analyze newly added definitions for connections to existing definitions
+            if definition_jobs:
+                logger.info("🔗 Starting connection analysis for newly added definitions...")
+                self._analyze_new_definitions_for_connections(definition_jobs)
         
-        # After processing all items, analyze connections for newly added items
-        logger.info(f"   🔗 Finding connections...")
-        self._find_connections_for_new_items()
+        # References to other theorems by name; the LLM only picks among same-named theorems
+        for job in self._link_theorem_names(theorems):
+            self._resolve_theorem_mention(job)
         
-        logger.info(f"✅ Completed processing {file_path}")
+        # Analyze the proofs of newly added theorems chunk by chunk
+        if self.analyze_proofs:
+            self._analyze_proofs_for_connections(self._plan_proof_links(theorems))
+        
+        logger.info("✅ Connection analysis completed")
     
-    def _find_connections_for_new_items(self):
-        """Find connections only for newly added theorems and definitions."""
-        # Analyze newly added theorems for connections to definitions
-        if self.newly_added_theorems:
-            logger.info("🔗 Starting connection analysis for newly added theorems...")
-            for theorem in self.newly_added_theorems:
-                name_ru = theorem['name_ru']
-                statement_ru = theorem['statement_ru']
-                
-                logger.info(f"   🔗 Analyzing theorem: '{name_ru}'")
-                
-                # Analyze statement for connections (more selective)
-                if statement_ru and len(statement_ru) > 50:
-                    self._analyze_theorem_text_for_connections(theorem['id'], statement_ru, 'statement')
+    def _plan_links(self, theorems: List[Dict], definitions: List[Dict]) -> Tuple[List[Tuple[Dict, List[Dict]]],
+                                                                                  List[Tuple[Dict, List[Dict]]]]:
+        """
+        Decide which new theorems and definitions are sent to the LLM for connection analysis,
+        and which definitions each prompt offers. With the term linker ('terms' or 'hybrid'),
+        literal term mentions become edges right here; in hybrid mode only items with an
+        ambiguous mention go to the LLM, offered the candidates of that mention.
+        Existing items that mention the terms of new definitions are linked again, to those
+        new definitions only.
         
-        # Analyze newly added definitions for connections to existing definitions
-        if self.newly_added_definitions:
-            logger.info("🔗 Starting connection analysis for newly added definitions...")
-            self._analyze_new_definitions_for_connections()
+        Returns:
+            tuple: (theorem, definitions) pairs and (definition, definitions) pairs for the LLM
+        """
+        new_ids = {definition['id'] for definition in definitions}
+        if self.linker == 'llm':
+            # An existing item is offered just the new definitions it mentions
+            old_theorems, old_definitions = self._items_mentioning_new_terms(theorems, definitions, proofs=False)
+            # Analyze statement for connections (more selective)
+            theorems = self._theorems_to_link(theorems)
+            theorem_shortlists, definition_shortlists = self._link_shortlists(theorems, definitions)
+            theorem_jobs = list(zip(theorems, theorem_shortlists))
+            theorem_jobs.extend((theorem, [new for new in definitions if new['id'] in mentioned])
+                                for theorem, mentioned in old_theorems)
+            definition_jobs = list(zip(definitions, definition_shortlists))
+            definition_jobs.extend((definition, [new for new in definitions if new['id'] in mentioned])
+                                   for definition, mentioned in old_definitions)
+            return theorem_jobs, definition_jobs
         
-        logger.info("✅ Connection analysis completed")
+        theorem_jobs, definition_jobs = self._link_terms(theorems, definitions)
+        old_theorems, old_definitions = self._items_mentioning_new_terms(theorems, definitions, proofs=True)
+        if old_theorems or old_definitions:
+            old_theorem_jobs, old_definition_jobs = self._link_terms(
+                [theorem for theorem, _ in old_theorems], [definition for definition, _ in old_definitions],
+                only_ids=new_ids
+            )
+            theorem_jobs.extend(old_theorem_jobs)
+            definition_jobs.extend(old_definition_jobs)
+        if self.linker == 'terms':
+            if theorem_jobs or definition_jobs:
+                logger.info(f"   ⏭️  {len(theorem_jobs) + len(definition_jobs)} items with ambiguous mentions left unlinked")
+            return [], []
+        return theorem_jobs, definition_jobs
+    
+    def _link_terms(self, theorems: List[Dict], definitions: List[Dict],
+                    only_ids: Optional[set] = None) -> Tuple[List[Tuple[Dict, List[Dict]]], List[Tuple[Dict, List[Dict]]]]:
+        """
+        Create edges for the definition terms literally mentioned in theorems (statement
+        and proof) and definitions, found by the term linker without the LLM. With `only_ids`,
+        only mentions of those definitions count (used to re-link existing items).
+        Returns the items with ambiguous mentions in their statement or definition text,
+        each with the candidate definitions of those mentions.
+        """
+        term_linker = get_term_linker(self.db_name)
+        proofs = self._get_proofs([theorem['id'] for theorem in theorems])
+        connections_created = 0
+        theorem_candidates, definition_candidates = [], []
+        
+        def link(text, exclude_id=None):
+            found, ambiguous = term_linker.link(text, exclude_id=exclude_id)
+            if only_ids is None:
+                return found, ambiguous
+            return ([definition_id for definition_id in found if definition_id in only_ids],
+                    [candidates for candidates in ambiguous if only_ids.intersection(candidates)])
+        
+        for theorem in theorems:
+            found, ambiguous = link(theorem['statement_ru'])
+            proof_found, _ = link(proofs.get(theorem['id']))
+            for definition_ids, context in ((found, 'statement'), (proof_found, 'proof')):
+                for definition_id in definition_ids:
+                    # Edges already stored or queued are skipped
+                    if self.edges.add(self.conn, 'theorem_definition', theorem['id'], definition_id, context):
+                        connections_created += 1
+            if ambiguous:
+                theorem_candidates.append((theorem, ambiguous))
+        
+        for definition in definitions:
+            found, ambiguous = link(definition['definition_ru'], exclude_id=definition['id'])
+            for definition_id in found:
+                if self.edges.add(self.conn, 'definition_definition', definition['id'], definition_id):
+                    connections_created += 1
+            if ambiguous:
+                definition_candidates.append((definition, ambiguous))
+        
+        if connections_created > 0:
+            logger.info(f"      🔗 Created {connections_created} connections from term mentions")
+            self.stats['connections_created'] += connections_created
+        
+        candidate_ids = {definition_id for _, ambiguous in theorem_candidates + definition_candidates
+                         for candidates in ambiguous for definition_id in candidates}
+        rows = self._get_definitions_by_id(candidate_ids)
+        
+        def with_rows(items):
+            pairs = []
+            for item, ambiguous in items:
+                candidate_ids = dict.fromkeys(definition_id for candidates in ambiguous for definition_id in candidates)
+                pairs.append((item, [rows[definition_id] for definition_id in candidate_ids if definition_id in rows]))
+            return pairs
+        
+        return with_rows(theorem_candidates), with_rows(definition_candidates)
     
-    def _process_definition(self, definition: Dict):
-        """Process a single definition algorithmically."""
-        # Handle both 'term_ru' and 'term' field names
-        term_ru = definition.get('term_ru') or definition.get('term', '').strip()
-        definition_ru = definition.get('definition_ru') or definition.get('definition', '').strip()
+    def _items_mentioning_new_terms(self, theorems: List[Dict], definitions: List[Dict],
+                                    proofs: bool) -> Tuple[List[Tuple[Dict, set]], List[Tuple[Dict, set]]]:
+        """
+        Find the existing theorems and definitions that mention the terms of new definitions:
+        the mention index narrows them down to items containing every word of a new term, and a
+        term linker of the new terms alone confirms the phrase. Items added in this step are skipped.
         
-        if not term_ru or not definition_ru:
-            logger.warning(f"      Skipping incomplete definition")
+        Args:
+            theorems (list): New theorems (already linked to every definition)
+            definitions (list): New definitions
+            proofs (bool): Whether a mention in a theorem's proof counts, not only in its statement
+        
+        Returns:
+            tuple: (theorem, IDs of new definitions it mentions) pairs and the same for definitions
+        """
+        if not definitions:
+            return [], []
+        skip = {'theorem': {theorem['id'] for theorem in theorems},
+                'definition': {definition['id'] for definition in definitions}}
+        candidates = {'theorem': set(), 'definition': set()}
+        new_terms = TermLinker()
+        for definition in definitions:
+            new_terms.add(definition['id'], definition['term_ru'])
+            for kind, item_ids in items_mentioning(self.conn, term_stems(definition['term_ru'])).items():
+                candidates[kind].update(item_ids - skip[kind])
+        
+        def mentioned(*texts):
+            return {definition_id for text in texts for mention in new_terms.find(text)
+                    for definition_id in mention.ids}
+        
+        theorem_rows = self._get_theorems_by_id(candidates['theorem'])
+        theorem_proofs = self._get_proofs(list(theorem_rows)) if proofs else {}
+        old_theorems = []
+        for theorem_id in sorted(theorem_rows):
+            theorem = theorem_rows[theorem_id]
+            ids = mentioned(theorem['statement_ru'], theorem_proofs.get(theorem_id))
+            if ids:
+                old_theorems.append((theorem, ids))
+        
+        old_definitions = []
+        definition_rows = self._get_definitions_by_id(candidates['definition'])
+        for definition_id in sorted(definition_rows):
+            definition = definition_rows[definition_id]
+            ids = mentioned(definition['definition_ru'])
+            if ids:
+                old_definitions.append((definition, ids))
+        
+        if old_theorems or old_definitions:
+            logger.info(f"   🔁 {len(old_theorems)} theorems and {len(old_definitions)} definitions "
+                        f"mention new terms and are linked again")
+        return old_theorems, old_definitions
+    
+    def _link_theorem_names(self, theorems: List[Dict]) -> List[Dict]:
+        """
+        Create theorem→theorem edges for references by name ("по лемме Кантора") in the statements
+        and proofs of new theorems, found with one scan of each text by the theorem name linker.
+        Existing theorems that mention the name of a new one are found through the mention index
+        and scanned for the new names only.
+        
+        Returns:
+            list: Ambiguous mentions (several theorems with that name) as jobs with 'theorem',
+                  'context', 'snippet' and 'candidates', or [] with the 'terms' linker
+        """
+        if not theorems:
+            return []
+        name_linker = get_theorem_linker(self.db_name)
+        new_ids = {theorem['id'] for theorem in theorems}
+        jobs = self._theorem_name_mentions(theorems, name_linker)
+        
+        # A theorem stored before a new one could not be linked to it
+        new_names = TheoremNameLinker()
+        old_ids = set()
+        for theorem in theorems:
+            new_names.add(theorem['id'], theorem['name_ru'])
+            for form in theorem_name_forms(theorem['name_ru']):
+                mentioning = items_mentioning(self.conn, [stem for stem in form if stem != THEOREM_WORD])
+                old_ids.update(mentioning['theorem'] - new_ids)
+        rows = self._get_theorems_by_id(old_ids)
+        proofs = self._get_proofs(list(rows))
+        old_theorems = [rows[theorem_id] for theorem_id in sorted(rows)
+                        if new_names.find(rows[theorem_id]['statement_ru']) or new_names.find(proofs.get(theorem_id))]
+        if old_theorems:
+            logger.info(f"   🔁 {len(old_theorems)} theorems mention new theorem names and are linked again")
+            jobs.extend(self._theorem_name_mentions(old_theorems, name_linker, only_ids=new_ids))
+        
+        if self.linker == 'terms':
+            if jobs:
+                logger.info(f"   ⏭️  {len(jobs)} ambiguous theorem references left unlinked")
+            return []
+        return jobs
+    
+    def _theorem_name_mentions(self, theorems: List[Dict], name_linker: TheoremNameLinker,
+                               only_ids: Optional[set] = None) -> List[Dict]:
+        """Link the unambiguous theorem references of theorems and return the ambiguous ones."""
+        proofs = self._get_proofs([theorem['id'] for theorem in theorems])
+        connections_created = 0
+        jobs = []
+        candidate_ids = set()
+        for theorem in theorems:
+            for context, text in (('statement', theorem['statement_ru']), ('proof', proofs.get(theorem['id']))):
+                for mention in name_linker.find(text):
+                    candidates = [theorem_id for theorem_id in mention.ids if theorem_id != theorem['id']]
+                    if only_ids is not None and not only_ids.intersection(candidates):
+                        continue
+                    if len(candidates) == 1:
+                        # Edges already stored or queued are skipped
+                        if self.edges.add(self.conn, 'theorem_theorem', theorem['id'], candidates[0], context):
+                            connections_created += 1
+                    elif candidates:
+                        start, end = mention_span(text, mention)
+                        jobs.append({'theorem': theorem, 'context': context, 'candidates': candidates,
+                                     'snippet': text[max(0, start - 200):end + 200]})
+                        candidate_ids.update(candidates)
+        
+        if connections_created > 0:
+            logger.info(f"      🔗 Created {connections_created} theorem→theorem connections from name references")
+            self.stats['connections_created'] += connections_created
+        
+        rows = self._get_theorems_by_id(candidate_ids)
+        for job in jobs:
+            job['candidates'] = [rows[theorem_id] for theorem_id in job['candidates'] if theorem_id in rows]
+        return jobs
+    
+    def _resolve_theorem_mention(self, job: Dict):
+        """Use LLM to decide which of several same-named theorems a text refers to."""
+        try:
+            response = self._call_llm(self._theorem_mention_prompt(job), max_tokens=50)
+            self._process_theorem_mention_response(job, response)
+        except Exception as e:
+            logger.error(f"Error resolving a theorem reference: {e}")
+    
+    def _theorem_mention_prompt(self, job: Dict) -> str:
+        """Build the LLM prompt that picks the theorem a reference in a text points to."""
+        prompt = f"""В тексте теоремы «{job['theorem']['name_ru']}» есть ссылка на другую теорему. Определите, на какую теорему из списка ссылается текст.
+
+ФРАГМЕНТ ТЕКСТА:
+{job['snippet']}
+
+ТЕОРЕМЫ С ТАКИМ НАЗВАНИЕМ:
+"""
+        for i, candidate in enumerate(job['candidates']):
+            prompt += f"{i+1}. {candidate['name_ru']}: {candidate['statement_ru'][:200]}...\n"
+        
+        prompt += """
+ФОРМАТ ОТВЕТА:
+Номер теоремы из списка или "НЕТ", если текст не ссылается ни на одну из них
+"""
+        return prompt
+    
+    def _process_theorem_mention_response(self, job: Dict, response: str):
+        """Create the theorem→theorem edge chosen by the LLM."""
+        if "НЕТ" in response.upper():
             return
+        num_match = re.search(r'\d+', response)
+        if not num_match:
+            return
+        number = int(num_match.group())
+        if 1 <= number <= len(job['candidates']):
+            cited = job['candidates'][number - 1]
+            if self.edges.add(self.conn, 'theorem_theorem', job['theorem']['id'], cited['id'], job['context']):
+                self.stats['connections_created'] += 1
+                logger.info(f"      🔗 Created theorem→theorem: '{cited['name_ru']}' ({job['context']})")
+    
+    @staticmethod
+    def _theorems_to_link(theorems: List[Dict]) -> List[Dict]:
+        """Theorems whose statement is long enough to be analyzed for connections."""
+        return [theorem for theorem in theorems if theorem['statement_ru'] and len(theorem['statement_ru']) > 50]
+    
+    def _link_shortlists(self, theorems: List[Dict], definitions: List[Dict]) -> Tuple[List[List[Dict]], List[List[Dict]]]:
+        """
+        Shortlist the definitions relevant to each theorem statement and each new definition,
+        scoring all of them against the whole definitions corpus at once. Only the shortlist
+        goes into the connection prompt of an item.
+        """
+        shortlists = shortlist_definitions(
+            [theorem['statement_ru'] for theorem in theorems] + [definition['definition_ru'] for definition in definitions],
+            self.db_name,
+            exclude_ids=[None] * len(theorems) + [definition['id'] for definition in definitions]
+        )
+        return shortlists[:len(theorems)], shortlists[len(theorems):]
+    
+    def _max_id(self, table: str) -> int:
+        """Largest committed ID of a table, used as the snapshot of a prepared file."""
+        return self.conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+    
+    @staticmethod
+    def _ids_after(added_items: List[Dict], snapshot_id: int) -> List[int]:
+        """IDs of items added by this agent after a snapshot (items are kept in insertion order)."""
+        recent_ids = []
+        for item in reversed(added_items):
+            if item['id'] <= snapshot_id:
+                break
+            recent_ids.append(item['id'])
+        return recent_ids
+    
+    @staticmethod
+    def _next_item(items: List[Tuple], clusters: List[List[int]], number: int, total: int) -> int:
+        """
+        Position of the first item not yet written after the first `number + 1` clusters.
+        Clusters are ordered by their first member, so every earlier item belongs to one of them.
+        """
+        if number + 1 < len(clusters):
+            return items[clusters[number + 1][0]][0]
+        return total
+    
+    def _prepare_definitions(self, definitions: List[Dict], start: int = 0,
+                             known: Optional[Dict[Tuple[str, str], int]] = None) -> Dict:
+        """
+        Check the definitions of one file against the committed database, looking up
+        duplicate candidates for all of them at once. Definitions before `start` are skipped,
+        and the ones in `known` (item hash -> stored ID, from an earlier version of the file)
+        are mapped to their rows without a lookup.
+        """
+        items = []
+        unchanged = []
+        for position, definition in enumerate(definitions[start:], start):
+            # Handle both 'term_ru' and 'term' field names
+            term_ru = definition.get('term_ru') or definition.get('term', '').strip()
+            definition_ru = definition.get('definition_ru') or definition.get('definition', '').strip()
+            
+            if not term_ru or not definition_ru:
+                logger.warning(f"      Skipping incomplete definition")
+                continue
+            hash_value = item_hash(definition)
+            if known and ('definition', hash_value) in known:
+                unchanged.append(('definition', position, hash_value, known[('definition', hash_value)]))
+                continue
+            items.append((position, definition, term_ru, definition_ru, hash_value))
         
+        # Rows up to the snapshot are checked here; the writer checks the ones added later
+        snapshot_id = self._max_id('definitions')
+        queries = [(term_ru, definition_ru) for _, _, term_ru, definition_ru, _ in items]
+        # Copies inside the file are grouped first; only one representative per cluster is checked
+        clusters = cluster_definitions(queries, self.db_name)
+        lookups = find_definitions_batch([queries[cluster[0]] for cluster in clusters], self.db_name,
+                                         max_id=snapshot_id)
+        
+        prepared = []
+        for number, (cluster, lookup) in enumerate(zip(clusters, lookups)):
+            _, definition, term_ru, definition_ru, _ = items[cluster[0]]
+            prepared.append({
+                'item': definition,
+                'title': term_ru,
+                'text': definition_ru,
+                'lookup': lookup,
+                # In parallel modes the LLM verification against the snapshot runs here, on the worker
+                'duplicate_id': (resolve_definition(term_ru, definition_ru, lookup, self.db_name)
+                                 if self._verifies_while_preparing else None),
+                'copies': [items[member][2] for member in cluster[1:]],
+                # (position, item hash) of every member, recorded as the provenance of the stored row
+                'sources': [(items[member][0], items[member][4]) for member in cluster],
+                # Every item before this position is written once this cluster is
+                'next_item': self._next_item(items, clusters, number, len(definitions)),
+            })
+        return {'snapshot_id': snapshot_id, 'items': prepared, 'count': len(definitions), 'unchanged': unchanged}
+    
+    def _write_definitions(self, prepared: Dict):
+        """Add the prepared definitions of one file that are not duplicates."""
+        for entry in prepared['items']:
+            definition_id = self._process_definition(entry, prepared['snapshot_id'])
+            for title in entry['copies']:
+                self._skip_copy('definition', title, definition_id)
+            self._record_sources('definition', entry['sources'], definition_id)
+            self._maybe_checkpoint(entry['next_item'])
+    
+    def _skip_copy(self, kind: str, title: str, representative_id: Optional[int]):
+        """Count an item that is a copy of another item of the same file."""
+        logger.info(f"      Processing {kind}: '{title}'")
+        self.stats[f'{kind}s_processed'] += 1
+        if representative_id is None:
+            return
+        logger.info(f"      ❌ Copy of an item in the same file (ID: {representative_id}) - skipping")
+        self.stats[f'{kind}s_duplicates'] += 1
+    
+    def _record_sources(self, kind: str, sources: List[Tuple[int, str]], item_id: Optional[int]):
+        """Record the file positions an added or matched row was ingested from."""
+        if item_id is None:
+            return
+        record_items(self.conn, self._checkpoint['file_path'],
+                     [(kind, position, hash_value, item_id) for position, hash_value in sources])
+    
+    def _process_definition(self, entry: Dict, snapshot_id: int) -> Optional[int]:
+        """
+        Process a single prepared definition algorithmically.
+        Returns the ID of the matching or newly added definition.
+        """
+        definition, term_ru, definition_ru = entry['item'], entry['title'], entry['text']
         logger.info(f"      Processing definition: '{term_ru}'")
         self.stats['definitions_processed'] += 1
         
-        # Check for duplicate using our optimized search
-        duplicate_id = find_definition(term_ru, definition_ru, self.db_name)
+        # Check for duplicate among the snapshot candidates and the rows added since the snapshot
+        recent_ids = self._ids_after(self.newly_added_definitions, snapshot_id)
+        if not self._verifies_while_preparing:
+            duplicate_id = resolve_definition(term_ru, definition_ru, entry['lookup'], self.db_name, recent_ids)
+        else:
+            # The snapshot candidates were verified by the worker
+            duplicate_id = entry['duplicate_id']
+            if not duplicate_id:
+                lookup = {'exact_id': find_exact_definition(term_ru, definition_ru, self.db_name), 'candidates': []}
+                duplicate_id = resolve_definition(term_ru, definition_ru, lookup, self.db_name, recent_ids)
         
         if duplicate_id:
             logger.info(f"      ❌ Duplicate found (ID: {duplicate_id}) - skipping")
             self.stats['definitions_duplicates'] += 1
-            return
+            return duplicate_id
         
         # Add to database
         new_id = self._add_definition_to_db(definition, term_ru, definition_ru)
-        if new_id:
-            logger.info(f"      ✅ Added definition (ID: {new_id})")
-            self.stats['definitions_added'] += 1
-            self.newly_added_definitions.append({'id': new_id, 'term_ru': term_ru, 'definition_ru': definition_ru})
-        else:
-            logger.error(f"      ❌ Failed to add definition")
+        logger.info(f"      ✅ Added definition (ID: {new_id})")
+        self.stats['definitions_added'] += 1
+        index_definition(new_id, term_ru, definition_ru, self.db_name)
+        self.newly_added_definitions.append({'id': new_id, 'term_ru': term_ru, 'definition_ru': definition_ru})
+        return new_id
     
-    def _process_theorem(self, theorem: Dict):
-        """Process a single theorem algorithmically."""
-        # Handle both 'name_ru' and 'name' field names  
-        name_ru = theorem.get('name_ru') or theorem.get('name', '').strip()
-        statement_ru = theorem.get('statement_ru') or theorem.get('formulation', '').strip()
+    def _prepare_theorems(self, theorems: List[Dict], start: int = 0, offset: int = 0,
+                          known: Optional[Dict[Tuple[str, str], int]] = None) -> Dict:
+        """
+        Check the theorems of one file against the committed database, looking up
+        duplicate candidates for all of them at once. Theorems before `start` are skipped;
+        `offset` is the number of items of the file that come before its theorems.
+        Theorems in `known` are mapped to their stored rows without a lookup.
+        """
+        items = []
+        unchanged = []
+        for position, theorem in enumerate(theorems[start:], start):
+            # Handle both 'name_ru' and 'name' field names  
+            name_ru = theorem.get('name_ru') or theorem.get('name', '').strip()
+            statement_ru = theorem.get('statement_ru') or theorem.get('formulation', '').strip()
+            
+            if not name_ru or not statement_ru:
+                logger.warning(f"      Skipping incomplete theorem")
+                continue
+            hash_value = item_hash(theorem)
+            if known and ('theorem', hash_value) in known:
+                unchanged.append(('theorem', position, hash_value, known[('theorem', hash_value)]))
+                continue
+            items.append((position, theorem, name_ru, statement_ru, hash_value))
         
-        if not name_ru or not statement_ru:
-            logger.warning(f"      Skipping incomplete theorem")
-            return
+        # Rows up to the snapshot are checked here; the writer checks the ones added later
+        snapshot_id = self._max_id('theorems')
+        queries = [(name_ru, statement_ru) for _, _, name_ru, statement_ru, _ in items]
+        # Copies inside the file are grouped first; only one representative per cluster is checked
+        clusters = cluster_theorems(queries, self.db_name)
+        lookups = find_theorems_batch([queries[cluster[0]] for cluster in clusters], self.db_name,
+                                      max_id=snapshot_id)
         
+        prepared = []
+        for number, (cluster, lookup) in enumerate(zip(clusters, lookups)):
+            _, theorem, name_ru, statement_ru, _ = items[cluster[0]]
+            prepared.append({
+                'item': theorem,
+                'title': name_ru,
+                'text': statement_ru,
+                'lookup': lookup,
+                # In parallel modes the LLM verification against the snapshot runs here, on the worker
+                'duplicate_id': (resolve_theorem(name_ru, statement_ru, lookup, self.db_name)
+                                 if self._verifies_while_preparing else None),
+                'copies': [items[member][2] for member in cluster[1:]],
+                # (position, item hash) of every member, recorded as the provenance of the stored row
+                'sources': [(items[member][0], items[member][4]) for member in cluster],
+                # Every item before this position is written once this cluster is
+                'next_item': offset + self._next_item(items, clusters, number, len(theorems)),
+            })
+        return {'snapshot_id': snapshot_id, 'items': prepared, 'count': len(theorems), 'unchanged': unchanged}
+    
+    def _write_theorems(self, prepared: Dict):
+        """Add the prepared theorems of one file that are not duplicates."""
+        for entry in prepared['items']:
+            theorem_id = self._process_theorem(entry, prepared['snapshot_id'])
+            for title in entry['copies']:
+                self._skip_copy('theorem', title, theorem_id)
+            self._record_sources('theorem', entry['sources'], theorem_id)
+            self._maybe_checkpoint(entry['next_item'])
+    
+    def _process_theorem(self, entry: Dict, snapshot_id: int) -> Optional[int]:
+        """
+        Process a single prepared theorem algorithmically.
+        Returns the ID of the matching or newly added theorem.
+        """
+        theorem, name_ru, statement_ru = entry['item'], entry['title'], entry['text']
         logger.info(f"      Processing theorem: '{name_ru}'")
         self.stats['theorems_processed'] += 1
         
-        # Check for duplicate using our optimized search
-        duplicate_id = find_theorem(name_ru, statement_ru, self.db_name)
+        # Check for duplicate among the snapshot candidates and the rows added since the snapshot
+        recent_ids = self._ids_after(self.newly_added_theorems, snapshot_id)
+        if not self._verifies_while_preparing:
+            duplicate_id = resolve_theorem(name_ru, statement_ru, entry['lookup'], self.db_name, recent_ids)
+        else:
+            # The snapshot candidates were verified by the worker
+            duplicate_id = entry['duplicate_id']
+            if not duplicate_id:
+                lookup = {'exact_id': find_exact_theorem(name_ru, statement_ru, self.db_name), 'candidates': []}
+                duplicate_id = resolve_theorem(name_ru, statement_ru, lookup, self.db_name, recent_ids)
         
         if duplicate_id:
             logger.info(f"      ❌ Duplicate found (ID: {duplicate_id}) - skipping")
             self.stats['theorems_duplicates'] += 1
-            return
+            return duplicate_id
         
         # Add to database
         new_id = self._add_theorem_to_db(theorem, name_ru, statement_ru)
-        if new_id:
-            logger.info(f"      ✅ Added theorem (ID: {new_id})")
-            self.stats['theorems_added'] += 1
-            self.newly_added_theorems.append({'id': new_id, 'name_ru': name_ru, 'statement_ru': statement_ru})
-        else:
-            logger.error(f"      ❌ Failed to add theorem")
+        logger.info(f"      ✅ Added theorem (ID: {new_id})")
+        self.stats['theorems_added'] += 1
+        index_theorem(new_id, name_ru, statement_ru, self.db_name)
+        self.newly_added_theorems.append({'id': new_id, 'name_ru': name_ru, 'statement_ru': statement_ru})
+        return new_id
     
-    def _add_definition_to_db(self, definition: Dict, term_ru: str, definition_ru: str) -> Optional[int]:
-        """Add definition to database."""
-        try:
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                INSERT INTO definitions (
-                    term_ru, definition_ru, term_en, definition_en, formula
-                ) VALUES (?, ?, ?, ?, ?)
-            """, (
-                term_ru,
-                definition_ru,
-                definition.get('term_en'),
-                definition.get('definition_en'),
-                definition.get('formula')
-            ))
-            
-            definition_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
-            
-            return definition_id
-            
-        except Exception as e:
-            logger.error(f"Error adding definition to database: {e}")
-            return None
+    def _add_definition_to_db(self, definition: Dict, term_ru: str, definition_ru: str) -> int:
+        """Add definition to database. Errors propagate, so the caller rolls back the whole file."""
+        cursor = self.conn.cursor()
+        
+        cursor.execute("""
+            INSERT INTO definitions (
+                term_ru, definition_ru, term_en, definition_en, formula,
+                term_key, definition_key
+            ) VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (
+            term_ru,
+            definition_ru,
+            definition.get('term_en'),
+            definition.get('definition_en'),
+            definition.get('formula'),
+            normalize_key(term_ru),
+            normalize_key(definition_ru)
+        ))
+        
+        definition_id = cursor.lastrowid
+        index_item(self.conn, 'definition', definition_id, definition_ru)
+        add_to_lsh(self.conn, 'definition', definition_id, term_ru, definition_ru)
+        
+        return definition_id
     
-    def _add_theorem_to_db(self, theorem: Dict, name_ru: str, statement_ru: str) -> Optional[int]:
-        """Add theorem to database."""
+    def _add_theorem_to_db(self, theorem: Dict, name_ru: str, statement_ru: str) -> int:
+        """Add theorem to database. Errors propagate, so the caller rolls back the whole file."""
+        cursor = self.conn.cursor()
+        
+        cursor.execute("""
+            INSERT INTO theorems (
+                name_ru, statement_ru, proof_ru, statement_en, proof_en, formula,
+                name_key, statement_key
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            name_ru,
+            statement_ru,
+            theorem.get('proof_ru') or theorem.get('proof'),
+            theorem.get('statement_en'),
+            theorem.get('proof_en'),
+            theorem.get('formula'),
+            normalize_key(name_ru),
+            normalize_key(statement_ru)
+        ))
+        
+        theorem_id = cursor.lastrowid
+        index_item(self.conn, 'theorem', theorem_id, statement_ru, theorem.get('proof_ru') or theorem.get('proof'))
+        add_to_lsh(self.conn, 'theorem', theorem_id, name_ru, statement_ru)
+        
+        return theorem_id
+    
+    def _analyze_theorem_text_for_connections(self, theorem_id: int, text: str, context: str,
+                                              definitions: Optional[List[Dict]] = None):
+        """Use LLM to find potential mathematical concept references in theorem text."""
         try:
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
+            # Only the definitions most relevant to the text are offered to the LLM
+            if definitions is None:
+                definitions = shortlist_definitions([text], self.db_name)[0]
+            if not definitions:
+                return
             
-            cursor.execute("""
-                INSERT INTO theorems (
-                    name_ru, statement_ru, proof_ru, statement_en, proof_en, formula
-                ) VALUES (?, ?, ?, ?, ?, ?)
-            """, (
-                name_ru,
-                statement_ru,
-                theorem.get('proof_ru') or theorem.get('proof'),
-                theorem.get('statement_en'),
-                theorem.get('proof_en'),
-                theorem.get('formula')
-            ))
+            prompt = self._theorem_connection_prompt(text, definitions)
             
-            theorem_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
+            # Call LLM with expanded parameters for comprehensive analysis
+            response = self._call_llm(prompt, max_tokens=500)
             
-            return theorem_id
+            # Process response with enhanced connection creation
+            self._process_comprehensive_connection_response(theorem_id, response, context, definitions)
             
         except Exception as e:
-            logger.error(f"Error adding theorem to database: {e}")
-            return None
+            logger.error(f"Error analyzing theorem text for connections: {e}")
     
-    def _analyze_theorem_text_for_connections(self, theorem_id: int, text: str, context: str):
-        """Use LLM to find potential mathematical concept references in theorem text."""
-        try:
-            # Get all definitions for comprehensive connection analysis
-            definitions = self._get_all_definitions()
-            
-            # Prepare comprehensive LLM prompt for content-based analysis
-            prompt = f"""Проанализируйте математический текст и найдите ВСЕ СВЯЗАННЫЕ понятия из списка определений.
+    def _theorem_connection_prompt(self, text: str, definitions: List[Dict]) -> str:
+        """Build the LLM prompt that finds definitions used in a theorem text."""
+        # Prepare comprehensive LLM prompt for content-based analysis
+        prompt = f"""Проанализируйте математический текст и найдите ВСЕ СВЯЗАННЫЕ понятия из списка определений.
 
 АНАЛИЗИРУЕМЫЙ ТЕКСТ:
 {text[:1000]}
 
 СПИСОК ДОСТУПНЫХ ОПРЕДЕЛЕНИЙ:
 """
-            
-            # Add definitions with their content for better matching
-            for i, defn in enumerate(definitions[:40]):
-                prompt += f"{i+1}. {defn['term_ru']}: {defn['definition_ru'][:100]}...\n"
-            
-            prompt += f"""
+        
+        # Add definitions with their content for better matching
+        for i, defn in enumerate(definitions):
+            prompt += f"{i+1}. {defn['term_ru']}: {defn['definition_ru'][:100]}...\n"
+        
+        prompt += f"""
 
 ЗАДАЧА:
 - Найдите ВСЕ понятия из списка, которые УПОМИНАЮТСЯ или ИСПОЛЬЗУЮТСЯ в анализируемом тексте
@@ -365,15 +1079,7 @@ class AlgorithmicAgent:
 
 Если связей нет, ответьте: "НЕТ СВЯЗЕЙ"
 """
-
-            # Call LLM with expanded parameters for comprehensive analysis
-            response = self._call_llm(prompt, max_tokens=500)
-            
-            # Process response with enhanced connection creation
-            self._process_comprehensive_connection_response(theorem_id, response, context, definitions)
-            
-        except Exception as e:
-            logger.error(f"Error analyzing theorem text for connections: {e}")
+        return prompt
     
     def _process_comprehensive_connection_response(self, theorem_id: int, response: str, context: str, definitions: List[Dict]):
         """Process LLM response and create connections based on comprehensive analysis."""
@@ -395,7 +1101,6 @@ class AlgorithmicAgent:
                         term = parts[1].strip()
                         
                         # Extract number (handle various formats like "1", "[1]", etc.)
-                        import re
                         num_match = re.search(r'\d+', def_num_str)
                         if num_match:
                             def_num = int(num_match.group()) - 1  # Convert to 0-based index
@@ -404,9 +1109,8 @@ class AlgorithmicAgent:
                             if 0 <= def_num < len(definitions):
                                 defn = definitions[def_num]
                                 
-                                # Check if connection already exists
-                                if not self._connection_exists(theorem_id, defn['id'], 'theorem_definition'):
-                                    self._create_theorem_definition_connection(theorem_id, defn['id'], context)
+                                # Edges already stored or queued are skipped
+                                if self.edges.add(self.conn, 'theorem_definition', theorem_id, defn['id'], context):
                                     connections_created += 1
                                     logger.info(f"      🔗 Created theorem→definition: '{defn['term_ru']}' ({context})")
                                 
@@ -417,205 +1121,78 @@ class AlgorithmicAgent:
         if connections_created > 0:
             self.stats['connections_created'] += connections_created
 
-    def _connection_exists(self, source_id: int, target_id: int, connection_type: str) -> bool:
-        """Check if connection already exists to prevent duplicates."""
-        try:
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
-            
-            if connection_type == 'theorem_definition':
-                cursor.execute("""
-                    SELECT 1 FROM theorem_uses_definition 
-                    WHERE theorem_id = ? AND definition_id = ?
-                """, (source_id, target_id))
-            elif connection_type == 'theorem_theorem':
-                cursor.execute("""
-                    SELECT 1 FROM theorem_uses_theorem 
-                    WHERE theorem_id = ? AND used_theorem_id = ?
-                """, (source_id, target_id))
-            elif connection_type == 'definition_definition':
-                cursor.execute("""
-                    SELECT 1 FROM definition_uses_definition 
-                    WHERE definition_id = ? AND used_definition_id = ?
-                """, (source_id, target_id))
-            
-            result = cursor.fetchone()
-            conn.close()
-            return result is not None
-            
-        except Exception as e:
-            logger.error(f"Error checking connection existence: {e}")
-            return False
-    
-    def _find_definition_connections(self):
-        """Find connections between definitions."""
-        logger.info("   🔗 Analyzing definition-to-definition connections...")
-        
-        # Get all existing definitions for connection analysis
-        definitions = self._get_all_definitions()
-        
-        if not definitions:
-            return
-        
-        # Create a focused list of definition terms for LLM
-        def_terms = [defn['term_ru'] for defn in definitions[:30]]  # Limit to 30 most recent
-        
-        # Prepare more specific LLM prompt
-        prompt = f"""Проанализируйте определения и найдите ТОЛЬКО ПРЯМЫЕ УПОМИНАНИЯ определений из списка.
-
-ОПРЕДЕЛЕНИЯ ДЛЯ ПОИСКА:
-{', '.join(def_terms)}
-
-ВАЖНО:
-- Ищите только ТОЧНЫЕ совпадения терминов или их очевидные синонимы
-- НЕ создавайте связи на основе общих математических понятий
-- НЕ связывайте через косвенные ассоциации
-
-ФОРМАТ ОТВЕТА:
-Если найдены точные упоминания, перечислите их:
-- [точный термин]
-
-Если точных упоминаний нет, ответьте: "НЕТ СВЯЗЕЙ"
-"""
-        
-        # Call LLM with more restrictive parameters
-        response = self._call_llm(prompt, max_tokens=200)
-        
-        # Process response more carefully
-        self._process_definition_connection_response(response, definitions)
-        
-        logger.info("✅ Definition connection analysis completed")
-    
-    def _process_definition_connection_response(self, response: str, definitions: List[Dict]):
-        """Process LLM response and create only precise database connections."""
-        if "НЕТ СВЯЗЕЙ" in response.upper() or "НЕТ ССЫЛОК" in response.upper():
-            return
-        
-        # Parse response more carefully
-        lines = response.strip().split('\n')
-        connections_created = 0
-        
-        for line in lines:
-            line = line.strip()
-            if line.startswith('-') or line:
-                # Extract term (remove bullet points and clean)
-                term = line.replace('-', '').strip()
-                
-                # Skip empty lines or non-term lines
-                if not term or len(term) < 3:
-                    continue
-                
-                # Find exact matching definition with strict matching
-                for defn in definitions:
-                    def_term = defn['term_ru'].strip()
-                    
-                    # Use exact or very close matching
-                    if (def_term.lower() == term.lower() or 
-                        term.lower() in def_term.lower() and len(term) > 5):
-                        
-                        # Check if connection already exists
-                        if not self._connection_exists(defn['id'], self.newly_added_definitions[0]['id'], 'definition_definition'):
-                            self._create_definition_definition_connection(defn['id'], self.newly_added_definitions[0]['id'])
-                            connections_created += 1
-                            logger.info(f"     🔗 Created definition→definition: '{def_term}'")
-                        break
-        
-        if connections_created > 0:
-            self.stats['connections_created'] += connections_created
-    
-    def _create_definition_definition_connection(self, definition_id: int, used_definition_id: int):
-        """Create connection between two definitions."""
-        try:
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT OR IGNORE INTO definition_uses_definition 
-                (definition_id, used_definition_id) VALUES (?, ?)
-            """, (definition_id, used_definition_id))
-            conn.commit()
-            conn.close()
-        except Exception as e:
-            logger.error(f"Error creating definition-definition connection: {e}")
+    def _get_definitions_by_id(self, definition_ids) -> Dict[int, Dict]:
+        """Get several definitions from database by ID."""
+        definition_ids = list(definition_ids)
+        if not definition_ids:
+            return {}
+        placeholders = ', '.join('?' * len(definition_ids))
+        rows = self.conn.execute(
+            f"SELECT id, term_ru, definition_ru FROM definitions WHERE id IN ({placeholders})", definition_ids
+        ).fetchall()
+        return {row[0]: {'id': row[0], 'term_ru': row[1], 'definition_ru': row[2]} for row in rows}
     
-    def _get_theorem_id_by_name(self, name_ru: str) -> Optional[int]:
-        """Get theorem ID by name."""
-        try:
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
-            cursor.execute("SELECT id FROM theorems WHERE name_ru = ?", (name_ru,))
-            result = cursor.fetchone()
-            conn.close()
-            return result[0] if result else None
-        except Exception as e:
-            logger.error(f"Error getting theorem ID: {e}")
-            return None
-    
-    def _get_all_definitions(self) -> List[Dict]:
-        """Get all definitions from database."""
-        try:
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
-            cursor.execute("SELECT id, term_ru, definition_ru FROM definitions")
-            rows = cursor.fetchall()
-            conn.close()
-            return [{'id': row[0], 'term_ru': row[1], 'definition_ru': row[2]} for row in rows]
-        except Exception as e:
-            logger.error(f"Error getting definitions: {e}")
-            return []
+    def _get_theorems_by_id(self, theorem_ids) -> Dict[int, Dict]:
+        """Get several theorems from database by ID."""
+        theorem_ids = list(theorem_ids)
+        if not theorem_ids:
+            return {}
+        placeholders = ', '.join('?' * len(theorem_ids))
+        rows = self.conn.execute(
+            f"SELECT id, name_ru, statement_ru FROM theorems WHERE id IN ({placeholders})", theorem_ids
+        ).fetchall()
+        return {row[0]: {'id': row[0], 'name_ru': row[1], 'statement_ru': row[2]} for row in rows}
     
-    def _create_theorem_definition_connection(self, theorem_id: int, definition_id: int, context: str):
-        """Create connection between theorem and definition."""
-        try:
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT OR IGNORE INTO theorem_uses_definition 
-                (theorem_id, definition_id, context) VALUES (?, ?, ?)
-            """, (theorem_id, definition_id, context))
-            conn.commit()
-            conn.close()
-        except Exception as e:
-            logger.error(f"Error creating theorem-definition connection: {e}")
+    def _get_proofs(self, theorem_ids: List[int]) -> Dict[int, str]:
+        """Get the stored proofs of several theorems."""
+        if not theorem_ids:
+            return {}
+        placeholders = ', '.join('?' * len(theorem_ids))
+        rows = self.conn.execute(
+            f"SELECT id, proof_ru FROM theorems WHERE id IN ({placeholders}) AND proof_ru IS NOT NULL", theorem_ids
+        ).fetchall()
+        return dict(rows)
     
     def _call_llm(self, prompt: str, max_tokens: int = 150) -> str:
         """Call LLM with the given prompt."""
         try:
-            from openai import OpenAI
-            
-            client = OpenAI(
-                base_url="https://openrouter.ai/api/v1",
-                api_key=os.getenv("OPENROUTER_API_KEY")
-            )
-            
-            response = client.chat.completions.create(
-                model="meta-llama/llama-4-maverick",  # Use maverick model for unlimited usage
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=max_tokens,
-                temperature=0.1
-            )
-            
-            return response.choices[0].message.content.strip()
+            return get_gateway().complete(prompt, max_tokens=max_tokens)
             
         except Exception as e:
             logger.error(f"Error calling LLM: {e}")
             return "НЕТ ССЫЛОК"
     
-    def _analyze_new_definitions_for_connections(self):
-        """Analyze newly added definitions for connections to existing definitions."""
+    def _analyze_new_definitions_for_connections(self, jobs: List[Tuple[Dict, List[Dict]]]):
+        """
+        Analyze newly added definitions for connections to existing definitions.
+        `jobs` pairs each definition of the current file with the existing definitions
+        offered in its prompt (see _plan_links).
+        """
         logger.info("   🔗 Analyzing newly added definitions for connections...")
         
-        # Get all existing definitions for connection analysis
-        all_definitions = self._get_all_definitions()
-        
-        if not all_definitions or not self.newly_added_definitions:
+        if not jobs:
             return
         
         # For each newly added definition, find connections to existing definitions
-        for new_def in self.newly_added_definitions:
+        for new_def, definitions in jobs:
+            if not definitions:
+                continue
             logger.info(f"   🔗 Analyzing definition: '{new_def['term_ru']}'")
             
-            # Prepare comprehensive LLM prompt for content-based analysis
-            prompt = f"""Проанализируйте определение и найдите ВСЕ СВЯЗАННЫЕ понятия из списка существующих определений.
+            prompt = self._definition_connection_prompt(new_def, definitions)
+
+            # Call LLM with expanded parameters for comprehensive analysis
+            response = self._call_llm(prompt, max_tokens=400)
+            
+            # Process response with enhanced connection creation
+            self._process_definition_connection_response(new_def['id'], response, definitions)
+        
+        logger.info("✅ Definition connection analysis completed")
+    
+    def _definition_connection_prompt(self, new_def: Dict, all_definitions: List[Dict]) -> str:
+        """Build the LLM prompt that finds existing definitions used in a new definition."""
+        # Prepare comprehensive LLM prompt for content-based analysis
+        prompt = f"""Проанализируйте определение и найдите ВСЕ СВЯЗАННЫЕ понятия из списка существующих определений.
 
 АНАЛИЗИРУЕМОЕ ОПРЕДЕЛЕНИЕ:
 Термин: {new_def['term_ru']}
@@ -623,13 +1200,13 @@ class AlgorithmicAgent:
 
 СПИСОК СУЩЕСТВУЮЩИХ ОПРЕДЕЛЕНИЙ:
 """
-            
-            # Add existing definitions with their content for better matching
-            for i, defn in enumerate(all_definitions[:40]):
-                if defn['id'] != new_def['id']:  # Don't connect to itself
-                    prompt += f"{i+1}. {defn['term_ru']}: {defn['definition_ru'][:150]}...\n"
-            
-            prompt += f"""
+        
+        # Add existing definitions with their content for better matching
+        for i, defn in enumerate(all_definitions):
+            if defn['id'] != new_def['id']:  # Don't connect to itself
+                prompt += f"{i+1}. {defn['term_ru']}: {defn['definition_ru'][:150]}...\n"
+        
+        prompt += f"""
 
 ЗАДАЧА:
 - Найдите ВСЕ понятия из списка, которые УПОМИНАЮТСЯ или ИСПОЛЬЗУЮТСЯ в анализируемом определении
@@ -643,14 +1220,7 @@ class AlgorithmicAgent:
 
 Если связей нет, ответьте: "НЕТ СВЯЗЕЙ"
 """
-
-            # Call LLM with expanded parameters for comprehensive analysis
-            response = self._call_llm(prompt, max_tokens=400)
-            
-            # Process response with enhanced connection creation
-            self._process_definition_connection_response(new_def['id'], response, all_definitions)
-        
-        logger.info("✅ Definition connection analysis completed")
+        return prompt
     
     def _process_definition_connection_response(self, definition_id: int, response: str, definitions: List[Dict]):
         """Process LLM response and create connections based on comprehensive analysis."""
@@ -672,7 +1242,6 @@ class AlgorithmicAgent:
                         term = parts[1].strip()
                         
                         # Extract number (handle various formats like "1", "[1]", etc.)
-                        import re
                         num_match = re.search(r'\d+', def_num_str)
                         if num_match:
                             def_num = int(num_match.group()) - 1  # Convert to 0-based index
@@ -681,9 +1250,8 @@ class AlgorithmicAgent:
                             if 0 <= def_num < len(definitions):
                                 defn = definitions[def_num]
                                 
-                                # Check if connection already exists
-                                if not self._connection_exists(definition_id, defn['id'], 'definition_definition'):
-                                    self._create_definition_definition_connection(definition_id, defn['id'])
+                                # Edges already stored or queued are skipped
+                                if self.edges.add(self.conn, 'definition_definition', definition_id, defn['id']):
                                     connections_created += 1
                                     logger.info(f"     🔗 Created definition→definition: '{defn['term_ru']}'")
                                 
@@ -694,12 +1262,271 @@ class AlgorithmicAgent:
         if connections_created > 0:
             self.stats['connections_created'] += connections_created
     
+    def _link_batches(self, theorem_jobs: List[Tuple[Dict, List[Dict]]],
+                      definition_jobs: List[Tuple[Dict, List[Dict]]]) -> List[List[Tuple[str, Dict, List[Dict]]]]:
+        """
+        Group link jobs into batches of up to `link_batch_size` items analyzed in one request.
+        A batch whose prompt is estimated above LINK_PROMPT_TOKENS is split in halves until it
+        fits; a single item is always sent on its own.
+        
+        Returns:
+            list: Batches of ('theorem' or 'definition', item, candidate definitions)
+        """
+        jobs = [('theorem', theorem, definitions) for theorem, definitions in theorem_jobs if definitions]
+        jobs.extend(('definition', definition, definitions) for definition, definitions in definition_jobs if definitions)
+        
+        pending = [jobs[i:i + self.link_batch_size] for i in range(0, len(jobs), self.link_batch_size)]
+        batches = []
+        while pending:
+            batch = pending.pop(0)
+            prompt, _ = self._batch_connection_prompt(batch)
+            if len(batch) > 1 and estimate_tokens(prompt) > LINK_PROMPT_TOKENS:
+                middle = len(batch) // 2
+                pending[:0] = [batch[:middle], batch[middle:]]
+            else:
+                batches.append(batch)
+        return batches
+    
+    def _analyze_batch_for_connections(self, batch: List[Tuple[str, Dict, List[Dict]]]):
+        """Use one LLM call to find the connections of several new theorems and definitions."""
+        try:
+            prompt, candidates = self._batch_connection_prompt(batch)
+            response = self._call_llm(prompt, max_tokens=self._batch_answer_tokens(len(batch)))
+            self._process_batch_connection_response(batch, response, candidates)
+        except Exception as e:
+            logger.error(f"Error analyzing a batch of items for connections: {e}")
+    
+    @staticmethod
+    def _batch_answer_tokens(batch_size: int) -> int:
+        """Answer budget of a batched prompt: a short JSON list per item."""
+        return 100 + 100 * batch_size
+    
+    def _batch_connection_prompt(self, batch: List[Tuple[str, Dict, List[Dict]]]) -> Tuple[str, List[Dict]]:
+        """
+        Build one LLM prompt for several new items, offering the union of their candidate definitions.
+        
+        Returns:
+            tuple: (prompt, candidate definitions in the order they are numbered in the prompt)
+        """
+        candidates = list({defn['id']: defn for _, _, definitions in batch for defn in definitions}.values())
+        
+        prompt = """Проанализируйте математические тексты и для КАЖДОГО текста найдите ВСЕ СВЯЗАННЫЕ понятия из общего списка определений.
+
+АНАЛИЗИРУЕМЫЕ ТЕКСТЫ:
+"""
+        for number, (kind, item, _) in enumerate(batch, 1):
+            if kind == 'theorem':
+                prompt += f"ТЕКСТ {number}. Теорема «{item['name_ru']}»: {item['statement_ru'][:1000]}\n"
+            else:
+                prompt += f"ТЕКСТ {number}. Определение «{item['term_ru']}»: {item['definition_ru'][:1000]}\n"
+        
+        prompt += """
+СПИСОК ДОСТУПНЫХ ОПРЕДЕЛЕНИЙ:
+"""
+        for i, defn in enumerate(candidates):
+            prompt += f"{i+1}. {defn['term_ru']}: {defn['definition_ru'][:150]}...\n"
+        
+        prompt += """
+ЗАДАЧА:
+- Для каждого текста найдите ВСЕ понятия из списка, которые в нем УПОМИНАЮТСЯ или ИСПОЛЬЗУЮТСЯ
+- Учитывайте синонимы, сокращения и математические обозначения
+- Определение не связывается само с собой
+
+ФОРМАТ ОТВЕТА:
+Только JSON-объект: ключ — номер текста, значение — список номеров определений из списка, например
+{"1": [3, 7], "2": []}
+"""
+        return prompt, candidates
+    
+    @staticmethod
+    def _parse_batch_links(response: str) -> Optional[Dict[int, List[int]]]:
+        """
+        Parse the JSON object of a batched connection answer.
+        
+        Returns:
+            dict: Text number -> definition numbers, or None if the answer has no valid object
+        """
+        answer = AlgorithmicAgent._parse_json_answer(response)
+        if answer is None:
+            return None
+        
+        links = {}
+        for key, numbers in answer.items():
+            # Keys may come back as "1", "ТЕКСТ 1", ...
+            key_match = re.search(r'\d+', str(key))
+            if not key_match or not isinstance(numbers, list):
+                continue
+            links[int(key_match.group())] = AlgorithmicAgent._numbers(numbers)
+        return links
+    
+    @staticmethod
+    def _parse_json_answer(response: str) -> Optional[Dict]:
+        """
+        Extract the JSON object of an LLM answer ("НЕТ СВЯЗЕЙ" counts as an empty one).
+        
+        Returns:
+            dict: The object, or None if the answer has no valid object
+        """
+        if "НЕТ СВЯЗЕЙ" in response.upper() or "НЕТ ССЫЛОК" in response.upper():
+            return {}
+        match = re.search(r'\{.*\}', response, re.DOTALL)
+        if not match:
+            return None
+        try:
+            answer = json.loads(match.group())
+        except json.JSONDecodeError:
+            return None
+        return answer if isinstance(answer, dict) else None
+    
+    @staticmethod
+    def _numbers(values) -> List[int]:
+        """List numbers of an LLM answer; numbers given as strings are accepted."""
+        if not isinstance(values, list):
+            return []
+        return [int(value) for value in values if isinstance(value, int) or str(value).strip().isdigit()]
+    
+    def _process_batch_connection_response(self, batch: List[Tuple[str, Dict, List[Dict]]], response: str,
+                                           candidates: List[Dict]):
+        """Create the connections of every item of a batch from the LLM answer."""
+        links = self._parse_batch_links(response)
+        if links is None:
+            logger.warning(f"Could not parse batched connection answer: {response[:200]}")
+            return
+        
+        connections_created = 0
+        for number, (kind, item, _) in enumerate(batch, 1):
+            for def_num in links.get(number, []):
+                if not 1 <= def_num <= len(candidates):
+                    continue
+                defn = candidates[def_num - 1]
+                # Edges already stored or queued are skipped
+                if kind == 'theorem':
+                    created = self.edges.add(self.conn, 'theorem_definition', item['id'], defn['id'], 'statement')
+                else:
+                    created = (defn['id'] != item['id'] and
+                               self.edges.add(self.conn, 'definition_definition', item['id'], defn['id']))
+                if created:
+                    connections_created += 1
+                    logger.info(f"      🔗 Created {kind}→definition: '{defn['term_ru']}'")
+        
+        if connections_created > 0:
+            self.stats['connections_created'] += connections_created
+    
+    def _plan_proof_links(self, theorems: List[Dict]) -> List[Dict]:
+        """
+        Split the proofs of theorems into overlapping chunks and build one LLM prompt per chunk,
+        offering the definitions and theorems most relevant to that chunk. The chunks of one
+        proof stop once their prompts reach PROOF_TOKEN_BUDGET, so a very long proof costs a
+        bounded number of requests.
+        
+        Returns:
+            list: Jobs with 'theorem', 'prompt', 'definitions' and 'theorems' (candidates of the prompt)
+        """
+        proofs = self._get_proofs([theorem['id'] for theorem in theorems])
+        chunks = []
+        for theorem in theorems:
+            for chunk in split_overlapping(proofs.get(theorem['id']), PROOF_CHUNK_TOKENS * CHARS_PER_TOKEN,
+                                           PROOF_CHUNK_OVERLAP_TOKENS * CHARS_PER_TOKEN):
+                chunks.append((theorem, chunk))
+        if not chunks:
+            return []
+        
+        texts = [chunk for _, chunk in chunks]
+        definition_lists = shortlist_definitions(texts, self.db_name)
+        theorem_lists = shortlist_theorems(texts, self.db_name, exclude_ids=[theorem['id'] for theorem, _ in chunks])
+        
+        jobs, used_tokens, skipped = [], {}, 0
+        for (theorem, chunk), definitions, cited in zip(chunks, definition_lists, theorem_lists):
+            if not definitions and not cited:
+                continue
+            prompt = self._proof_connection_prompt(theorem, chunk, definitions, cited)
+            tokens = estimate_tokens(prompt)
+            # The first chunk of a proof is always analyzed
+            if theorem['id'] in used_tokens and used_tokens[theorem['id']] + tokens > PROOF_TOKEN_BUDGET:
+                skipped += 1
+                continue
+            used_tokens[theorem['id']] = used_tokens.get(theorem['id'], 0) + tokens
+            jobs.append({'theorem': theorem, 'prompt': prompt, 'definitions': definitions, 'theorems': cited})
+        if skipped:
+            logger.info(f"   ✂️  {skipped} proof chunks over the per-theorem token budget skipped")
+        return jobs
+    
+    def _analyze_proofs_for_connections(self, jobs: List[Dict]):
+        """Send the proof chunks to the LLM in parallel and merge their answers into 'proof' edges."""
+        if not jobs:
+            return
+        logger.info(f"🔗 Analyzing {len(jobs)} proof chunks of {len({job['theorem']['id'] for job in jobs})} theorems...")
+        with ThreadPoolExecutor(max_workers=PROOF_WORKERS, thread_name_prefix='proof') as executor:
+            responses = list(executor.map(lambda job: self._call_llm(job['prompt'], max_tokens=300), jobs))
+        # Edges are merged on this thread; a connection found in several chunks is added once
+        for job, response in zip(jobs, responses):
+            self._process_proof_connection_response(job, response)
+    
+    def _proof_connection_prompt(self, theorem: Dict, chunk: str, definitions: List[Dict], theorems: List[Dict]) -> str:
+        """Build the LLM prompt that finds definitions and theorems used in a part of a proof."""
+        prompt = f"""Проанализируйте фрагмент доказательства теоремы «{theorem['name_ru']}» и найдите ВСЕ определения и теоремы из списков, которые в нем ИСПОЛЬЗУЮТСЯ.
+
+ФРАГМЕНТ ДОКАЗАТЕЛЬСТВА:
+{chunk}
+
+СПИСОК ОПРЕДЕЛЕНИЙ:
+"""
+        for i, defn in enumerate(definitions):
+            prompt += f"{i+1}. {defn['term_ru']}: {defn['definition_ru'][:100]}...\n"
+        
+        prompt += """
+СПИСОК ТЕОРЕМ:
+"""
+        for i, cited in enumerate(theorems):
+            prompt += f"{i+1}. {cited['name_ru']}: {cited['statement_ru'][:150]}...\n"
+        
+        prompt += """
+ЗАДАЧА:
+- Найдите определения, понятия которых упоминаются или используются во фрагменте
+- Найдите теоремы, на которые фрагмент ссылается или которые в нем применяются
+- Учитывайте синонимы, сокращения и математические обозначения
+
+ФОРМАТ ОТВЕТА:
+Только JSON-объект с номерами из списков, например
+{"определения": [1, 4], "теоремы": [2]}
+"""
+        return prompt
+    
+    def _process_proof_connection_response(self, job: Dict, response: str):
+        """Create 'proof' edges of a theorem from the LLM answer for one chunk of its proof."""
+        answer = self._parse_json_answer(response)
+        if answer is None:
+            logger.warning(f"Could not parse proof connection answer: {response[:200]}")
+            return
+        
+        theorem_id = job['theorem']['id']
+        connections_created = 0
+        for def_num in self._numbers(answer.get('определения')):
+            if 1 <= def_num <= len(job['definitions']):
+                defn = job['definitions'][def_num - 1]
+                # Edges already stored or queued are skipped
+                if self.edges.add(self.conn, 'theorem_definition', theorem_id, defn['id'], 'proof'):
+                    connections_created += 1
+                    logger.info(f"      🔗 Created theorem→definition: '{defn['term_ru']}' (proof)")
+        for theorem_num in self._numbers(answer.get('теоремы')):
+            if 1 <= theorem_num <= len(job['theorems']):
+                cited = job['theorems'][theorem_num - 1]
+                if cited['id'] != theorem_id and self.edges.add(self.conn, 'theorem_theorem', theorem_id,
+                                                                cited['id'], 'proof'):
+                    connections_created += 1
+                    logger.info(f"      🔗 Created theorem→theorem: '{cited['name_ru']}' (proof)")
+        
+        if connections_created > 0:
+            self.stats['connections_created'] += connections_created
+    
     def _report_final_stats(self):
         """Report final processing statistics."""
         logger.info("=" * 60)
         logger.info("📊 FINAL PROCESSING STATISTICS")
         logger.info("=" * 60)
         logger.info(f"Files processed: {self.stats['files_processed']}")
+        logger.info(f"  - Unchanged since the last run: {self.stats['files_unchanged']}")
+        logger.info(f"Items unchanged in edited files: {self.stats['items_unchanged']}")
         logger.info(f"Definitions processed: {self.stats['definitions_processed']}")
         logger.info(f"  - Added: {self.stats['definitions_added']}")
         logger.info(f"  - Duplicates: {self.stats['definitions_duplicates']}")
@@ -707,12 +1534,33 @@ class AlgorithmicAgent:
         logger.info(f"  - Added: {self.stats['theorems_added']}")
         logger.info(f"  - Duplicates: {self.stats['theorems_duplicates']}")
         logger.info(f"Connections created: {self.stats['connections_created']}")
+        cache_stats = get_verdict_cache().stats()
+        logger.info(f"LLM verdict cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['size']} stored")
+        for line in get_calibration().report():
+            logger.info(line)
         logger.info("=" * 60)
 
 
 def main():
     """Main entry point."""
-    agent = AlgorithmicAgent()
+    parser = argparse.ArgumentParser(description='Add parsed lectures to the knowledge base')
+    parser.add_argument('--db', default='math_base.db', help='SQLite database file')
+    parser.add_argument('--lectures-dir', default='parsed_lections', help='directory with parsed lecture JSON files')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of files prepared in parallel (database writes stay on one thread)')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='run parse, dedup, insert and link as concurrent asyncio stages')
+    parser.add_argument('--linker', choices=LINKERS, default='llm',
+                        help='find connections with the LLM, with term mentions only, or with term mentions '
+                             'first and the LLM for ambiguous ones')
+    parser.add_argument('--link-batch', type=int, default=1,
+                        help='number of new items analyzed for connections in one LLM request')
+    parser.add_argument('--proofs', action='store_true',
+                        help='also find the definitions and theorems used in proofs, chunk by chunk')
+    args = parser.parse_args()
+    
+    agent = AlgorithmicAgent(args.db, args.lectures_dir, workers=args.workers, pipeline=args.pipeline,
+                             linker=args.linker, link_batch_size=args.link_batch, analyze_proofs=args.proofs)
     agent.run()
 
 
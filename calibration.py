@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Score bands in which duplicate verification is decided without the LLM.
+
+`find_definition`/`find_theorem` send every candidate scoring above 0.1 to the
+LLM, including near-identical pairs and pairs that barely pass the threshold.
+Every LLM verdict is stored in the verdict cache (llm_cache.py) together with
+the candidate's similarity score; these past verdicts are the labelled set.
+
+For each kind of verification ('definition', 'theorem') two bands are learned:
+- accept: the widest range of top scores where "НЕТ" was rare enough,
+- reject: the widest range of bottom scores where "ДА" was rare enough.
+The error of a band is estimated as (wrong + 1) / (verdicts + 2), so a band
+with few verdicts is never trusted: with the default `--max-error 0.02` it
+needs at least 48 consistent verdicts. Candidates scoring inside a band are
+accepted or rejected locally; only the uncertain middle goes to the LLM.
+
+Calibration is opt-in: `CALIBRATION_PATH` names the file written by --fit.
+Bands are fitted on the verdicts of one model (LLM_MODEL unless --model is
+given) and are ignored, with a warning, while the gateway uses another model.
+
+Usage:
+    python calibration.py --fit
+    python calibration.py --fit --max-error 0.01 --model meta-llama/llama-4-maverick
+    python calibration.py --show
+"""
+
+import os
+import json
+import logging
+import argparse
+import threading
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from llm_cache import VerdictCache, DEFAULT_CACHE_PATH
+from llm_gateway import get_gateway
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CALIBRATION_PATH = 'calibration.json'
+DEFAULT_MAX_ERROR = float(os.getenv('CALIBRATION_MAX_ERROR', 0.02))
+KINDS = ('definition', 'theorem')
+
+
+class Band(NamedTuple):
+    """Scores >= bound (verdict True) or <= bound (verdict False) are decided as `verdict`."""
+    verdict: bool
+    bound: float
+    samples: int
+    errors: int
+
+    @property
+    def error_rate(self) -> float:
+        """Estimated share of wrong local decisions (Laplace-smoothed)."""
+        return (self.errors + 1) / (self.samples + 2)
+
+    def contains(self, score: float) -> bool:
+        return score >= self.bound if self.verdict else score <= self.bound
+
+    @property
+    def name(self) -> str:
+        return 'accept' if self.verdict else 'reject'
+
+
+def _widest_band(labels: Sequence[Tuple[float, bool]], verdict: bool, max_error: float) -> Optional[Band]:
+    """
+    Grows a band from the end of the score range that `verdict` is expected at.
+
+    Args:
+        labels: (score, verdict) pairs sorted by score, ascending
+        verdict: True for the accept band (top scores), False for the reject band
+        max_error: Largest allowed estimated error of the band
+
+    Returns:
+        Band or None: The band with the most verdicts within max_error
+    """
+    ordered = list(reversed(labels)) if verdict else list(labels)
+    best = None
+    errors = 0
+    for size, (score, label) in enumerate(ordered, 1):
+        errors += label != verdict
+        # A band ends at a verdict it decides correctly, so it does not grow into the
+        # other band on the strength of the verdicts before; and a bound between two
+        # equal scores cannot separate them
+        if label != verdict or (size < len(ordered) and ordered[size][0] == score):
+            continue
+        band = Band(verdict, score, size, errors)
+        if band.error_rate <= max_error:
+            best = band
+    return best
+
+
+def fit_bands(labels: Sequence[Tuple[float, bool]], max_error: float = DEFAULT_MAX_ERROR) -> List[Band]:
+    """
+    Learns the accept and reject bands of one kind of verification.
+
+    Args:
+        labels: (score, verdict) pairs of past LLM verdicts
+        max_error: Largest allowed estimated error of each band
+
+    Returns:
+        list: Up to two Band objects; empty if the verdicts do not support any band
+    """
+    labels = sorted(labels)
+    accept = _widest_band(labels, True, max_error)
+    reject = _widest_band(labels, False, max_error)
+    if accept and reject and reject.bound >= accept.bound:
+        logger.warning("Accept and reject bands overlap, calibration needs more verdicts")
+        return []
+    return [band for band in (accept, reject) if band]
+
+
+class Calibration:
+    """Learned bands per kind with counters of the verifications they decided."""
+
+    def __init__(self, bands: Dict[str, List[Band]], model: Optional[str] = None):
+        self.bands = bands
+        self.model = model
+        self._decided = {}
+        self._lock = threading.Lock()
+        self._mismatch_logged = False
+
+    def decide(self, kind: str, score: Optional[float]) -> Optional[bool]:
+        """
+        Returns the local verdict for a candidate score, or None if the LLM has to decide.
+        Bands fitted on another model than the gateway's decide nothing.
+        """
+        if score is None or not self._matches_model():
+            return None
+        for band in self.bands.get(kind, ()):
+            if band.contains(score):
+                with self._lock:
+                    self._decided[(kind, band.verdict)] = self._decided.get((kind, band.verdict), 0) + 1
+                return band.verdict
+        return None
+
+    def _matches_model(self) -> bool:
+        model = get_gateway().model
+        if self.model is None or self.model == model:
+            return True
+        with self._lock:
+            if not self._mismatch_logged:
+                logger.warning(f"Calibration was fitted on {self.model}, not {model}; every candidate goes to the LLM")
+                self._mismatch_logged = True
+        return False
+
+    def report(self) -> List[str]:
+        """Lines with the LLM calls saved by each band of this process and its estimated error."""
+        lines = []
+        for kind, bands in self.bands.items():
+            for band in bands:
+                saved = self._decided.get((kind, band.verdict), 0)
+                lines.append(f"Calibrated {kind} {band.name} band: {saved} LLM calls saved, "
+                             f"estimated error {band.error_rate:.1%}")
+        return lines
+
+    def save(self, path: str):
+        data = {
+            'model': self.model,
+            'bands': {kind: [band._asdict() for band in bands] for kind, bands in self.bands.items()},
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+
+    @classmethod
+    def load(cls, path: str) -> 'Calibration':
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        bands = {kind: [Band(**band) for band in kind_bands] for kind, kind_bands in data['bands'].items()}
+        return cls(bands, data.get('model'))
+
+
+class NullCalibration:
+    """Calibration stand-in used when it is disabled: every candidate goes to the LLM."""
+
+    bands = {}
+
+    def decide(self, kind, score):
+        return None
+
+    def report(self):
+        return []
+
+
+_calibration = None
+_calibration_lock = threading.Lock()
+
+
+def _open(path):
+    if not path:
+        return NullCalibration()
+    try:
+        return Calibration.load(path)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logger.error(f"Error loading calibration from {path}: {e}")
+        return NullCalibration()
+
+
+def get_calibration():
+    """Returns the shared calibration, loading CALIBRATION_PATH on first use (disabled if unset)."""
+    global _calibration
+    with _calibration_lock:
+        if _calibration is None:
+            _calibration = _open(os.getenv('CALIBRATION_PATH', ''))
+        return _calibration
+
+
+def configure_calibration(path: Optional[str] = DEFAULT_CALIBRATION_PATH):
+    """Replaces the shared calibration, e.g. in tests. `None` disables it."""
+    global _calibration
+    with _calibration_lock:
+        _calibration = _open(path)
+        return _calibration
+
+
+def fit_report(kind: str, labels: Sequence[Tuple[float, bool]], bands: List[Band]) -> List[str]:
+    """Describes the fitted bands and how many of the past LLM calls they would have saved."""
+    lines = [f"{kind}: {len(labels)} labelled verdicts"]
+    for band in bands:
+        sign = '>=' if band.verdict else '<='
+        lines.append(f"  {band.name} score {sign} {band.bound:.3f}: {band.samples} verdicts, "
+                     f"{band.errors} wrong, estimated error {band.error_rate:.1%}")
+    if not bands:
+        lines.append("  no band: not enough consistent verdicts")
+    saved = sum(band.samples for band in bands)
+    share = saved / len(labels) if labels else 0
+    lines.append(f"  LLM calls saved: {saved} of {len(labels)} ({share:.0%})")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Learn score bands that skip LLM duplicate verification')
+    parser.add_argument('--cache', default=os.getenv('LLM_CACHE_PATH', DEFAULT_CACHE_PATH),
+                        help='verdict cache with the labelled verdicts')
+    parser.add_argument('--path', default=os.getenv('CALIBRATION_PATH', DEFAULT_CALIBRATION_PATH),
+                        help='calibration file to write or show')
+    parser.add_argument('--fit', action='store_true', help='learn the bands and write them to --path')
+    parser.add_argument('--show', action='store_true', help='print the bands stored in --path')
+    parser.add_argument('--model', help='use only the verdicts of this model (default: the LLM_MODEL in use)')
+    parser.add_argument('--max-error', type=float, default=DEFAULT_MAX_ERROR,
+                        help='largest estimated error of a band (default: %(default)s)')
+    args = parser.parse_args()
+
+    if args.fit:
+        args.model = args.model or get_gateway().model
+        cache = VerdictCache(args.cache)
+        bands = {}
+        for kind in KINDS:
+            labels = cache.labels(kind, args.model)
+            bands[kind] = fit_bands(labels, args.max_error)
+            print('\n'.join(fit_report(kind, labels, bands[kind])))
+        cache.close()
+        Calibration(bands, args.model).save(args.path)
+        print(f"Calibration written to {args.path}; set CALIBRATION_PATH={args.path} to use it")
+    elif args.show:
+        calibration = Calibration.load(args.path)
+        for kind, bands in calibration.bands.items():
+            for band in bands:
+                sign = '>=' if band.verdict else '<='
+                print(f"{kind} {band.name}: score {sign} {band.bound:.3f}, estimated error {band.error_rate:.1%}")
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 import sqlite3
+from text_processing import normalize_key
 
 def create_database(db_name='math_base.db'):
     """
@@ -14,7 +15,9 @@ def create_database(db_name='math_base.db'):
         definition_ru TEXT NOT NULL,
         term_en TEXT,                  -- только слова на английском языке
         definition_en TEXT,            -- только слова на английском языке
-        formula TEXT                   -- формула ассоциированная с определением в tex формате
+        formula TEXT,                  -- формула ассоциированная с определением в tex формате
+        term_key TEXT,                 -- нормализованный термин для точного поиска (normalize_key)
+        definition_key TEXT            -- нормализованное определение для точного поиска
     );
     ''')
     # --- Создание таблицы для теорем ---
@@ -26,7 +29,9 @@ def create_database(db_name='math_base.db'):
         proof_ru TEXT,
         statement_en TEXT,             -- только слова на английском языке
         proof_en TEXT,                 -- только слова на английском языке
-        formula TEXT                   -- формула ассоциированная с формулировкой в tex формате
+        formula TEXT,                  -- формула ассоциированная с формулировкой в tex формате
+        name_key TEXT,                 -- нормализованное название для точного поиска (normalize_key)
+        statement_key TEXT             -- нормализованная формулировка для точного поиска
     );
     ''')
 
@@ -65,8 +70,121 @@ def create_database(db_name='math_base.db'):
     );
     ''')
 
+    # --- Создание таблиц манифеста файлов лекций и происхождения элементов ---
+    for statement in MANIFEST_SCHEMA + MENTION_SCHEMA + DUPLICATE_SCHEMA + LSH_SCHEMA:
+        cursor.execute(statement)
+
     conn.commit()
+    migrate_database(conn)
     conn.close()
 
+# Манифест файлов лекций: хэш содержимого, статус обработки и позиция последнего
+# зафиксированного элемента (для продолжения после сбоя); происхождение элементов:
+# файл, позиция и хэш элемента -> определение или теорема в базе
+MANIFEST_SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS lecture_files (
+        path TEXT PRIMARY KEY,
+        content_hash TEXT NOT NULL,
+        status TEXT NOT NULL,
+        next_item INTEGER NOT NULL DEFAULT 0,
+        added_ids TEXT,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS source_items (
+        path TEXT NOT NULL,
+        kind TEXT NOT NULL,            -- 'definition' или 'theorem'
+        position INTEGER NOT NULL,     -- номер элемента этого вида в файле
+        item_hash TEXT NOT NULL,       -- хэш элемента JSON
+        item_id INTEGER NOT NULL,      -- добавленная или совпавшая строка definitions/theorems
+        PRIMARY KEY (path, kind, position)
+    );
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_source_items_item ON source_items (kind, item_id)",
+)
+
+# Обратный индекс слов: основа слова -> теоремы и определения, в тексте которых она
+# встречается (mention_index.py); по нему находятся старые элементы, упоминающие новый термин
+MENTION_SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS mention_postings (
+        stem TEXT NOT NULL,
+        kind TEXT NOT NULL,            -- 'definition' или 'theorem'
+        item_id INTEGER NOT NULL,
+        PRIMARY KEY (stem, kind, item_id)
+    ) WITHOUT ROWID;
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_mention_postings_item ON mention_postings (kind, item_id)",
+)
+
+# Пары элементов, похожих на дубликаты (duplicate_sweep.py): item_id < other_id,
+# статус 'pending' до проверки, затем 'duplicate' или 'distinct'
+DUPLICATE_SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS duplicate_candidates (
+        kind TEXT NOT NULL,            -- 'definition' или 'theorem'
+        item_id INTEGER NOT NULL,
+        other_id INTEGER NOT NULL,
+        score REAL NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        checked_at TIMESTAMP,
+        PRIMARY KEY (kind, item_id, other_id)
+    ) WITHOUT ROWID;
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_duplicate_candidates_status ON duplicate_candidates (status, score)",
+)
+
+# Корзины MinHash/LSH (lsh_index.py): полоса подписи и ее хэш -> элементы; элементы,
+# попавшие в одну корзину с запросом, становятся кандидатами в дубликаты
+LSH_SCHEMA = (
+    '''
+    CREATE TABLE IF NOT EXISTS lsh_buckets (
+        kind TEXT NOT NULL,            -- 'definition' или 'theorem'
+        band INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+        item_id INTEGER NOT NULL,
+        PRIMARY KEY (kind, band, bucket, item_id)
+    ) WITHOUT ROWID;
+    ''',
+    "CREATE INDEX IF NOT EXISTS idx_lsh_buckets_item ON lsh_buckets (kind, item_id)",
+)
+
+# Нормализованные ключи: таблица -> [(колонка ключа, исходная колонка)]
+KEY_COLUMNS = {
+    'definitions': [('term_key', 'term_ru'), ('definition_key', 'definition_ru')],
+    'theorems': [('name_key', 'name_ru'), ('statement_key', 'statement_ru')],
+}
+
+def migrate_database(conn):
+    """
+    Приводит существующую базу к текущей схеме: добавляет колонки нормализованных ключей,
+    заполняет их для старых строк, создает индексы для точного поиска дубликатов,
+    таблицы манифеста файлов лекций и обратного индекса слов.
+    """
+    conn.create_function('normalize_key', 1, normalize_key, deterministic=True)
+    cursor = conn.cursor()
+    for statement in MANIFEST_SCHEMA + MENTION_SCHEMA + DUPLICATE_SCHEMA + LSH_SCHEMA:
+        cursor.execute(statement)
+    for table, key_columns in KEY_COLUMNS.items():
+        existing_columns = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+        if not existing_columns:
+            continue
+        for key_column, source_column in key_columns:
+            if key_column not in existing_columns:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {key_column} TEXT")
+        # --- Индекс по (ключ термина/названия, ключ текста) ---
+        columns = ', '.join(key_column for key_column, _ in key_columns)
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_keys ON {table} ({columns})")
+        # --- Заполнение ключей у строк, добавленных без них ---
+        first_key = key_columns[0][0]
+        if cursor.execute(f"SELECT 1 FROM {table} WHERE {first_key} IS NULL LIMIT 1").fetchone():
+            assignments = ', '.join(
+                f"{key_column} = normalize_key({source_column})" for key_column, source_column in key_columns
+            )
+            cursor.execute(f"UPDATE {table} SET {assignments} WHERE {first_key} IS NULL")
+    conn.commit()
+
 if __name__ == '__main__':
     create_database()
@@ -0,0 +1,98 @@
+"""
+Shared SQLite connections for the knowledge base.
+
+Every thread keeps one long-lived connection per database file instead of
+connecting and closing around each query. Connections use WAL journaling and
+`synchronous=NORMAL`, so a commit does not wait for a full fsync of the main file.
+search.py and AlgorithmicAgent use the same connection on a thread, so lookups
+see rows inserted earlier in an open transaction.
+
+Writes that belong together (e.g. all rows of one lecture file) go through
+`transaction()`, which commits once at the end and rolls back on failure.
+"""
+
+import os
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -65536",  # 64 MB page cache
+    "PRAGMA busy_timeout = 5000",
+)
+
+_local = threading.local()
+
+
+def connect(db_name='math_base.db'):
+    """Opens a new connection with the tuned pragmas applied."""
+    conn = sqlite3.connect(db_name)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def _file_id(db_name):
+    try:
+        stat = os.stat(db_name)
+    except OSError:
+        return None
+    return stat.st_dev, stat.st_ino
+
+
+def get_connection(db_name='math_base.db'):
+    """
+    Returns this thread's connection to the database, opening it on first use.
+    A database file that was deleted or replaced since gets a fresh connection.
+    """
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+
+    key = os.path.abspath(db_name)
+    entry = connections.get(key)
+    if entry is not None:
+        conn, file_id = entry
+        if file_id == _file_id(db_name):
+            return conn
+        conn.close()
+
+    conn = connect(db_name)
+    connections[key] = (conn, _file_id(db_name))
+    return conn
+
+
+def close_connection(db_name=None):
+    """Closes this thread's connection to one database (or to all of them)."""
+    connections = getattr(_local, 'connections', {})
+    keys = list(connections) if db_name is None else [os.path.abspath(db_name)]
+    for key in keys:
+        entry = connections.pop(key, None)
+        if entry is not None:
+            entry[0].close()
+
+
+@contextmanager
+def transaction(db_name='math_base.db'):
+    """
+    Runs a block of writes as one transaction on this thread's connection:
+    commits when the block finishes and rolls back if it raises.
+
+    Usage:
+        with transaction(db_name) as conn:
+            conn.execute("INSERT ...")
+    """
+    conn = get_connection(db_name)
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
@@ -0,0 +1,70 @@
+"""
+Union-find clustering helpers for duplicate detection.
+"""
+
+from typing import Dict, Hashable, List
+
+import numpy as np
+
+
+class UnionFind:
+    """Disjoint-set forest over arbitrary hashable items (union by size, path halving)."""
+
+    def __init__(self, items=()):
+        self._parent: Dict[Hashable, Hashable] = {}
+        self._size: Dict[Hashable, int] = {}
+        for item in items:
+            self.add(item)
+
+    def add(self, item):
+        if item not in self._parent:
+            self._parent[item] = item
+            self._size[item] = 1
+
+    def find(self, item):
+        self.add(item)
+        parent = self._parent
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    def union(self, a, b):
+        """Merges the sets of a and b and returns the root of the merged set."""
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return root_a
+        if self._size[root_a] < self._size[root_b]:
+            root_a, root_b = root_b, root_a
+        self._parent[root_b] = root_a
+        self._size[root_a] += self._size[root_b]
+        return root_a
+
+    def groups(self) -> List[List[Hashable]]:
+        """
+        Returns all sets as lists. Members keep the order in which they were added,
+        and sets are ordered by their first member.
+        """
+        groups = {}
+        for item in self._parent:
+            groups.setdefault(self.find(item), []).append(item)
+        return list(groups.values())
+
+
+def cluster_by_similarity(similarity: np.ndarray, threshold: float) -> List[List[int]]:
+    """
+    Clusters items whose pairwise similarity reaches the threshold.
+
+    Args:
+        similarity (np.ndarray): Symmetric (n, n) similarity matrix
+        threshold (float): Minimum similarity for two items to be merged
+
+    Returns:
+        list: Clusters as lists of item positions, ordered by their first (representative) item
+    """
+    n_items = similarity.shape[0]
+    union_find = UnionFind(range(n_items))
+    rows, cols = np.nonzero(np.triu(similarity >= threshold, k=1))
+    for a, b in zip(rows.tolist(), cols.tolist()):
+        union_find.union(a, b)
+    return union_find.groups()
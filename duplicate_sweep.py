@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Offline search for duplicates already stored in the database.
+
+Duplicates are normally caught before insertion, but an item slips in whenever
+`verify_with_llm` fails (an API error counts as "НЕТ") or a near copy was ranked
+below the top two candidates. This job scores every stored definition and theorem
+against all others with the same TF-IDF index and weights as `find_definition`
+and `find_theorem`. The sparse matrix product runs in blocks of rows
+(`SearchIndex.similar_pairs`), so tens of thousands of rows never need an n x n
+dense matrix. With `--lsh` only the pairs that share a MinHash/LSH bucket
+(lsh_index.py) are scored, which avoids comparing every pair at all.
+
+Pairs scoring at least the threshold are written to `duplicate_candidates` as
+'pending', best first. They can be reviewed by hand or confirmed in bulk with the
+LLM (`--confirm`), which marks them 'duplicate' or 'distinct'. Re-running the
+sweep replaces the pending pairs and keeps the checked ones.
+
+Usage:
+    python duplicate_sweep.py
+    python duplicate_sweep.py --threshold 0.6 --block-size 2000
+    python duplicate_sweep.py --lsh
+    python duplicate_sweep.py --confirm --limit 100
+    python duplicate_sweep.py --list 20
+"""
+
+import os
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from db import get_connection
+from create_database import migrate_database
+from search_index import get_index
+from calibration import get_calibration
+from lsh_index import ensure_lsh_index, lsh_pairs
+from search import (
+    DEFINITION_WEIGHTS, THEOREM_WEIGHTS, VERIFICATION_WORKERS, verify_with_llm, verify_theorem_match_with_llm
+)
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SWEEP_THRESHOLD = float(os.getenv("SWEEP_THRESHOLD", 0.5))
+SWEEP_BLOCK_SIZE = int(os.getenv("SWEEP_BLOCK_SIZE", 1000))
+# Pairs written per executemany
+INSERT_BATCH_SIZE = 10000
+
+# Kind of item -> table, score weights and the columns compared by the LLM
+SWEPT_KINDS = {
+    'definition': ('definitions', DEFINITION_WEIGHTS, ('term_ru', 'definition_ru')),
+    'theorem': ('theorems', THEOREM_WEIGHTS, ('name_ru', 'statement_ru')),
+}
+
+
+def sweep_duplicates(db_name: str = 'math_base.db', threshold: float = SWEEP_THRESHOLD,
+                     block_size: int = SWEEP_BLOCK_SIZE, use_lsh: bool = False) -> Dict[str, int]:
+    """
+    Ranks all pairs of stored items by similarity and records the likely duplicates.
+
+    Args:
+        db_name (str): Database file path
+        threshold (float): Minimum combined score of a recorded pair
+        block_size (int): Rows multiplied by the corpus at a time
+        use_lsh (bool): Score only the pairs that share an LSH bucket (lsh_index.py)
+
+    Returns:
+        dict: Kind -> number of pending pairs recorded
+    """
+    conn = get_connection(db_name)
+    if use_lsh:
+        ensure_lsh_index(conn)
+    found = {}
+    for kind, (table, weights, _) in SWEPT_KINDS.items():
+        index = get_index(db_name, table)
+        conn.execute("DELETE FROM duplicate_candidates WHERE kind = ? AND status = 'pending'", (kind,))
+        before = conn.total_changes
+        batch = []
+        pairs = _lsh_scored_pairs(conn, kind, index, weights, threshold) if use_lsh else \
+            index.similar_pairs(weights, threshold, block_size)
+        for item_id, other_id, score in pairs:
+            batch.append((kind, item_id, other_id, score))
+            if len(batch) >= INSERT_BATCH_SIZE:
+                _insert_pairs(conn, batch)
+                batch = []
+        _insert_pairs(conn, batch)
+        found[kind] = conn.total_changes - before
+        logger.info(f"{kind}: {found[kind]} candidate duplicate pairs among {len(index)} rows")
+    conn.commit()
+    return found
+
+
+def _lsh_scored_pairs(conn, kind, index, weights, threshold):
+    """Scores the pairs sharing an LSH bucket with TF-IDF, INSERT_BATCH_SIZE pairs at a time."""
+    # Read the pairs first: the caller writes to the same connection while consuming
+    pairs = list(lsh_pairs(conn, kind))
+    for start in range(0, len(pairs), INSERT_BATCH_SIZE):
+        chunk = pairs[start:start + INSERT_BATCH_SIZE]
+        for (item_id, other_id), score in zip(chunk, index.pair_similarity(chunk, weights).tolist()):
+            if score >= threshold:
+                yield item_id, other_id, score
+
+
+def _insert_pairs(conn, pairs):
+    # Pairs already checked keep their status
+    conn.executemany("""
+        INSERT OR IGNORE INTO duplicate_candidates (kind, item_id, other_id, score)
+        VALUES (?, ?, ?, ?)
+    """, pairs)
+
+
+def candidate_pairs(db_name: str = 'math_base.db', status: str = 'pending', kind: Optional[str] = None,
+                    limit: Optional[int] = None) -> List[dict]:
+    """
+    Returns recorded pairs with the given status, highest score first.
+
+    Returns:
+        list: Dicts with 'kind', 'item_id', 'other_id' and 'score'
+    """
+    query = "SELECT kind, item_id, other_id, score FROM duplicate_candidates WHERE status = ?"
+    params = [status]
+    if kind:
+        query += " AND kind = ?"
+        params.append(kind)
+    query += " ORDER BY score DESC, kind, item_id, other_id"
+    if limit:
+        query += " LIMIT ?"
+        params.append(limit)
+    rows = get_connection(db_name).execute(query, params).fetchall()
+    return [dict(zip(('kind', 'item_id', 'other_id', 'score'), row)) for row in rows]
+
+
+def confirm_pairs(db_name: str = 'math_base.db', limit: Optional[int] = None,
+                  workers: int = VERIFICATION_WORKERS) -> Dict[str, int]:
+    """
+    Asks the LLM about pending pairs (best first) and stores the verdicts.
+    Pairs inside a calibrated score band (calibration.py) are decided without it.
+
+    Returns:
+        dict: Status ('duplicate', 'distinct') -> number of pairs
+    """
+    pairs = candidate_pairs(db_name, limit=limit)
+    verdicts = {}
+    calibration = get_calibration()
+    jobs = []
+    for pair in pairs:
+        decision = calibration.decide(pair['kind'], pair['score'])
+        if decision is None:
+            jobs.append(pair)
+        else:
+            verdicts[id(pair)] = decision
+
+    conn = get_connection(db_name)
+    details = {}
+    for kind, (table, _, columns) in SWEPT_KINDS.items():
+        ids = {item for pair in jobs if pair['kind'] == kind for item in (pair['item_id'], pair['other_id'])}
+        details[kind] = {}
+        for row in conn.execute(f"SELECT id, {', '.join(columns)} FROM {table}"):
+            if row[0] in ids:
+                details[kind][row[0]] = row[1:]
+
+    def verify(pair):
+        rows = details[pair['kind']]
+        if pair['item_id'] not in rows or pair['other_id'] not in rows:
+            return None
+        texts = [text or '' for item in (pair['item_id'], pair['other_id']) for text in rows[item]]
+        if pair['kind'] == 'definition':
+            return verify_with_llm(*texts, pair['score'])
+        return verify_theorem_match_with_llm(*texts, pair['score'])
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='sweep') as pool:
+        for pair, verdict in zip(jobs, pool.map(verify, jobs)):
+            verdicts[id(pair)] = verdict
+
+    counts = {'duplicate': 0, 'distinct': 0}
+    updates = []
+    for pair in pairs:
+        verdict = verdicts.get(id(pair))
+        if verdict is None:
+            continue
+        status = 'duplicate' if verdict else 'distinct'
+        counts[status] += 1
+        updates.append((status, pair['kind'], pair['item_id'], pair['other_id']))
+    conn.executemany("""
+        UPDATE duplicate_candidates SET status = ?, checked_at = CURRENT_TIMESTAMP
+        WHERE kind = ? AND item_id = ? AND other_id = ?
+    """, updates)
+    conn.commit()
+    logger.info(f"Checked {len(updates)} pairs: {counts['duplicate']} duplicates, {counts['distinct']} distinct")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Find duplicates already stored in the knowledge base')
+    parser.add_argument('--db', default='math_base.db', help='database file (default: %(default)s)')
+    parser.add_argument('--threshold', type=float, default=SWEEP_THRESHOLD,
+                        help='minimum similarity of a candidate pair (default: %(default)s)')
+    parser.add_argument('--block-size', type=int, default=SWEEP_BLOCK_SIZE,
+                        help='rows multiplied at a time (default: %(default)s)')
+    parser.add_argument('--lsh', action='store_true', help='score only the pairs that share an LSH bucket')
+    parser.add_argument('--confirm', action='store_true', help='verify pending pairs with the LLM instead of sweeping')
+    parser.add_argument('--limit', type=int, help='verify at most this many pairs')
+    parser.add_argument('--list', type=int, metavar='N', help='print the N best pending pairs')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    migrate_database(get_connection(args.db))
+    if args.confirm:
+        confirm_pairs(args.db, args.limit)
+    elif args.list:
+        for pair in candidate_pairs(args.db, limit=args.list):
+            print(f"{pair['score']:.3f}  {pair['kind']} {pair['item_id']} ~ {pair['other_id']}")
+    else:
+        found = sweep_duplicates(args.db, args.threshold, args.block_size, args.lsh)
+        print(', '.join(f"{kind}: {count} pairs" for kind, count in found.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+In-memory buffer for knowledge-graph edges.
+
+Instead of a `SELECT 1` existence check and a separate `INSERT OR IGNORE` per edge,
+edges are collected in memory, deduplicated against the edges already stored
+(loaded once per table) and written with one `executemany` per table on `flush()`.
+"""
+
+import sqlite3
+import logging
+import threading
+from typing import Dict, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Edge kind -> (table, source column, target column, has context column)
+EDGE_TABLES = {
+    'theorem_definition': ('theorem_uses_definition', 'theorem_id', 'definition_id', True),
+    'theorem_theorem': ('theorem_uses_theorem', 'theorem_id', 'used_theorem_id', True),
+    'definition_definition': ('definition_uses_definition', 'definition_id', 'used_definition_id', False),
+}
+
+
+class EdgeBuffer:
+    """Collects edges of one unit of work and writes them in bulk. Safe to share between threads."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._existing: Dict[str, Set[Tuple[int, int]]] = {}
+        self._pending: Dict[str, Dict[Tuple[int, int], Optional[str]]] = {kind: {} for kind in EDGE_TABLES}
+
+    def _existing_edges(self, conn: sqlite3.Connection, kind: str) -> Set[Tuple[int, int]]:
+        if kind not in self._existing:
+            table, source_column, target_column, _ = EDGE_TABLES[kind]
+            rows = conn.execute(f"SELECT {source_column}, {target_column} FROM {table}").fetchall()
+            self._existing[kind] = set(rows)
+        return self._existing[kind]
+
+    def add(self, conn: sqlite3.Connection, kind: str, source_id: int, target_id: int,
+            context: Optional[str] = None) -> bool:
+        """
+        Queues an edge unless it is already stored or queued.
+
+        Returns:
+            bool: True if the edge is new
+        """
+        edge = (source_id, target_id)
+        with self._lock:
+            pending = self._pending[kind]
+            if edge in pending or edge in self._existing_edges(conn, kind):
+                return False
+            pending[edge] = context
+            return True
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(pending) for pending in self._pending.values())
+
+    def flush(self, conn: sqlite3.Connection) -> int:
+        """
+        Writes queued edges with one executemany per table. The caller commits.
+
+        Returns:
+            int: Number of edges written
+        """
+        with self._lock:
+            written = 0
+            for kind, pending in self._pending.items():
+                if not pending:
+                    continue
+                table, source_column, target_column, has_context = EDGE_TABLES[kind]
+                if has_context:
+                    conn.executemany(
+                        f"INSERT OR IGNORE INTO {table} ({source_column}, {target_column}, context) VALUES (?, ?, ?)",
+                        [(source_id, target_id, context) for (source_id, target_id), context in pending.items()]
+                    )
+                else:
+                    conn.executemany(
+                        f"INSERT OR IGNORE INTO {table} ({source_column}, {target_column}) VALUES (?, ?)",
+                        list(pending)
+                    )
+                self._existing_edges(conn, kind).update(pending)
+                written += len(pending)
+                pending.clear()
+            return written
+
+    def reset(self):
+        """Drops queued edges and the loaded edge sets, e.g. after a rollback."""
+        with self._lock:
+            self._existing.clear()
+            for pending in self._pending.values():
+                pending.clear()
@@ -0,0 +1,262 @@
+"""
+Streaming reader for parsed lecture files.
+
+Lecture exports can hold many lectures in one JSON file. Instead of loading the
+whole document with `json.load`, the reader walks its structure in chunks and
+decodes only the individual definitions and theorems, so memory stays bounded
+by the chunk size and the largest single item. The encoding is detected once
+from a byte prefix instead of re-parsing the file for every candidate encoding.
+AlgorithmicAgent still collects the decoded items of one file, because copy
+clustering compares all items of a file with each other; memory then grows with
+the items of the largest file, not with the size of the whole export.
+
+Supported layouts (the same as AlgorithmicAgent always accepted):
+
+    [{"data": [{"output": {...}}, ...]}]    export with a data array in the first element
+    [{"output": {...}}, ...]                list of outputs
+    {"definitions": [...], "theorems": [...]}   a single output
+
+Usage:
+    for kind, item in iter_items('parsed_lections/lecture_1.json'):
+        ...  # kind is 'definition' or 'theorem'
+"""
+
+import re
+import json
+import codecs
+import logging
+from typing import Dict, Iterator, Tuple
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1 << 16
+PREFIX_SIZE = 1 << 16
+
+# Output key -> kind of the items it holds
+_ITEM_KINDS = {'definitions': 'definition', 'theorems': 'theorem'}
+_WHITESPACE = ' \t\n\r'
+_SCALAR_END = re.compile(r'[\s,\]}]')
+_decoder = json.JSONDecoder()
+
+
+def detect_encoding(prefix: bytes) -> str:
+    """
+    Guesses the encoding of a lecture file from its first bytes.
+
+    Args:
+        prefix (bytes): Beginning of the file
+
+    Returns:
+        str: 'utf-8-sig' or 'utf-16' for files with a BOM, 'utf-8' if the prefix is valid UTF-8,
+             'cp1251' if the other bytes look like Cyrillic words, 'latin1' otherwise
+    """
+    if prefix.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if prefix.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+    try:
+        # A multi-byte character cut off at the end of the prefix is not an error
+        codecs.getincrementaldecoder('utf-8')().decode(prefix, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+    # Cyrillic words in cp1251 are runs of bytes >= 0x80, while accented
+    # Latin letters in latin1 mostly stand alone between ASCII letters
+    high = [byte >= 0x80 for byte in prefix]
+    high_count = sum(high)
+    in_runs = sum(1 for i, is_high in enumerate(high)
+                  if is_high and ((i > 0 and high[i - 1]) or (i + 1 < len(high) and high[i + 1])))
+    if high_count and in_runs / high_count > 0.5:
+        return 'cp1251'
+    return 'latin1'
+
+
+class _JSONStream:
+    """Pull parser over a text file that decodes one JSON value at a time."""
+
+    def __init__(self, file, chunk_size: int = CHUNK_SIZE):
+        self._file = file
+        self._chunk_size = chunk_size
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        """Appends the next chunk, dropping the consumed part of the buffer."""
+        if self._eof:
+            return False
+        chunk = self._file.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Skips whitespace and returns the next character ('' at the end of the file)."""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ''
+
+    def _expect(self, char: str):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected '{char}', found '{found or 'end of file'}'")
+        self._pos += 1
+
+    def value(self):
+        """Decodes the next complete value, reading more chunks until it fits in the buffer."""
+        if self.peek() not in '{["':
+            # A number or literal is complete once a delimiter follows it
+            while not _SCALAR_END.search(self._buffer, self._pos) and self._fill():
+                pass
+        while True:
+            try:
+                value, self._pos = _decoder.raw_decode(self._buffer, self._pos)
+                return value
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+
+    def skip(self):
+        """Skips the next value without decoding nested arrays and objects as a whole."""
+        char = self.peek()
+        if char == '[':
+            for _ in self.array():
+                self.skip()
+        elif char == '{':
+            for _ in self.object():
+                self.skip()
+        else:
+            self.value()
+
+    def array(self) -> Iterator[int]:
+        """Iterates over an array; the caller consumes each element before the next step."""
+        self._expect('[')
+        if self.peek() == ']':
+            self._pos += 1
+            return
+        index = 0
+        while True:
+            yield index
+            index += 1
+            char = self.peek()
+            self._pos += 1
+            if char == ']':
+                return
+            if char != ',':
+                raise ValueError(f"Expected ',' or ']' in array, found '{char or 'end of file'}'")
+
+    def object(self) -> Iterator[str]:
+        """Iterates over the keys of an object; the caller consumes each value."""
+        self._expect('{')
+        if self.peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = self.value()
+            if not isinstance(key, str):
+                raise ValueError("Object key is not a string")
+            self._expect(':')
+            yield key
+            char = self.peek()
+            self._pos += 1
+            if char == '}':
+                return
+            if char != ',':
+                raise ValueError(f"Expected ',' or '}}' in object, found '{char or 'end of file'}'")
+
+
+def _output_items(stream: _JSONStream) -> Iterator[Tuple[str, Dict]]:
+    """Items of one output object ({"definitions": [...], "theorems": [...]})."""
+    if stream.peek() != '{':
+        stream.skip()
+        return
+    for key in stream.object():
+        kind = _ITEM_KINDS.get(key)
+        if kind is None or stream.peek() != '[':
+            stream.skip()
+            continue
+        for _ in stream.array():
+            item = stream.value()
+            if isinstance(item, dict):
+                yield kind, item
+            else:
+                logger.warning(f"Skipping {kind} that is not an object")
+
+
+def _element_items(stream: _JSONStream) -> Iterator[Tuple[str, Dict]]:
+    """Items of one {"output": {...}} element."""
+    if stream.peek() != '{':
+        stream.skip()
+        return
+    for key in stream.object():
+        if key == 'output':
+            yield from _output_items(stream)
+        else:
+            stream.skip()
+
+
+def _array_items(stream: _JSONStream) -> Iterator[Tuple[str, Dict]]:
+    """Items of a top-level array: an export with data[0]['data'] or a list of outputs."""
+    export = False
+    for index in stream.array():
+        if export:
+            # Only the first element of an export is read
+            stream.skip()
+        elif index == 0 and stream.peek() == '{':
+            # The first element decides the layout; its own output only counts without a data array
+            own_output = []
+            for key in stream.object():
+                if key == 'data':
+                    export = True
+                    if stream.peek() == '[':
+                        for _ in stream.array():
+                            yield from _element_items(stream)
+                    else:
+                        stream.skip()
+                elif key == 'output':
+                    own_output = list(_output_items(stream))
+                else:
+                    stream.skip()
+            if not export:
+                yield from own_output
+        else:
+            yield from _element_items(stream)
+
+
+def iter_items(file_path: str, chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[str, Dict]]:
+    """
+    Streams the definitions and theorems of a lecture file.
+
+    Args:
+        file_path (str): Path of the JSON file
+        chunk_size (int): Number of characters read at a time
+
+    Yields:
+        tuple: ('definition' or 'theorem', item dict), in file order
+
+    Raises:
+        ValueError: If the file is not valid JSON or cannot be decoded
+        OSError: If the file cannot be read
+    """
+    with open(file_path, 'rb') as f:
+        encoding = detect_encoding(f.read(PREFIX_SIZE))
+    logger.info(f"Reading {file_path} as {encoding}")
+
+    with open(file_path, 'r', encoding=encoding) as f:
+        stream = _JSONStream(f, chunk_size)
+        first = stream.peek()
+        if first == '[':
+            yield from _array_items(stream)
+        elif first == '{':
+            yield from _output_items(stream)
+        else:
+            raise ValueError(f"Unsupported JSON layout in {file_path}")
+        if stream.peek():
+            raise ValueError(f"Extra data after the JSON document in {file_path}")
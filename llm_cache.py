@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Persistent cache of LLM verdicts ("ДА"/"НЕТ") for the verify_*_with_llm functions.
+
+Verdicts are stored in a separate SQLite file keyed by a hash of the verification
+kind, the model name, the sampling temperature, the version of the prompt template
+and the prompt inputs with whitespace normalized, so re-ingesting the same lecture
+does not repeat identical LLM calls. Case is kept: in mathematics "A" and "a" may
+name different objects. The cache is bounded: once it grows past `max_entries`,
+the least recently used verdicts are evicted. The last use of an entry is
+refreshed at most once per `TOUCH_INTERVAL`, so cache hits do not write.
+
+Verdicts stored together with the similarity score of the candidate double as the
+labelled set from which calibration.py learns its score bands.
+
+Usage:
+    python llm_cache.py --stats
+    python llm_cache.py --invalidate meta-llama/llama-4-maverick
+"""
+
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import logging
+import argparse
+import threading
+import unicodedata
+from typing import List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = 'llm_cache.db'
+DEFAULT_MAX_ENTRIES = 100000
+# How many writes may happen between two size checks
+EVICTION_CHECK_INTERVAL = 100
+# Seconds after which a hit refreshes the last use of an entry
+TOUCH_INTERVAL = 24 * 60 * 60
+
+
+def normalize_input(text) -> str:
+    """Normalizes the whitespace of a prompt input so that formatting-only differences hit the same entry."""
+    if text is None:
+        return ''
+    text = unicodedata.normalize('NFC', str(text))
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def make_key(kind: str, model: str, inputs: Sequence, temperature: Optional[float] = None,
+             prompt_version: Optional[int] = None) -> str:
+    """Builds the cache key from the verification kind, model name, temperature, prompt version and inputs."""
+    settings = ['' if temperature is None else repr(float(temperature)),
+                '' if prompt_version is None else str(prompt_version)]
+    payload = '\x1f'.join([kind, model] + settings + [normalize_input(item) for item in inputs])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class VerdictCache:
+    """On-disk LRU cache of boolean LLM verdicts."""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS verdicts (
+                key TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                model TEXT NOT NULL,
+                verdict INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                score REAL
+            )
+        ''')
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(verdicts)')}
+        if 'score' not in columns:
+            self._conn.execute('ALTER TABLE verdicts ADD COLUMN score REAL')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_verdicts_last_used ON verdicts (last_used)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_verdicts_model ON verdicts (model)')
+        self._conn.commit()
+
+    def get(self, kind: str, model: str, inputs: Sequence, temperature: Optional[float] = None,
+            prompt_version: Optional[int] = None) -> Optional[bool]:
+        """Returns the cached verdict or None if the pair has not been judged yet."""
+        key = make_key(kind, model, inputs, temperature, prompt_version)
+        with self._lock:
+            row = self._conn.execute('SELECT verdict, last_used FROM verdicts WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            now = time.time()
+            # Eviction only needs a coarse order, so most hits do not write
+            if now - row[1] > TOUCH_INTERVAL:
+                self._conn.execute('UPDATE verdicts SET last_used = ? WHERE key = ?', (now, key))
+                self._conn.commit()
+            return bool(row[0])
+
+    def put(self, kind: str, model: str, inputs: Sequence, verdict: bool, score: Optional[float] = None,
+            temperature: Optional[float] = None, prompt_version: Optional[int] = None):
+        """
+        Stores a verdict, evicting the least recently used entries if the cache is full.
+        `score` is the similarity score of the judged candidate, if known.
+        """
+        key = make_key(kind, model, inputs, temperature, prompt_version)
+        with self._lock:
+            self._conn.execute('''
+                INSERT OR REPLACE INTO verdicts (key, kind, model, verdict, last_used, score)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (key, kind, model, int(bool(verdict)), time.time(), None if score is None else float(score)))
+            self._writes += 1
+            if self._writes % EVICTION_CHECK_INTERVAL == 0:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        size = self._conn.execute('SELECT COUNT(*) FROM verdicts').fetchone()[0]
+        excess = size - self.max_entries
+        if excess > 0:
+            self._conn.execute('''
+                DELETE FROM verdicts WHERE key IN (
+                    SELECT key FROM verdicts ORDER BY last_used LIMIT ?
+                )
+            ''', (excess,))
+            logger.info(f"Evicted {excess} cached LLM verdicts")
+
+    def invalidate(self, model: Optional[str] = None) -> int:
+        """Removes cached verdicts of one model (or all of them). Returns the number removed."""
+        with self._lock:
+            if model is None:
+                cursor = self._conn.execute('DELETE FROM verdicts')
+            else:
+                cursor = self._conn.execute('DELETE FROM verdicts WHERE model = ?', (model,))
+            self._conn.commit()
+            return cursor.rowcount
+
+    def labels(self, kind: str, model: Optional[str] = None) -> List[Tuple[float, bool]]:
+        """Returns (score, verdict) of the stored verdicts of one kind that have a score."""
+        query = 'SELECT score, verdict FROM verdicts WHERE kind = ? AND score IS NOT NULL'
+        params = [kind]
+        if model is not None:
+            query += ' AND model = ?'
+            params.append(model)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [(score, bool(verdict)) for score, verdict in rows]
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters of this process and the number of stored verdicts."""
+        with self._lock:
+            size = self._conn.execute('SELECT COUNT(*) FROM verdicts').fetchone()[0]
+        return {'hits': self.hits, 'misses': self.misses, 'size': size}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class NullVerdictCache:
+    """Cache stand-in used when caching is disabled (LLM_CACHE_PATH set to an empty string)."""
+
+    hits = 0
+    misses = 0
+
+    def get(self, kind, model, inputs, temperature=None, prompt_version=None):
+        return None
+
+    def put(self, kind, model, inputs, verdict, score=None, temperature=None, prompt_version=None):
+        pass
+
+    def labels(self, kind, model=None):
+        return []
+
+    def invalidate(self, model=None):
+        return 0
+
+    def stats(self):
+        return {'hits': 0, 'misses': 0, 'size': 0}
+
+    def close(self):
+        pass
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_verdict_cache():
+    """Returns the shared verdict cache, opening it on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            path = os.getenv('LLM_CACHE_PATH', DEFAULT_CACHE_PATH)
+            max_entries = int(os.getenv('LLM_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES))
+            _cache = VerdictCache(path, max_entries) if path else NullVerdictCache()
+        return _cache
+
+
+def configure_verdict_cache(path: Optional[str] = DEFAULT_CACHE_PATH, max_entries: int = DEFAULT_MAX_ENTRIES):
+    """Replaces the shared cache, e.g. to point tests at a temporary file. `None` disables caching."""
+    global _cache
+    with _cache_lock:
+        if _cache is not None:
+            _cache.close()
+        _cache = VerdictCache(path, max_entries) if path else NullVerdictCache()
+        return _cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect or clear the LLM verdict cache')
+    parser.add_argument('--path', default=os.getenv('LLM_CACHE_PATH', DEFAULT_CACHE_PATH))
+    parser.add_argument('--stats', action='store_true', help='print the number of cached verdicts')
+    parser.add_argument('--invalidate', metavar='MODEL', help='remove verdicts of MODEL ("all" for every model)')
+    args = parser.parse_args()
+
+    cache = VerdictCache(args.path)
+    if args.invalidate:
+        model = None if args.invalidate == 'all' else args.invalidate
+        print(f"Removed {cache.invalidate(model)} cached verdicts")
+    if args.stats or not args.invalidate:
+        print(f"Cached verdicts: {cache.stats()['size']}")
+    cache.close()
+
+
+if __name__ == '__main__':
+    main()
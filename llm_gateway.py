@@ -0,0 +1,132 @@
+"""
+Shared LLM client gateway.
+
+search.py and algorithmic_agent.py send every request through one OpenAI-compatible
+client that keeps its HTTP connections alive in a pool, instead of constructing
+a new ChatOpenAI/OpenAI client (and a new TLS connection) per call.
+
+Model, temperature, timeouts and the endpoint are configured in one place, either
+through environment variables or with `configure_gateway()`:
+    LLM_BASE_URL         (default: https://openrouter.ai/api/v1)
+    OPENROUTER_API_KEY
+    LLM_MODEL            (default: meta-llama/llama-4-maverick)
+    LLM_TEMPERATURE      (default: 0.1)
+    LLM_TIMEOUT          (seconds, default: 60)
+    LLM_MAX_CONNECTIONS  (default: 10)
+"""
+
+import os
+import logging
+import threading
+from typing import Optional
+
+import httpx
+from openai import OpenAI
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = "https://openrouter.ai/api/v1"
+DEFAULT_MODEL = "meta-llama/llama-4-maverick"
+DEFAULT_TEMPERATURE = 0.1
+DEFAULT_TIMEOUT = 60.0
+DEFAULT_MAX_CONNECTIONS = 10
+
+# Rough size of a token of Russian text mixed with LaTeX, in characters
+CHARS_PER_TOKEN = 3
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate number of prompt tokens of a text, without loading a tokenizer."""
+    return len(text or '') // CHARS_PER_TOKEN + 1
+
+
+class LLMGateway:
+    """Reusable chat-completion client with HTTP keep-alive and connection pooling."""
+
+    def __init__(self, base_url: Optional[str] = None, api_key: Optional[str] = None,
+                 model: Optional[str] = None, temperature: Optional[float] = None,
+                 timeout: Optional[float] = None, max_connections: Optional[int] = None):
+        self.base_url = base_url or os.getenv("LLM_BASE_URL", DEFAULT_BASE_URL)
+        self.api_key = api_key or os.getenv("OPENROUTER_API_KEY")
+        self.model = model or os.getenv("LLM_MODEL", DEFAULT_MODEL)
+        self.temperature = temperature if temperature is not None else float(
+            os.getenv("LLM_TEMPERATURE", DEFAULT_TEMPERATURE))
+        self.timeout = timeout or float(os.getenv("LLM_TIMEOUT", DEFAULT_TIMEOUT))
+        self.max_connections = max_connections or int(
+            os.getenv("LLM_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS))
+        self._client = None
+        self._http_client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> OpenAI:
+        """The underlying OpenAI client, created on first use."""
+        with self._lock:
+            if self._client is None:
+                self._http_client = httpx.Client(
+                    timeout=httpx.Timeout(self.timeout),
+                    limits=httpx.Limits(
+                        max_connections=self.max_connections,
+                        max_keepalive_connections=self.max_connections
+                    )
+                )
+                self._client = OpenAI(
+                    base_url=self.base_url,
+                    api_key=self.api_key,
+                    http_client=self._http_client
+                )
+            return self._client
+
+    def complete(self, prompt: str, max_tokens: Optional[int] = None,
+                 temperature: Optional[float] = None) -> str:
+        """
+        Sends a single user message and returns the stripped text of the answer.
+        Raises on API errors; callers decide how to degrade.
+        """
+        kwargs = {}
+        if max_tokens is not None:
+            kwargs['max_tokens'] = max_tokens
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=self.temperature if temperature is None else temperature,
+            **kwargs
+        )
+        return (response.choices[0].message.content or "").strip()
+
+    def close(self):
+        """Closes pooled connections."""
+        with self._lock:
+            if self._http_client is not None:
+                self._http_client.close()
+            self._client = None
+            self._http_client = None
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway() -> LLMGateway:
+    """Returns the shared gateway, creating it from environment settings on first use."""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = LLMGateway()
+        return _gateway
+
+
+def configure_gateway(**settings) -> LLMGateway:
+    """
+    Replaces the shared gateway, e.g. to point tests at a local OpenAI-compatible server:
+        configure_gateway(base_url="http://127.0.0.1:8000/v1", api_key="test")
+    """
+    global _gateway
+    with _gateway_lock:
+        if _gateway is not None:
+            _gateway.close()
+        _gateway = LLMGateway(**settings)
+        return _gateway
@@ -1,6 +1,7 @@
 import sqlite3
 import re
 from create_database import create_database
+from text_processing import normalize_key
 
 def extract_main_formula(text):
     """Извлекает самую длинную формулу из текста."""
@@ -146,8 +147,8 @@ def load_data(db_name='math_base.db'):
             item_id = existing_def[0]
             print(f"Определение '{term_ru}' уже существует (ID: {item_id}). Пропускаем.")
         else:
-            cursor.execute("INSERT INTO definitions (term_ru, definition_ru, formula) VALUES (?, ?, ?)",
-                           (term_ru, definition_ru, formula))
+            cursor.execute("INSERT INTO definitions (term_ru, definition_ru, formula, term_key, definition_key) VALUES (?, ?, ?, ?, ?)",
+                           (term_ru, definition_ru, formula, normalize_key(term_ru), normalize_key(definition_ru)))
             item_id = cursor.lastrowid
             print(f"Добавлено определение: '{term_ru}' (ID: {item_id})")
         
@@ -167,8 +168,8 @@ def load_data(db_name='math_base.db'):
             item_id = existing_theorem[0]
             print(f"Теорема '{name_ru}' уже существует (ID: {item_id}). Пропускаем.")
         else:
-            cursor.execute("INSERT INTO theorems (name_ru, statement_ru, proof_ru, formula) VALUES (?, ?, ?, ?)",
-                           (name_ru, statement_ru, proof_ru, formula))
+            cursor.execute("INSERT INTO theorems (name_ru, statement_ru, proof_ru, formula, name_key, statement_key) VALUES (?, ?, ?, ?, ?, ?)",
+                           (name_ru, statement_ru, proof_ru, formula, normalize_key(name_ru), normalize_key(statement_ru)))
             item_id = cursor.lastrowid
             print(f"Добавлена теорема: '{name_ru}' (ID: {item_id})")
         
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+MinHash/LSH blocking of duplicate candidates.
+
+Ranking a new item with TF-IDF costs one product with the whole table, and the
+duplicate sweep compares every pair. This index narrows both down: each stored
+definition (term and text) and theorem (name and statement) is reduced to a
+MinHash signature of the `SHINGLE_SIZE`-word shingles of its `preprocess_text`
+output. The signature is cut into `BANDS` bands, and `lsh_buckets` maps every
+(band, hash of the band) to the items in that bucket. Items that share a bucket
+with a query are its candidates; a few indexed lookups find them, however large
+the table. Two texts with shingle Jaccard similarity s share a bucket with
+probability 1 - (1 - s^r)^b (r = NUM_PERM / BANDS rows per band). With 64 and
+32 that is 0.5 at s = 0.15 and 0.99 at s = 0.4, so paraphrases are kept and
+unrelated items are not.
+
+Buckets are written in the same transaction as the item (like mention_index.py).
+Older databases and rows inserted around the agent (load_lecture_1.py) are
+backfilled on the first run or the first blocked lookup. With `LSH_BLOCKING=1`,
+search.py ranks only the candidates with TF-IDF instead of the whole table, and
+`duplicate_sweep.py --lsh` scores only the pairs that share a bucket, skipping
+buckets larger than MAX_BUCKET_SIZE.
+
+NUM_PERM, BANDS and SHINGLE_SIZE define the stored buckets; after changing them
+run `python lsh_index.py --rebuild`.
+
+Usage:
+    ids = lsh_candidates(conn, 'definition', term_ru, definition_ru)
+    python lsh_index.py --stats
+"""
+
+import zlib
+import sqlite3
+import hashlib
+import logging
+import argparse
+from typing import Dict, Iterator, List, Set, Tuple
+
+import numpy as np
+
+from text_processing import preprocess_text
+from create_database import migrate_database
+from db import get_connection
+
+logger = logging.getLogger(__name__)
+
+NUM_PERM = 64
+BANDS = 32
+SHINGLE_SIZE = 2
+# Buckets with more items are left out of the pairwise sweep (lsh_pairs)
+MAX_BUCKET_SIZE = 100
+# Prime above 2^32: h(x) = (a * x + b) mod P permutes the 32-bit shingle hashes
+_PRIME = np.uint64(4294967311)
+_random = np.random.RandomState(2024)
+_A = _random.randint(1, 2 ** 31, size=NUM_PERM).astype(np.uint64)
+_B = _random.randint(0, 2 ** 31, size=NUM_PERM).astype(np.uint64)
+
+# Kind of item -> table and the text columns that are hashed together
+LSH_COLUMNS = {
+    'definition': ('definitions', ('term_ru', 'definition_ru')),
+    'theorem': ('theorems', ('name_ru', 'statement_ru')),
+}
+
+
+def shingles(*texts: str) -> Set[str]:
+    """Word shingles of the preprocessed texts; a shorter text is one shingle."""
+    words = preprocess_text(' '.join(text or '' for text in texts)).split()
+    if len(words) <= SHINGLE_SIZE:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def minhash_signature(*texts: str) -> np.ndarray:
+    """Returns the NUM_PERM minimum hashes of the shingles, or an empty array for an empty text."""
+    items = shingles(*texts)
+    if not items:
+        return np.array([], dtype=np.uint64)
+    hashes = np.array([zlib.crc32(item.encode('utf-8')) for item in items], dtype=np.uint64)
+    return ((np.outer(hashes, _A) + _B) % _PRIME).min(axis=0)
+
+
+def band_keys(signature: np.ndarray) -> List[int]:
+    """Hashes each band of a signature to a signed 64-bit bucket key (SQLite INTEGER)."""
+    if signature.size == 0:
+        return []
+    return [
+        int.from_bytes(hashlib.blake2b(band.tobytes(), digest_size=8).digest(), 'little', signed=True)
+        for band in np.split(signature, BANDS)
+    ]
+
+
+def add_item(conn: sqlite3.Connection, kind: str, item_id: int, *texts: str):
+    """Puts one item into its buckets (does not commit)."""
+    conn.executemany(
+        "INSERT OR IGNORE INTO lsh_buckets (kind, band, bucket, item_id) VALUES (?, ?, ?, ?)",
+        [(kind, band, bucket, item_id) for band, bucket in enumerate(band_keys(minhash_signature(*texts)))]
+    )
+
+
+def remove_items(conn: sqlite3.Connection, kind: str, item_ids: List[int]):
+    """Drops the buckets of deleted items (does not commit)."""
+    conn.executemany("DELETE FROM lsh_buckets WHERE kind = ? AND item_id = ?",
+                     [(kind, item_id) for item_id in item_ids])
+
+
+def ensure_lsh_index(conn: sqlite3.Connection) -> int:
+    """
+    Hashes the rows that have no buckets, e.g. the whole database the first time it
+    is opened with this version, or rows inserted around the agent, and commits.
+    Rows with no words have no buckets and are checked again on every call.
+
+    Returns:
+        int: Number of items hashed
+    """
+    hashed = 0
+    for kind, (table, columns) in LSH_COLUMNS.items():
+        # Not the ids above the last hashed one: another writer may have added lower ones
+        rows = conn.execute(
+            f"""
+            SELECT id, {', '.join(columns)} FROM {table}
+            WHERE id NOT IN (SELECT item_id FROM lsh_buckets WHERE kind = ?) ORDER BY id
+            """,
+            (kind,)
+        ).fetchall()
+        for item_id, *texts in rows:
+            add_item(conn, kind, item_id, *texts)
+        hashed += len(rows)
+    conn.commit()
+    if hashed:
+        logger.info(f"Hashed {hashed} stored items into LSH buckets")
+    return hashed
+
+
+def lsh_candidates(conn: sqlite3.Connection, kind: str, *texts: str) -> Set[int]:
+    """
+    Finds the stored items that share at least one bucket with the texts.
+
+    Returns:
+        set: IDs of the candidate items
+    """
+    keys = band_keys(minhash_signature(*texts))
+    if not keys:
+        return set()
+    values = ', '.join('(?, ?)' for _ in keys)
+    rows = conn.execute(
+        f"SELECT DISTINCT item_id FROM lsh_buckets WHERE kind = ? AND (band, bucket) IN (VALUES {values})",
+        [kind] + [value for band, bucket in enumerate(keys) for value in (band, bucket)]
+    ).fetchall()
+    return {row[0] for row in rows}
+
+
+def lsh_pairs(conn: sqlite3.Connection, kind: str,
+              max_bucket_size: int = MAX_BUCKET_SIZE) -> Iterator[Tuple[int, int]]:
+    """
+    Yields every pair of stored items (lower ID first) that share at least one bucket.
+    A bucket of n items gives n^2 / 2 pairs, so buckets with more than `max_bucket_size`
+    items (usually very short or boilerplate texts) are skipped and logged.
+    """
+    oversized = conn.execute("""
+        SELECT COUNT(*) AS size FROM lsh_buckets WHERE kind = ?
+        GROUP BY band, bucket HAVING size > ?
+    """, (kind, max_bucket_size)).fetchall()
+    if oversized:
+        logger.warning(f"Skipped {len(oversized)} {kind} LSH buckets with more than {max_bucket_size} items "
+                       f"(largest: {max(row[0] for row in oversized)})")
+    cursor = conn.execute("""
+        SELECT DISTINCT a.item_id, b.item_id FROM lsh_buckets a
+        JOIN lsh_buckets b ON b.kind = a.kind AND b.band = a.band AND b.bucket = a.bucket AND b.item_id > a.item_id
+        WHERE a.kind = ? AND (a.band, a.bucket) NOT IN (
+            SELECT band, bucket FROM lsh_buckets WHERE kind = ? GROUP BY band, bucket HAVING COUNT(*) > ?
+        )
+    """, (kind, kind, max_bucket_size))
+    yield from cursor
+
+
+def bucket_stats(conn: sqlite3.Connection) -> Dict[str, dict]:
+    """Returns per kind the number of hashed items and the size of the largest bucket."""
+    stats = {}
+    for kind in LSH_COLUMNS:
+        items = conn.execute("SELECT COUNT(DISTINCT item_id) FROM lsh_buckets WHERE kind = ?", (kind,)).fetchone()[0]
+        largest = conn.execute("""
+            SELECT COALESCE(MAX(size), 0) FROM (
+                SELECT COUNT(*) AS size FROM lsh_buckets WHERE kind = ? GROUP BY band, bucket
+            )
+        """, (kind,)).fetchone()[0]
+        stats[kind] = {'items': items, 'largest_bucket': largest}
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect or rebuild the LSH buckets of the knowledge base')
+    parser.add_argument('--db', default='math_base.db', help='database file (default: %(default)s)')
+    parser.add_argument('--rebuild', action='store_true', help='hash every item again (after changing the parameters)')
+    parser.add_argument('--stats', action='store_true', help='print the number of hashed items per kind')
+    args = parser.parse_args()
+
+    conn = get_connection(args.db)
+    migrate_database(conn)
+    if args.rebuild:
+        conn.execute("DELETE FROM lsh_buckets")
+    print(f"Hashed {ensure_lsh_index(conn)} items")
+    if args.stats:
+        for kind, stats in bucket_stats(conn).items():
+            print(f"{kind}: {stats['items']} items, largest bucket {stats['largest_bucket']}")
+
+
+if __name__ == '__main__':
+    main()
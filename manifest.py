@@ -0,0 +1,182 @@
+"""
+Manifest of ingested lecture files.
+
+Every lecture file has one row in `lecture_files` with the hash of its content
+and its processing status. A file whose hash matches a 'done' row is skipped on
+the next run. While a file is written, the agent commits a checkpoint every few
+items with the position of the next item and the IDs added so far, so a file
+that fails part way is resumed from its last committed item instead of from
+the start. In pipeline mode items are inserted and linked in separate
+transactions: the insert leaves the file 'inserted' with the IDs it added, and
+only the transaction that writes the file's edges marks it 'done'. A file still
+'inserted' on the next run, because linking failed or the run stopped, is
+resumed after its last item, so only its added items are linked again.
+
+`source_items` records where every stored definition and theorem came from: the
+file, the position of the item in it and a hash of the item. When an edited file
+is ingested again, items whose hash it already had are mapped to their stored
+rows without any similarity or LLM work; only added or edited items are processed.
+
+The functions take the writer's connection and do not commit; checkpoints and
+status changes are committed together with the rows they describe.
+"""
+
+import os
+import json
+import hashlib
+import sqlite3
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+STATUS_PROCESSING = 'processing'
+STATUS_INSERTED = 'inserted'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+_CHUNK_SIZE = 1 << 20
+
+
+def manifest_path(file_path: str) -> str:
+    """Key of a lecture file in the manifest."""
+    return os.path.abspath(file_path)
+
+
+def file_hash(file_path: str) -> Optional[str]:
+    """
+    Hashes the content of a file.
+
+    Returns:
+        str: Hex SHA-256 digest, or None if the file cannot be read
+    """
+    digest = hashlib.sha256()
+    try:
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+                digest.update(chunk)
+    except OSError as e:
+        logger.error(f"Error hashing {file_path}: {e}")
+        return None
+    return digest.hexdigest()
+
+
+def get_entry(conn: sqlite3.Connection, file_path: str) -> Optional[Dict]:
+    """
+    Reads the manifest row of a lecture file.
+
+    Returns:
+        dict: content_hash, status, next_item and added_ids ({'definitions': [...], 'theorems': [...]}),
+              or None if the file was never processed
+    """
+    row = conn.execute(
+        "SELECT content_hash, status, next_item, added_ids FROM lecture_files WHERE path = ?",
+        (manifest_path(file_path),)
+    ).fetchone()
+    if row is None:
+        return None
+    content_hash, status, next_item, added_ids = row
+    return {
+        'content_hash': content_hash,
+        'status': status,
+        'next_item': next_item,
+        'added_ids': json.loads(added_ids) if added_ids else {'definitions': [], 'theorems': []},
+    }
+
+
+def start_file(conn: sqlite3.Connection, file_path: str, content_hash: str, next_item: int = 0,
+               added_ids: Optional[Dict[str, List[int]]] = None):
+    """Marks a file as being processed from `next_item` on."""
+    conn.execute(
+        """
+        INSERT INTO lecture_files (path, content_hash, status, next_item, added_ids, updated_at)
+        VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(path) DO UPDATE SET
+            content_hash = excluded.content_hash, status = excluded.status,
+            next_item = excluded.next_item, added_ids = excluded.added_ids, updated_at = excluded.updated_at
+        """,
+        (manifest_path(file_path), content_hash, STATUS_PROCESSING, next_item, json.dumps(added_ids or {}))
+    )
+
+
+def checkpoint_file(conn: sqlite3.Connection, file_path: str, next_item: int, added_ids: Dict[str, List[int]]):
+    """Records that every item before `next_item` is written."""
+    conn.execute(
+        "UPDATE lecture_files SET next_item = ?, added_ids = ?, updated_at = CURRENT_TIMESTAMP WHERE path = ?",
+        (next_item, json.dumps(added_ids), manifest_path(file_path))
+    )
+
+
+def finish_file(conn: sqlite3.Connection, file_path: str, item_count: int):
+    """Marks a file as fully processed."""
+    conn.execute(
+        """
+        UPDATE lecture_files SET status = ?, next_item = ?, added_ids = NULL, updated_at = CURRENT_TIMESTAMP
+        WHERE path = ?
+        """,
+        (STATUS_DONE, item_count, manifest_path(file_path))
+    )
+
+
+def insert_file(conn: sqlite3.Connection, file_path: str, item_count: int, added_ids: Dict[str, List[int]]):
+    """Marks a file whose items are all written but not linked yet; `added_ids` are linked on resume."""
+    conn.execute(
+        """
+        UPDATE lecture_files SET status = ?, next_item = ?, added_ids = ?, updated_at = CURRENT_TIMESTAMP
+        WHERE path = ?
+        """,
+        (STATUS_INSERTED, item_count, json.dumps(added_ids), manifest_path(file_path))
+    )
+
+
+def finish_linking(conn: sqlite3.Connection, file_path: str):
+    """Marks an inserted file as fully processed once its edges are written."""
+    conn.execute(
+        """
+        UPDATE lecture_files SET status = ?, added_ids = NULL, updated_at = CURRENT_TIMESTAMP
+        WHERE path = ? AND status = ?
+        """,
+        (STATUS_DONE, manifest_path(file_path), STATUS_INSERTED)
+    )
+
+
+def fail_file(conn: sqlite3.Connection, file_path: str):
+    """Marks a file as failed; its last checkpoint is kept for the next run."""
+    conn.execute(
+        "UPDATE lecture_files SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE path = ?",
+        (STATUS_FAILED, manifest_path(file_path))
+    )
+
+
+def item_hash(item) -> str:
+    """Hashes one definition or theorem of a lecture file (all of its fields)."""
+    encoded = json.dumps(item, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def get_item_ids(conn: sqlite3.Connection, file_path: str) -> Dict[Tuple[str, str], int]:
+    """
+    Reads the provenance of a file's items from its previous ingestion.
+
+    Returns:
+        dict: (kind, item hash) -> ID of the stored definition or theorem
+    """
+    rows = conn.execute(
+        "SELECT kind, item_hash, item_id FROM source_items WHERE path = ?",
+        (manifest_path(file_path),)
+    ).fetchall()
+    return {(kind, hash_value): item_id for kind, hash_value, item_id in rows}
+
+
+def reset_items(conn: sqlite3.Connection, file_path: str):
+    """Forgets the provenance of a file's items before it is ingested again."""
+    conn.execute("DELETE FROM source_items WHERE path = ?", (manifest_path(file_path),))
+
+
+def record_items(conn: sqlite3.Connection, file_path: str, items: Iterable[Tuple[str, int, str, int]]):
+    """Records (kind, position, item hash, stored ID) of items of a file."""
+    path = manifest_path(file_path)
+    conn.executemany(
+        "INSERT OR REPLACE INTO source_items (path, kind, position, item_hash, item_id) VALUES (?, ?, ?, ?, ?)",
+        [(path, kind, position, hash_value, item_id) for kind, position, hash_value, item_id in items]
+    )
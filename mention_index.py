@@ -0,0 +1,99 @@
+"""
+Inverted index of the words used by stored theorems and definitions.
+
+`mention_postings` maps the stem of every word (`text_processing.word_stems`,
+single letters included, as in term_linker.py) of a theorem's statement and
+proof and of a definition's text to the IDs of the items that contain it. Rows
+are written in the same transaction as the item they describe, so a rolled back
+file leaves no postings behind.
+
+A theorem ingested before the definition it uses was linked without it. When
+new definitions arrive, intersecting the posting lists of the stems of each new
+term yields the few existing items that can mention it; only those are linked
+again, instead of the whole database.
+
+Usage:
+    index_item(conn, 'theorem', theorem_id, statement_ru, proof_ru)
+    ids = items_mentioning(conn, term_stems("Ограниченное сверху множество"))
+"""
+
+import sqlite3
+import logging
+from typing import Dict, List, Set
+
+from text_processing import word_stems
+
+logger = logging.getLogger(__name__)
+
+# Kind of item -> table and the text columns that are indexed
+INDEXED_COLUMNS = {
+    'definition': ('definitions', ('definition_ru',)),
+    'theorem': ('theorems', ('statement_ru', 'proof_ru')),
+}
+
+
+def index_item(conn: sqlite3.Connection, kind: str, item_id: int, *texts: str):
+    """Adds the stems of the texts of one item to the index (does not commit)."""
+    stems = {stem for text in texts for stem in word_stems(text, min_length=1)}
+    conn.executemany(
+        "INSERT OR IGNORE INTO mention_postings (stem, kind, item_id) VALUES (?, ?, ?)",
+        [(stem, kind, item_id) for stem in stems]
+    )
+
+
+def remove_items(conn: sqlite3.Connection, kind: str, item_ids: List[int]):
+    """Drops the postings of deleted items (does not commit)."""
+    conn.executemany("DELETE FROM mention_postings WHERE kind = ? AND item_id = ?",
+                     [(kind, item_id) for item_id in item_ids])
+
+
+def ensure_mention_index(conn: sqlite3.Connection) -> int:
+    """
+    Indexes the rows that have no postings, e.g. the whole database the first time
+    it is opened with this version, or rows inserted around the agent, and commits.
+    Rows with no words have no postings and are checked again on every call.
+
+    Returns:
+        int: Number of items indexed
+    """
+    indexed = 0
+    for kind, (table, columns) in INDEXED_COLUMNS.items():
+        # Not the ids above the last indexed one: another writer may have added lower ones
+        rows = conn.execute(
+            f"""
+            SELECT id, {', '.join(columns)} FROM {table}
+            WHERE id NOT IN (SELECT item_id FROM mention_postings WHERE kind = ?) ORDER BY id
+            """,
+            (kind,)
+        ).fetchall()
+        for item_id, *texts in rows:
+            index_item(conn, kind, item_id, *texts)
+        indexed += len(rows)
+    conn.commit()
+    if indexed:
+        logger.info(f"Indexed the words of {indexed} stored items for reverse linking")
+    return indexed
+
+
+def items_mentioning(conn: sqlite3.Connection, stems: List[str]) -> Dict[str, Set[int]]:
+    """
+    Finds the items whose texts contain every one of the stems (in any order).
+
+    Returns:
+        dict: Kind ('definition' or 'theorem') -> IDs of the items
+    """
+    stems = sorted(set(stems))
+    found = {kind: set() for kind in INDEXED_COLUMNS}
+    if not stems:
+        return found
+    placeholders = ', '.join('?' * len(stems))
+    rows = conn.execute(
+        f"""
+        SELECT kind, item_id FROM mention_postings WHERE stem IN ({placeholders})
+        GROUP BY kind, item_id HAVING COUNT(*) = ?
+        """,
+        stems + [len(stems)]
+    ).fetchall()
+    for kind, item_id in rows:
+        found[kind].add(item_id)
+    return found
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Collapses confirmed duplicates into one row each.
+
+Pairs marked 'duplicate' in `duplicate_candidates` (duplicate_sweep.py) are
+grouped into clusters with union-find, so A~B and B~C merge all three. The
+lowest ID of a cluster, i.e. the row stored first, is kept as the canonical row.
+
+Everything runs in one transaction. The old → canonical mapping is loaded into
+temporary tables, and each edge table is rewritten with a few set-based
+statements instead of one UPDATE per merged row, so thousands of merges cost
+about as much as one:
+- edges of merged rows are re-inserted against the canonical rows
+  (`INSERT OR IGNORE` drops the ones the canonical row already has),
+- the old edges and the self-loops created by a merge are deleted,
+- `source_items` points at the canonical rows, so unchanged lecture items still
+  resolve, and the word postings, LSH buckets and candidate pairs of merged rows
+  are dropped.
+
+Usage:
+    python merge_duplicates.py --dry-run
+    python merge_duplicates.py --db math_base.db
+"""
+
+import logging
+import argparse
+from typing import Dict, List
+
+from db import get_connection, transaction
+from create_database import migrate_database
+from dedup import UnionFind
+from search_index import forget_indexes
+from term_linker import forget_term_linkers
+from mention_index import remove_items
+from lsh_index import remove_items as remove_from_lsh
+
+logger = logging.getLogger(__name__)
+
+# Kind of item -> its table and the temporary old → canonical table
+MERGED_KINDS = {
+    'definition': ('definitions', 'merge_definitions'),
+    'theorem': ('theorems', 'merge_theorems'),
+}
+
+# Edge table -> kind of item referenced by each ID column
+EDGE_COLUMNS = {
+    'theorem_uses_definition': (('theorem_id', 'theorem'), ('definition_id', 'definition')),
+    'theorem_uses_theorem': (('theorem_id', 'theorem'), ('used_theorem_id', 'theorem')),
+    'definition_uses_definition': (('definition_id', 'definition'), ('used_definition_id', 'definition')),
+}
+
+
+def duplicate_clusters(db_name: str = 'math_base.db') -> Dict[str, List[List[int]]]:
+    """
+    Groups the confirmed duplicate pairs of each kind.
+
+    Returns:
+        dict: Kind -> clusters as sorted lists of IDs, canonical (lowest) ID first
+    """
+    conn = get_connection(db_name)
+    clusters = {}
+    for kind in MERGED_KINDS:
+        union_find = UnionFind()
+        for item_id, other_id in conn.execute(
+            "SELECT item_id, other_id FROM duplicate_candidates WHERE kind = ? AND status = 'duplicate'", (kind,)
+        ):
+            union_find.union(item_id, other_id)
+        clusters[kind] = sorted(sorted(group) for group in union_find.groups())
+    return clusters
+
+
+def merge_duplicates(db_name: str = 'math_base.db') -> Dict[str, int]:
+    """
+    Merges every cluster of confirmed duplicates into its canonical row.
+
+    Returns:
+        dict: Kind -> number of rows merged away
+    """
+    clusters = duplicate_clusters(db_name)
+    mapping = {
+        kind: [(item_id, group[0]) for group in groups for item_id in group[1:]]
+        for kind, groups in clusters.items()
+    }
+    if not any(mapping.values()):
+        logger.info("No confirmed duplicates to merge")
+        return {kind: 0 for kind in MERGED_KINDS}
+
+    with transaction(db_name) as conn:
+        for kind, (table, merge_table) in MERGED_KINDS.items():
+            conn.execute(f"DROP TABLE IF EXISTS temp.{merge_table}")
+            conn.execute(f"CREATE TEMP TABLE {merge_table} (old_id INTEGER PRIMARY KEY, new_id INTEGER NOT NULL)")
+            conn.executemany(f"INSERT INTO {merge_table} (old_id, new_id) VALUES (?, ?)", mapping[kind])
+
+        for edge_table, columns in EDGE_COLUMNS.items():
+            _repoint_edges(conn, edge_table, columns)
+
+        for kind, (table, merge_table) in MERGED_KINDS.items():
+            conn.execute(f"""
+                UPDATE source_items SET item_id = (SELECT new_id FROM {merge_table} WHERE old_id = item_id)
+                WHERE kind = ? AND item_id IN (SELECT old_id FROM {merge_table})
+            """, (kind,))
+            conn.execute(f"""
+                DELETE FROM duplicate_candidates WHERE kind = ?
+                AND (item_id IN (SELECT old_id FROM {merge_table}) OR other_id IN (SELECT old_id FROM {merge_table}))
+            """, (kind,))
+            remove_items(conn, kind, [old_id for old_id, _ in mapping[kind]])
+            remove_from_lsh(conn, kind, [old_id for old_id, _ in mapping[kind]])
+            conn.execute(f"DELETE FROM {table} WHERE id IN (SELECT old_id FROM {merge_table})")
+            conn.execute(f"DROP TABLE temp.{merge_table}")
+
+    # Cached indexes and linkers still contain the deleted rows
+    forget_indexes(db_name)
+    forget_term_linkers(db_name)
+    merged = {kind: len(pairs) for kind, pairs in mapping.items()}
+    logger.info(f"Merged {merged['definition']} definitions and {merged['theorem']} theorems into their canonical rows")
+    return merged
+
+
+def _repoint_edges(conn, edge_table, columns):
+    """Rewrites the edges of one table to the canonical rows (inside the caller's transaction)."""
+    all_columns = [row[1] for row in conn.execute(f"PRAGMA table_info({edge_table})")]
+    mapped = {
+        column: f"COALESCE((SELECT new_id FROM {MERGED_KINDS[kind][1]} WHERE old_id = {column}), {column})"
+        for column, kind in columns
+    }
+    touched = ' OR '.join(
+        f"{column} IN (SELECT old_id FROM {MERGED_KINDS[kind][1]})" for column, kind in columns
+    )
+    conn.execute(f"""
+        INSERT OR IGNORE INTO {edge_table} ({', '.join(all_columns)})
+        SELECT {', '.join(mapped.get(column, column) for column in all_columns)}
+        FROM {edge_table} WHERE {touched}
+    """)
+    conn.execute(f"DELETE FROM {edge_table} WHERE {touched}")
+    (source, source_kind), (target, target_kind) = columns
+    if source_kind == target_kind:
+        conn.execute(f"DELETE FROM {edge_table} WHERE {source} = {target}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Merge confirmed duplicate definitions and theorems')
+    parser.add_argument('--db', default='math_base.db', help='database file (default: %(default)s)')
+    parser.add_argument('--dry-run', action='store_true', help='print the clusters without merging')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    migrate_database(get_connection(args.db))
+    if args.dry_run:
+        for kind, groups in duplicate_clusters(args.db).items():
+            for group in groups:
+                print(f"{kind} {group[0]} <- {', '.join(map(str, group[1:]))}")
+    else:
+        merged = merge_duplicates(args.db)
+        print(', '.join(f"{kind}: {count} merged" for kind, count in merged.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+"""
+Asyncio pipeline mode of AlgorithmicAgent.
+
+Lecture files flow through four stages connected by bounded queues:
+
+    parse  → skip files unchanged since the last run (manifest.py) and stream
+             the definitions and theorems of the JSON file (lecture_reader.py)
+    dedup  → cluster copies, retrieve candidates and verify them with the LLM
+    insert → re-check against rows added since the dedup snapshot, insert, commit
+    link   → ask the LLM for connections of the new items (and the chunks of
+             their proofs) and write the edges
+
+Each stage runs its own number of workers, and a full queue blocks the stage
+before it, so a slow LLM link call only holds back linking while parsing and
+dedup of later files continue. Blocking work runs in threads; every database
+write (insert and the edges found by link) goes through one writer thread so
+IDs and duplicate decisions stay consistent. The insert stage commits a file's
+items with the file marked 'inserted' in the manifest; the link stage marks it
+done in the transaction that writes its edges. A file whose linking fails, or
+whose edges are dropped after a failed write, stays 'inserted' and its items
+are linked again on the next run (see manifest.py).
+"""
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from db import close_connection
+from search_index import save_indexes
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_SIZE = 4
+
+# Marks the end of a queue; one per downstream worker
+_DONE = object()
+
+
+class LecturePipeline:
+    """Runs the stages of an AlgorithmicAgent concurrently."""
+
+    def __init__(self, agent, workers: int = 4, concurrency: Optional[Dict[str, int]] = None,
+                 queue_size: int = DEFAULT_QUEUE_SIZE):
+        """
+        Args:
+            agent (AlgorithmicAgent): Agent whose methods implement the stages
+            workers (int): Default concurrency of the dedup and link stages
+            concurrency (dict): Stage name -> number of workers, overrides the defaults
+            queue_size (int): Capacity of the queues between stages
+        """
+        self.agent = agent
+        self.concurrency = {'parse': 2, 'dedup': workers, 'insert': 1, 'link': workers}
+        self.concurrency.update(concurrency or {})
+        # The writer stage must stay single-threaded
+        self.concurrency['insert'] = 1
+        self.queue_size = queue_size
+        self._writer = None
+        self._llm_slots = None
+
+    def run(self, lecture_files: List[str]):
+        """Processes the files and returns when every stage has finished."""
+        asyncio.run(self._run(lecture_files))
+
+    async def _run(self, lecture_files: List[str]):
+        logger.info(f"Running pipeline with stage concurrency {self.concurrency}")
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='writer')
+        self._llm_slots = asyncio.Semaphore(self.concurrency['link'])
+        files, parsed, prepared, inserted = (asyncio.Queue(maxsize=self.queue_size) for _ in range(4))
+        try:
+            await asyncio.gather(
+                self._feed(lecture_files, files),
+                self._stage('parse', self._parse, files, parsed, downstream='dedup'),
+                self._stage('dedup', self._dedup, parsed, prepared, downstream='insert'),
+                self._stage('insert', self._insert, prepared, inserted, downstream='link'),
+                self._stage('link', self._link, inserted, None),
+            )
+        finally:
+            await self._write(close_connection, self.agent.db_name)
+            self._writer.shutdown(wait=True)
+
+    async def _feed(self, lecture_files: List[str], outbox: asyncio.Queue):
+        for file_path in lecture_files:
+            await outbox.put(file_path)
+        for _ in range(self.concurrency['parse']):
+            await outbox.put(_DONE)
+
+    async def _stage(self, name: str, handler, inbox: asyncio.Queue, outbox: Optional[asyncio.Queue],
+                     downstream: Optional[str] = None):
+        """Runs the workers of one stage until each of them receives the end marker."""
+        async def worker():
+            while True:
+                item = await inbox.get()
+                if item is _DONE:
+                    return
+                try:
+                    result = await handler(item)
+                except Exception as e:
+                    logger.error(f"Pipeline stage '{name}' failed: {e}")
+                    continue
+                if outbox is not None:
+                    await outbox.put(result)
+
+        await asyncio.gather(*(worker() for _ in range(self.concurrency[name])))
+        if outbox is not None:
+            for _ in range(self.concurrency[downstream]):
+                await outbox.put(_DONE)
+
+    async def _write(self, function, *args):
+        """Runs a function on the single writer thread."""
+        return await asyncio.get_running_loop().run_in_executor(self._writer, function, *args)
+
+    async def _parse(self, file_path: str):
+        logger.info(f"📂 Processing file: {file_path}")
+        state = await asyncio.to_thread(self.agent._check_manifest, file_path)
+        if state is None or state['unchanged']:
+            return file_path, state, None
+        items = await asyncio.to_thread(self.agent._read_items, file_path)
+        if items is None:
+            return file_path, None, None
+        return file_path, state, items
+
+    async def _dedup(self, item):
+        file_path, state, items = item
+        if items is None:
+            return file_path, state
+        definitions, theorems = items
+        prepared = await asyncio.to_thread(self.agent._prepare_items, state, definitions, theorems)
+        return file_path, prepared
+
+    async def _insert(self, item):
+        file_path, prepared = item
+        added = await self._write(self._insert_and_save, file_path, prepared)
+        return file_path, added
+
+    def _insert_and_save(self, file_path: str, prepared: Optional[Dict]):
+        added = self.agent._write_file(file_path, prepared, link=False)
+        # Persist search indexes so the next run does not rebuild them
+        save_indexes()
+        return added
+
+    async def _link(self, item):
+        file_path, added = item
+        if not added:
+            return
+        new_definitions, new_theorems = added
+        if not new_definitions and not new_theorems:
+            return
+
+        agent = self.agent
+        # Edges dropped after this point may include this file's
+        resets = agent.edge_resets
+        theorem_jobs, definition_jobs = await asyncio.to_thread(agent._plan_links, new_theorems, new_definitions)
+        if agent.link_batch_size > 1:
+            batches = await asyncio.to_thread(agent._link_batches, theorem_jobs, definition_jobs)
+            jobs = [self._link_batch(batch) for batch in batches]
+        else:
+            jobs = [self._link_theorem(theorem, definitions) for theorem, definitions in theorem_jobs if definitions]
+            jobs.extend(self._link_definition(definition, definitions)
+                        for definition, definitions in definition_jobs if definitions)
+        mention_jobs = await asyncio.to_thread(agent._link_theorem_names, new_theorems)
+        jobs.extend(self._resolve_theorem_mention(job) for job in mention_jobs)
+        if agent.analyze_proofs:
+            proof_jobs = await asyncio.to_thread(agent._plan_proof_links, new_theorems)
+            jobs.extend(self._link_proof_chunk(job) for job in proof_jobs)
+        await asyncio.gather(*jobs)
+
+        await self._write(agent._flush_edges, file_path, resets)
+        logger.info(f"🔗 Linked {file_path}")
+
+    async def _call_llm(self, prompt: str, max_tokens: int) -> str:
+        async with self._llm_slots:
+            return await asyncio.to_thread(self.agent._call_llm, prompt, max_tokens)
+
+    async def _link_theorem(self, theorem: Dict, definitions: List[Dict]):
+        logger.info(f"   🔗 Analyzing theorem: '{theorem['name_ru']}'")
+        prompt = self.agent._theorem_connection_prompt(theorem['statement_ru'], definitions)
+        response = await self._call_llm(prompt, max_tokens=500)
+        self.agent._process_comprehensive_connection_response(theorem['id'], response, 'statement', definitions)
+
+    async def _link_definition(self, definition: Dict, definitions: List[Dict]):
+        logger.info(f"   🔗 Analyzing definition: '{definition['term_ru']}'")
+        prompt = self.agent._definition_connection_prompt(definition, definitions)
+        response = await self._call_llm(prompt, max_tokens=400)
+        self.agent._process_definition_connection_response(definition['id'], response, definitions)
+
+    async def _link_batch(self, batch: List):
+        logger.info(f"   🔗 Analyzing {len(batch)} items in one request")
+        prompt, candidates = self.agent._batch_connection_prompt(batch)
+        response = await self._call_llm(prompt, max_tokens=self.agent._batch_answer_tokens(len(batch)))
+        self.agent._process_batch_connection_response(batch, response, candidates)
+
+    async def _link_proof_chunk(self, job: Dict):
+        response = await self._call_llm(job['prompt'], max_tokens=300)
+        self.agent._process_proof_connection_response(job, response)
+
+    async def _resolve_theorem_mention(self, job: Dict):
+        response = await self._call_llm(self.agent._theorem_mention_prompt(job), max_tokens=50)
+        self.agent._process_theorem_mention_response(job, response)
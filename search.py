@@ -1,13 +1,18 @@
 import sqlite3
 import os
-import re
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage
 from dotenv import load_dotenv
-import numpy as np
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from text_processing import preprocess_text, normalize_key
+from create_database import KEY_COLUMNS
+from db import get_connection
+from search_index import SearchIndex, get_index
+from dedup import cluster_by_similarity
+from llm_cache import get_verdict_cache
+from calibration import get_calibration
+from lsh_index import ensure_lsh_index, lsh_candidates
+from llm_gateway import get_gateway
 
 # Load environment variables
 load_dotenv()
@@ -15,32 +20,52 @@ load_dotenv()
 # Initialize logger
 logger = logging.getLogger(__name__)
 
-def preprocess_text(text):
-    """
-    Preprocesses text for TF-IDF analysis.
-    Removes LaTeX formulas and special characters, converts to lowercase.
-    """
-    if not text:
-        return ""
-    
-    # Remove LaTeX formulas (everything between $ signs, \[ \], and equation environments)
-    text = re.sub(r'\$.*?\$', ' ', text)
-    text = re.sub(r'\\begin\{.*?\}.*?\\end\{.*?\}', ' ', text, flags=re.DOTALL)
-    text = re.sub(r'\\.*?(?=\s|$)', ' ', text)  # Remove LaTeX commands
-    text = re.sub(r'[{}\\]', ' ', text)  # Remove remaining LaTeX characters
-    
-    # Remove special characters and normalize spaces
-    text = re.sub(r'[^\w\s]', ' ', text)
-    text = re.sub(r'\s+', ' ', text)
-    
-    return text.lower().strip()
+# Weights of the fields in the combined similarity score
+DEFINITION_WEIGHTS = {'term_ru': 0.4, 'definition_ru': 0.6}
+THEOREM_WEIGHTS = {'name_ru': 0.3, 'statement_ru': 0.7}
+
+# Items of one batch at least this similar are compared as possible copies of each other
+INTRA_BATCH_THRESHOLD = 0.9
+
+# Weights for ranking the definitions a text may use: a used concept is usually named by its term
+LINK_WEIGHTS = {'term_ru': 0.6, 'definition_ru': 0.4}
+
+# Weights for ranking the theorems a proof may cite: by name ("по теореме Больцано-Вейерштрасса") or by content
+THEOREM_LINK_WEIGHTS = {'name_ru': 0.5, 'statement_ru': 0.5}
+
+# Number of definitions offered to the LLM in one connection prompt
+LINK_SHORTLIST_SIZE = int(os.getenv("LINK_SHORTLIST_SIZE", 25))
+
+# Number of theorems offered to the LLM in one proof connection prompt
+THEOREM_SHORTLIST_SIZE = int(os.getenv("THEOREM_SHORTLIST_SIZE", 10))
+
+# Maximum number of LLM verifications running at the same time
+VERIFICATION_WORKERS = int(os.getenv("VERIFICATION_WORKERS", 8))
+
+# Rank only the MinHash/LSH candidates of a query (lsh_index.py) instead of the whole table
+LSH_BLOCKING = os.getenv("LSH_BLOCKING", "0") == "1"
+
+# Version of each verification prompt, part of the key of its cached verdicts:
+# bump it when the prompt changes so that old verdicts are not reused
+VERIFY_PROMPT_VERSIONS = {'definition': 1, 'theorem': 1, 'term': 1, 'theorem_name': 1}
+
+_verification_executor = None
+_verification_executor_lock = threading.Lock()
+
+# Databases whose LSH buckets were already backfilled in this process
+_hashed_databases = set()
+_hashed_databases_lock = threading.Lock()
+
+# Databases whose key columns were already checked in this process
+_checked_databases = set()
+_checked_databases_lock = threading.Lock()
 
 def get_all_definitions(db_name='math_base.db'):
     """
     Retrieves all definitions from the database.
     Returns list of tuples: (id, term_ru, definition_ru)
     """
-    conn = sqlite3.connect(db_name)
+    conn = get_connection(db_name)
     cursor = conn.cursor()
     
     cursor.execute("""
@@ -49,84 +74,226 @@ def get_all_definitions(db_name='math_base.db'):
     """)
     
     results = cursor.fetchall()
-    conn.close()
     
     return results
 
+def _require_key_columns(db_name, table):
+    """
+    Checks once per process that a table has the normalized key columns used for
+    indexed exact-match lookups. Lookups never migrate the database; the agent and the
+    command-line tools do at startup (create_database.migrate_database).
+    
+    Raises:
+        RuntimeError: If a key column is missing
+    """
+    key = (os.path.abspath(db_name), table)
+    with _checked_databases_lock:
+        if key in _checked_databases:
+            return
+        existing_columns = {row[1] for row in get_connection(db_name).execute(f"PRAGMA table_info({table})")}
+        missing = [key_column for key_column, _ in KEY_COLUMNS[table] if key_column not in existing_columns]
+        if missing:
+            raise RuntimeError(f"{db_name}: {table} has no key columns {', '.join(missing)}; "
+                               f"migrate it with create_database.migrate_database (python create_database.py)")
+        _checked_databases.add(key)
+
+def _blocked_ids(db_name, kind, queries):
+    """
+    Returns the IDs that duplicate candidates are ranked among: with LSH_BLOCKING the
+    union of the LSH candidates of the queries, otherwise None (the whole table).
+    Rows stored without buckets (e.g. by load_lecture_1.py) are hashed once per process.
+    """
+    if not LSH_BLOCKING:
+        return None
+    conn = get_connection(db_name)
+    key = os.path.abspath(db_name)
+    with _hashed_databases_lock:
+        if key not in _hashed_databases:
+            ensure_lsh_index(conn)
+            _hashed_databases.add(key)
+    ids = set()
+    for texts in queries:
+        ids |= lsh_candidates(conn, kind, *texts)
+    return sorted(ids)
+
+def _find_exact(db_name, table, key_columns, keys):
+    """
+    Looks up a row by its normalized key columns with one indexed query.
+    Returns the lowest matching ID or None.
+    """
+    _require_key_columns(db_name, table)
+    conn = get_connection(db_name)
+    cursor = conn.cursor()
+    conditions = ' AND '.join(f"{column} = ?" for column in key_columns)
+    cursor.execute(f"SELECT id FROM {table} WHERE {conditions} ORDER BY id LIMIT 1",
+                   [normalize_key(value) for value in keys])
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def find_exact_definition(term_ru, definition_ru=None, db_name='math_base.db'):
+    """
+    Finds a definition with the same normalized term (and definition, if given).
+    
+    Returns:
+        int or None: ID of the exact match
+    """
+    if definition_ru is None:
+        return _find_exact(db_name, 'definitions', ('term_key',), (term_ru,))
+    return _find_exact(db_name, 'definitions', ('term_key', 'definition_key'), (term_ru, definition_ru))
+
+def find_exact_theorem(name_ru, statement_ru=None, db_name='math_base.db'):
+    """
+    Finds a theorem with the same normalized name (and statement, if given).
+    
+    Returns:
+        int or None: ID of the exact match
+    """
+    if statement_ru is None:
+        return _find_exact(db_name, 'theorems', ('name_key',), (name_ru,))
+    return _find_exact(db_name, 'theorems', ('name_key', 'statement_key'), (name_ru, statement_ru))
+
+def _find_exact_batch(db_name, table, key_columns, queries):
+    """
+    Looks up exact matches for many (title, text) queries with indexed IN queries.
+    Returns a list with the matching ID or None for every query.
+    """
+    _require_key_columns(db_name, table)
+    query_keys = [(normalize_key(title), normalize_key(text)) for title, text in queries]
+    title_keys = sorted({title_key for title_key, _ in query_keys})
+    
+    conn = get_connection(db_name)
+    cursor = conn.cursor()
+    exact_ids = {}
+    title_column, text_column = key_columns
+    for start in range(0, len(title_keys), 500):
+        chunk = title_keys[start:start + 500]
+        placeholders = ', '.join('?' for _ in chunk)
+        cursor.execute(f"""
+            SELECT id, {title_column}, {text_column}
+            FROM {table}
+            WHERE {title_column} IN ({placeholders})
+            ORDER BY id
+        """, chunk)
+        for row_id, title_key, text_key in cursor.fetchall():
+            exact_ids.setdefault((title_key, text_key), row_id)
+    return [exact_ids.get(keys) for keys in query_keys]
+
+def index_definition(definition_id, term_ru, definition_ru, db_name='math_base.db'):
+    """
+    Adds a newly inserted definition to the persistent search index.
+    """
+    get_index(db_name, 'definitions').add(
+        definition_id, {'term_ru': term_ru, 'definition_ru': definition_ru}
+    )
+
+def index_theorem(theorem_id, name_ru, statement_ru, db_name='math_base.db'):
+    """
+    Adds a newly inserted theorem to the persistent search index.
+    """
+    get_index(db_name, 'theorems').add(
+        theorem_id, {'name_ru': name_ru, 'statement_ru': statement_ru}
+    )
+
+def _get_verification_executor():
+    """Returns the shared thread pool used for concurrent LLM verification."""
+    global _verification_executor
+    with _verification_executor_lock:
+        if _verification_executor is None:
+            _verification_executor = ThreadPoolExecutor(
+                max_workers=VERIFICATION_WORKERS, thread_name_prefix='verify'
+            )
+        return _verification_executor
+
+def verify_candidates(candidates, verify, concurrent=True):
+    """
+    Verifies ranked candidates with the LLM and returns the best-ranked confirmed one.
+    
+    In concurrent mode all checks are sent at once. As soon as the best-ranked
+    candidate that has not been rejected says "ДА", the remaining checks are cancelled.
+    
+    Args:
+        candidates (list): List of (candidate_id, verify_args) tuples, best candidate first
+        verify (callable): Verification function returning True for a match
+        concurrent (bool): Send all checks at once instead of one after another
+        
+    Returns:
+        int or None: ID of the confirmed candidate, None if every candidate was rejected
+    """
+    if not concurrent or len(candidates) < 2:
+        for candidate_id, args in candidates:
+            if verify(*args):
+                return candidate_id
+        return None
+    
+    executor = _get_verification_executor()
+    futures = {executor.submit(verify, *args): rank for rank, (_, args) in enumerate(candidates)}
+    verdicts = [None] * len(candidates)
+    try:
+        for future in as_completed(futures):
+            try:
+                verdicts[futures[future]] = bool(future.result())
+            except Exception as e:
+                logger.error(f"Error verifying candidate: {e}")
+                verdicts[futures[future]] = False
+            
+            # A candidate wins once every better-ranked candidate has been rejected
+            for rank, verdict in enumerate(verdicts):
+                if verdict is None:
+                    break
+                if verdict:
+                    return candidates[rank][0]
+        return None
+    finally:
+        for future in futures:
+            future.cancel()
+
 def calculate_tfidf_similarity(query_term, query_definition, existing_definitions):
     """
     Calculates TF-IDF similarity scores for terms and definitions.
+    The rows are put into a throwaway SearchIndex, so no vectorizer is fitted per call.
     Returns list of tuples: (definition_id, combined_score)
     """
     if not existing_definitions:
         return []
     
-    # Prepare texts for TF-IDF
-    query_term_clean = preprocess_text(query_term)
-    query_definition_clean = preprocess_text(query_definition)
-    
-    # Extract and preprocess existing terms and definitions
-    existing_ids = [def_row[0] for def_row in existing_definitions]
-    existing_terms = [preprocess_text(def_row[1]) for def_row in existing_definitions]
-    existing_defs = [preprocess_text(def_row[2]) for def_row in existing_definitions]
-    
-    # Calculate TF-IDF similarity for terms
-    term_scores = []
-    if query_term_clean and any(existing_terms):
-        try:
-            vectorizer_terms = TfidfVectorizer(stop_words=None, ngram_range=(1, 2))
-            all_terms = [query_term_clean] + existing_terms
-            tfidf_matrix_terms = vectorizer_terms.fit_transform(all_terms)
-            
-            # Calculate cosine similarity between query and each existing term
-            similarities_terms = cosine_similarity(tfidf_matrix_terms[0:1], tfidf_matrix_terms[1:])
-            term_scores = similarities_terms[0].tolist()
-        except:
-            term_scores = [0.0] * len(existing_terms)
-    else:
-        term_scores = [0.0] * len(existing_terms)
-    
-    # Calculate TF-IDF similarity for definitions
-    def_scores = []
-    if query_definition_clean and any(existing_defs):
-        try:
-            vectorizer_defs = TfidfVectorizer(stop_words=None, ngram_range=(1, 2))
-            all_defs = [query_definition_clean] + existing_defs
-            tfidf_matrix_defs = vectorizer_defs.fit_transform(all_defs)
-            
-            # Calculate cosine similarity between query and each existing definition
-            similarities_defs = cosine_similarity(tfidf_matrix_defs[0:1], tfidf_matrix_defs[1:])
-            def_scores = similarities_defs[0].tolist()
-        except:
-            def_scores = [0.0] * len(existing_defs)
-    else:
-        def_scores = [0.0] * len(existing_defs)
-    
-    # Combine scores (weighted average: 40% term similarity, 60% definition similarity)
-    combined_scores = []
-    for i in range(len(existing_ids)):
-        term_score = term_scores[i] if i < len(term_scores) else 0.0
-        def_score = def_scores[i] if i < len(def_scores) else 0.0
-        combined_score = 0.4 * term_score + 0.6 * def_score
-        combined_scores.append((existing_ids[i], combined_score))
+    index = SearchIndex('definitions')
+    index.add_many([(row[0], {'term_ru': row[1], 'definition_ru': row[2]}) for row in existing_definitions])
+    scores = index.similarity({'term_ru': [query_term], 'definition_ru': [query_definition]}, DEFINITION_WEIGHTS)[0]
     
     # Sort by combined score in descending order
-    combined_scores.sort(key=lambda x: x[1], reverse=True)
-    
-    return combined_scores
+    return sorted(zip(index.ids, scores.tolist()), key=lambda x: x[1], reverse=True)
 
-def verify_with_llm(query_term, query_definition, candidate_term, candidate_definition):
+def _verify_calibrated(kind, candidates, verify, concurrent=True):
+    """
+    Like verify_candidates, but candidates whose score (the last verify argument) falls
+    into a band learned by calibration.py are accepted or rejected without the LLM.
+    """
+    calibration = get_calibration()
+    uncertain = []
+    for candidate_id, args in candidates:
+        decision = calibration.decide(kind, args[-1])
+        if decision is None:
+            uncertain.append((candidate_id, args))
+        elif decision:
+            # Better-ranked candidates still need the LLM; this one is the fallback
+            confirmed = verify_candidates(uncertain, verify, concurrent)
+            return candidate_id if confirmed is None else confirmed
+    return verify_candidates(uncertain, verify, concurrent)
+
+def verify_with_llm(query_term, query_definition, candidate_term, candidate_definition, score=None):
     """
     Uses LLM to verify if the candidate matches the query definition.
     Returns True if they are the same concept, False otherwise.
+    The candidate's similarity score, if given, is cached with the verdict for calibration.py.
     """
+    gateway = get_gateway()
+    inputs = (query_term, query_definition, candidate_term, candidate_definition)
+    cached = get_verdict_cache().get('definition', gateway.model, inputs, gateway.temperature,
+                                     VERIFY_PROMPT_VERSIONS['definition'])
+    if cached is not None:
+        return cached
+    
     try:
-        llm = ChatOpenAI(
-            openai_api_key=os.getenv("OPENROUTER_API_KEY"),
-            base_url="https://openrouter.ai/api/v1",
-            model_name="meta-llama/llama-4-maverick"
-        )
-        
         prompt = f"""Определи, являются ли эти два математических определения одним и тем же понятием.
 
 Определение 1:
@@ -141,16 +308,18 @@ def verify_with_llm(query_term, query_definition, candidate_term, candidate_defi
 
 Ответь только "ДА" если это одно и то же понятие, или "НЕТ" если это разные понятия."""
 
-        response = llm.invoke(prompt)
-        answer = response.content.strip().upper()
+        answer = gateway.complete(prompt).upper()
         
-        return "ДА" in answer
+        verdict = "ДА" in answer
+        get_verdict_cache().put('definition', gateway.model, inputs, verdict, score,
+                                gateway.temperature, VERIFY_PROMPT_VERSIONS['definition'])
+        return verdict
         
     except Exception as e:
         logger.error(f"Error calling LLM API: {e}")
         return False
 
-def find_definition(term_ru, definition_ru, db_name='math_base.db'):
+def find_definition(term_ru, definition_ru, db_name='math_base.db', concurrent=True):
     """
     Finds if a definition already exists in the database using TF-IDF techniques
     and LLM verification as described in README.md.
@@ -159,69 +328,95 @@ def find_definition(term_ru, definition_ru, db_name='math_base.db'):
         term_ru (str): Russian term to search for
         definition_ru (str): Russian definition to search for
         db_name (str): Database filename
+        concurrent (bool): Verify the top candidates with the LLM concurrently
     
     Returns:
         int or None: Database ID if existing definition found, None otherwise
     """
     
-    # Get all existing definitions from database
-    existing_definitions = get_all_definitions(db_name)
-    
-    if not existing_definitions:
-        return None
-        
     # First check for exact matches to avoid unnecessary LLM calls
-    for def_id, def_term, def_text in existing_definitions:
-        # Case-insensitive exact match on term
-        if def_term.lower().strip() == term_ru.lower().strip():
-            # If term matches exactly, check if definition is also very similar
-            if def_text.lower().strip() == definition_ru.lower().strip():
-                logger.info(f"Exact match found for term and definition: '{term_ru}' (ID: {def_id})")
-                return def_id
-            logger.info(f"Exact term match found, checking definition with TF-IDF: '{term_ru}' (ID: {def_id})")
-
-    
-    # Calculate TF-IDF similarity scores
-    similarity_scores = calculate_tfidf_similarity(term_ru, definition_ru, existing_definitions)
-    
-    if not similarity_scores:
-        return None
-    
-    # Get top 2 candidates (as specified in README.md)
-    top_candidates = similarity_scores[:2]
-    
-    # Filter candidates with reasonable similarity scores (> 0.1)
-    top_candidates = [(def_id, score) for def_id, score in top_candidates if score > 0.1]
+    exact_id = find_exact_definition(term_ru, definition_ru, db_name)
+    if exact_id:
+        logger.info(f"Exact match found for term and definition: '{term_ru}' (ID: {exact_id})")
+        return exact_id
+    
+    # Get top 2 candidates (as specified in README.md) with reasonable similarity scores (> 0.1)
+    top_candidates = get_index(db_name, 'definitions').top_k(
+        {'term_ru': term_ru, 'definition_ru': definition_ru},
+        DEFINITION_WEIGHTS, k=2, min_score=0.1,
+        ids=_blocked_ids(db_name, 'definition', [(term_ru, definition_ru)])
+    )
     
     if not top_candidates:
         return None
     
-    # Verify each candidate with LLM
+    return _verify_definition_candidates(term_ru, definition_ru, top_candidates, db_name, concurrent)
+
+def _fetch_rows(db_name, table, columns, ids):
+    """
+    Fetches the given columns of several rows in one query.
+    Returns dict: id -> tuple of column values
+    """
+    if not ids:
+        return {}
+    conn = get_connection(db_name)
+    cursor = conn.cursor()
+    placeholders = ', '.join('?' for _ in ids)
+    cursor.execute(f"""
+        SELECT id, {', '.join(columns)} 
+        FROM {table} 
+        WHERE id IN ({placeholders})
+    """, list(ids))
+    rows = {row[0]: row[1:] for row in cursor.fetchall()}
+    return rows
+
+def _verify_definition_candidates(term_ru, definition_ru, top_candidates, db_name, concurrent=True):
+    """
+    Verifies (definition_id, score) candidates with the LLM.
+    Returns the ID of the confirmed candidate or None.
+    """
+    # Get candidate details from database
+    details = _fetch_rows(db_name, 'definitions', ('term_ru', 'definition_ru'),
+                          [candidate_id for candidate_id, _ in top_candidates])
+    
+    candidates = []
     for candidate_id, score in top_candidates:
-        # Get candidate details from database
-        conn = sqlite3.connect(db_name)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT term_ru, definition_ru 
-            FROM definitions 
-            WHERE id = ?
-        """, (candidate_id,))
-        
-        result = cursor.fetchone()
-        conn.close()
-        
-        if result:
-            candidate_term, candidate_definition = result
-            
-            # Use LLM to verify if this is the same concept
-            if verify_with_llm(term_ru, definition_ru, candidate_term, candidate_definition):
-                return candidate_id
+        if candidate_id not in details:
+            continue
+        candidate_term, candidate_definition = details[candidate_id]
+        if (normalize_key(candidate_term) == normalize_key(term_ru)
+                and normalize_key(candidate_definition) == normalize_key(definition_ru)):
+            logger.info(f"Exact match found for term and definition: '{term_ru}' (ID: {candidate_id})")
+            return candidate_id
+        candidates.append((candidate_id, (term_ru, definition_ru, candidate_term, candidate_definition, score)))
+    
+    # Use LLM to verify if this is the same concept
+    # None if no matching definition found
+    return _verify_calibrated('definition', candidates, verify_with_llm, concurrent)
+
+def _verify_theorem_candidates(name_ru, statement_ru, top_candidates, db_name, concurrent=True):
+    """
+    Verifies (theorem_id, score) candidates with the LLM.
+    Returns the ID of the confirmed candidate or None.
+    """
+    details = _fetch_rows(db_name, 'theorems', ('name_ru', 'statement_ru'),
+                          [candidate_id for candidate_id, _ in top_candidates])
     
-    # No matching definition found
-    return None
+    candidates = []
+    for candidate_id, score in top_candidates:
+        if candidate_id not in details:
+            continue
+        candidate_name, candidate_statement = details[candidate_id]
+        candidate_statement = candidate_statement or ''
+        if (normalize_key(candidate_name) == normalize_key(name_ru)
+                and normalize_key(candidate_statement) == normalize_key(statement_ru)):
+            logger.info(f"Exact match found for theorem name and statement: '{name_ru}' (ID: {candidate_id})")
+            return candidate_id
+        candidates.append((candidate_id, (name_ru, statement_ru, candidate_name, candidate_statement, score)))
+    
+    return _verify_calibrated('theorem', candidates, verify_theorem_match_with_llm, concurrent)
 
-def find_theorem(name_ru, statement_ru, db_name='math_base.db'):
+def find_theorem(name_ru, statement_ru, db_name='math_base.db', concurrent=True):
     """
     Find existing theorem in database using TF-IDF similarity and LLM verification.
     
@@ -229,59 +424,279 @@ def find_theorem(name_ru, statement_ru, db_name='math_base.db'):
         name_ru (str): Russian name of the theorem to search for
         statement_ru (str): Russian statement/formulation of the theorem
         db_name (str): Database file path
+        concurrent (bool): Verify the top candidates with the LLM concurrently
         
     Returns:
         int or None: ID of existing theorem if found, None otherwise
     """
     try:
-        # Get all theorems from database
-        theorems = get_all_theorems(db_name)
-        
-        if not theorems:
-            return None
-            
         # First check for exact matches to avoid unnecessary LLM calls
-        for theorem in theorems:
-            # Case-insensitive exact match on name
-            if theorem['name_ru'].lower().strip() == name_ru.lower().strip():
-                # If name matches exactly, check if statement is also very similar
-                if theorem['statement_ru'].lower().strip() == statement_ru.lower().strip():
-                    logger.info(f"Exact match found for theorem name and statement: '{name_ru}' (ID: {theorem['id']})")
-                    return theorem['id']
-                logger.info(f"Exact theorem name match found, checking statement with TF-IDF: '{name_ru}' (ID: {theorem['id']})")
+        exact_id = find_exact_theorem(name_ru, statement_ru, db_name)
+        if exact_id:
+            logger.info(f"Exact match found for theorem name and statement: '{name_ru}' (ID: {exact_id})")
+            return exact_id
             
-        # Preprocess query
-        query_name = preprocess_text(name_ru)
-        query_statement = preprocess_text(statement_ru)
-        
-        # Calculate similarity scores
-        similarity_scores = calculate_theorem_similarity_scores(
-            query_name, query_statement, theorems
-        )
-        
         # Get top 2 candidates with similarity > 0.1
-        top_candidates = [
-            (idx, score) for idx, score in enumerate(similarity_scores) 
-            if score > 0.1
-        ]
-        top_candidates.sort(key=lambda x: x[1], reverse=True)
-        top_candidates = top_candidates[:2]
+        top_candidates = get_index(db_name, 'theorems').top_k(
+            {'name_ru': name_ru, 'statement_ru': statement_ru},
+            THEOREM_WEIGHTS, k=2, min_score=0.1,
+            ids=_blocked_ids(db_name, 'theorem', [(name_ru, statement_ru)])
+        )
         
-        # Check each candidate with LLM
-        for idx, score in top_candidates:
-            theorem = theorems[idx]
-            if verify_theorem_match_with_llm(
-                name_ru, statement_ru, 
-                theorem['name_ru'], theorem['statement_ru']
-            ):
-                return theorem['id']
-                
-        return None
+        # Check candidates with LLM
+        return _verify_theorem_candidates(name_ru, statement_ru, top_candidates, db_name, concurrent)
         
     except Exception as e:
         logger.error(f"Error in find_theorem: {e}")
         return None
 
+def find_definitions_batch(queries, db_name='math_base.db', top_k=2, min_score=0.1, max_id=None):
+    """
+    Finds duplicate candidates for many definitions with one similarity pass:
+    the table is read once and all queries are scored with a single sparse
+    matrix-matrix product against the corpus (with LSH_BLOCKING, against the
+    LSH candidates of all the queries).
+    
+    Args:
+        queries (list): List of (term_ru, definition_ru) tuples
+        db_name (str): Database file path
+        top_k (int): Number of candidates per query
+        min_score (float): Minimum combined similarity of a candidate
+        max_id (int): Only rank definitions up to this ID (a snapshot of the table)
+        
+    Returns:
+        list: For each query a dict with 'exact_id' (ID of an exact match or None)
+              and 'candidates' (list of (definition_id, score), best first)
+    """
+    if not queries:
+        return []
+    
+    exact_ids = _find_exact_batch(db_name, 'definitions', ('term_key', 'definition_key'), queries)
+    
+    candidates = get_index(db_name, 'definitions').top_k_batch(
+        {'term_ru': [term for term, _ in queries], 'definition_ru': [text for _, text in queries]},
+        DEFINITION_WEIGHTS, k=top_k, min_score=min_score, max_id=max_id,
+        ids=_blocked_ids(db_name, 'definition', queries)
+    )
+    
+    return [
+        {'exact_id': exact_id, 'candidates': query_candidates}
+        for exact_id, query_candidates in zip(exact_ids, candidates)
+    ]
+
+def find_theorems_batch(queries, db_name='math_base.db', top_k=2, min_score=0.1, max_id=None):
+    """
+    Finds duplicate candidates for many theorems with one similarity pass.
+    
+    Args:
+        queries (list): List of (name_ru, statement_ru) tuples
+        db_name (str): Database file path
+        top_k (int): Number of candidates per query
+        min_score (float): Minimum combined similarity of a candidate
+        max_id (int): Only rank theorems up to this ID (a snapshot of the table)
+        
+    Returns:
+        list: For each query a dict with 'exact_id' (ID of an exact match or None)
+              and 'candidates' (list of (theorem_id, score), best first)
+    """
+    if not queries:
+        return []
+    
+    exact_ids = _find_exact_batch(db_name, 'theorems', ('name_key', 'statement_key'), queries)
+    
+    candidates = get_index(db_name, 'theorems').top_k_batch(
+        {'name_ru': [name for name, _ in queries], 'statement_ru': [text for _, text in queries]},
+        THEOREM_WEIGHTS, k=top_k, min_score=min_score, max_id=max_id,
+        ids=_blocked_ids(db_name, 'theorem', queries)
+    )
+    
+    return [
+        {'exact_id': exact_id, 'candidates': query_candidates}
+        for exact_id, query_candidates in zip(exact_ids, candidates)
+    ]
+
+def _shortlist(texts, db_name, table, columns, weights, top_k, exclude_ids, min_score):
+    """
+    Ranks the rows of a table for each text with one sparse matrix product and fetches the kept rows.
+    Returns for each text a list of dicts with 'id' and the columns, most relevant first.
+    """
+    if not texts:
+        return []
+    exclude_ids = exclude_ids or [None] * len(texts)
+    
+    ranked = get_index(db_name, table).top_k_batch(
+        {column: texts for column in weights}, weights,
+        k=top_k + (1 if any(exclude_ids) else 0), min_score=min_score
+    )
+    shortlists = [
+        [item_id for item_id, _ in candidates if item_id != excluded][:top_k]
+        for candidates, excluded in zip(ranked, exclude_ids)
+    ]
+    
+    details = _fetch_rows(db_name, table, columns, sorted({item_id for shortlist in shortlists for item_id in shortlist}))
+    return [
+        [dict(zip(('id',) + columns, (item_id,) + details[item_id])) for item_id in shortlist if item_id in details]
+        for shortlist in shortlists
+    ]
+
+def shortlist_definitions(texts, db_name='math_base.db', top_k=LINK_SHORTLIST_SIZE, exclude_ids=None,
+                          min_score=0.0):
+    """
+    Picks the definitions most relevant to each text (a theorem statement or a new
+    definition) for its connection prompt. All texts are scored against the whole
+    definitions corpus with one sparse matrix product.
+    
+    Args:
+        texts (list): Raw texts to find used definitions for
+        db_name (str): Database file path
+        top_k (int): Number of definitions kept per text
+        exclude_ids (list): Per text, a definition ID to leave out (e.g. the definition itself) or None
+        min_score (float): Minimum similarity of a kept definition
+        
+    Returns:
+        list: For each text a list of dicts with 'id', 'term_ru' and 'definition_ru', most relevant first
+    """
+    return _shortlist(texts, db_name, 'definitions', ('term_ru', 'definition_ru'), LINK_WEIGHTS,
+                      top_k, exclude_ids, min_score)
+
+def shortlist_theorems(texts, db_name='math_base.db', top_k=THEOREM_SHORTLIST_SIZE, exclude_ids=None,
+                       min_score=0.0):
+    """
+    Picks the theorems a text (e.g. a part of a proof) most likely cites, like shortlist_definitions.
+    
+    Args:
+        texts (list): Raw texts to find used theorems for
+        db_name (str): Database file path
+        top_k (int): Number of theorems kept per text
+        exclude_ids (list): Per text, a theorem ID to leave out (the theorem being proved) or None
+        min_score (float): Minimum similarity of a kept theorem
+        
+    Returns:
+        list: For each text a list of dicts with 'id', 'name_ru' and 'statement_ru', most relevant first
+    """
+    return _shortlist(texts, db_name, 'theorems', ('name_ru', 'statement_ru'), THEOREM_LINK_WEIGHTS,
+                      top_k, exclude_ids, min_score)
+
+def cluster_definitions(queries, db_name='math_base.db', threshold=INTRA_BATCH_THRESHOLD):
+    """
+    Groups incoming definitions that are copies of each other, before they touch the database.
+    Uses one pairwise similarity matrix of the batch and union-find, then keeps together only
+    the members whose term and definition keys (normalize_key) are equal (see _exact_copies).
+    
+    Args:
+        queries (list): List of (term_ru, definition_ru) tuples
+        db_name (str): Database file path (its corpus provides the IDF weights)
+        threshold (float): Minimum combined similarity for two items to be compared
+        
+    Returns:
+        list: Clusters as lists of query positions; the first position is the representative
+    """
+    if not queries:
+        return []
+    similarity = get_index(db_name, 'definitions').pairwise_similarity(
+        {'term_ru': [term for term, _ in queries], 'definition_ru': [text for _, text in queries]},
+        DEFINITION_WEIGHTS
+    )
+    return _exact_copies(cluster_by_similarity(similarity, threshold), queries)
+
+def cluster_theorems(queries, db_name='math_base.db', threshold=INTRA_BATCH_THRESHOLD):
+    """
+    Groups incoming theorems that are copies of each other, before they touch the database.
+    
+    Args:
+        queries (list): List of (name_ru, statement_ru) tuples
+        db_name (str): Database file path (its corpus provides the IDF weights)
+        threshold (float): Minimum combined similarity for two items to be compared
+        
+    Returns:
+        list: Clusters as lists of query positions; the first position is the representative
+    """
+    if not queries:
+        return []
+    similarity = get_index(db_name, 'theorems').pairwise_similarity(
+        {'name_ru': [name for name, _ in queries], 'statement_ru': [text for _, text in queries]},
+        THEOREM_WEIGHTS
+    )
+    return _exact_copies(cluster_by_similarity(similarity, threshold), queries)
+
+def _exact_copies(clusters, queries):
+    """
+    Splits similarity clusters into groups with equal keys of both fields. TF-IDF ignores
+    formulas, so "Функция $\\arcsin x$" and "Функция $\\arccos x$" score as copies. Every
+    other member becomes a representative of its own and is resolved like any new item,
+    against the database and the rows added before it (LLM included).
+    """
+    groups = []
+    for cluster in clusters:
+        by_key = {}
+        for member in cluster:
+            by_key.setdefault(tuple(normalize_key(text) for text in queries[member]), []).append(member)
+        groups.extend(by_key.values())
+    # Callers rely on clusters ordered by their first member
+    return sorted(groups, key=lambda group: group[0])
+
+def resolve_definition(term_ru, definition_ru, lookup, db_name='math_base.db', recent_ids=None, concurrent=True):
+    """
+    Decides whether a definition is a duplicate using its result from find_definitions_batch.
+    
+    Args:
+        term_ru (str): Russian term
+        definition_ru (str): Russian definition
+        lookup (dict): Entry returned by find_definitions_batch for this definition
+        db_name (str): Database file path
+        recent_ids (list): IDs inserted after the batch lookup; they are scored on the fly
+        concurrent (bool): Verify the top candidates with the LLM concurrently
+        
+    Returns:
+        int or None: ID of existing definition if found, None otherwise
+    """
+    if lookup['exact_id']:
+        logger.info(f"Exact match found for term and definition: '{term_ru}' (ID: {lookup['exact_id']})")
+        return lookup['exact_id']
+    
+    candidates = list(lookup['candidates'])
+    if recent_ids:
+        candidates += get_index(db_name, 'definitions').top_k(
+            {'term_ru': term_ru, 'definition_ru': definition_ru},
+            DEFINITION_WEIGHTS, k=2, min_score=0.1, ids=recent_ids
+        )
+        candidates = sorted(candidates, key=lambda c: c[1], reverse=True)[:2]
+    
+    if not candidates:
+        return None
+    return _verify_definition_candidates(term_ru, definition_ru, candidates, db_name, concurrent)
+
+def resolve_theorem(name_ru, statement_ru, lookup, db_name='math_base.db', recent_ids=None, concurrent=True):
+    """
+    Decides whether a theorem is a duplicate using its result from find_theorems_batch.
+    
+    Args:
+        name_ru (str): Russian theorem name
+        statement_ru (str): Russian theorem statement
+        lookup (dict): Entry returned by find_theorems_batch for this theorem
+        db_name (str): Database file path
+        recent_ids (list): IDs inserted after the batch lookup; they are scored on the fly
+        concurrent (bool): Verify the top candidates with the LLM concurrently
+        
+    Returns:
+        int or None: ID of existing theorem if found, None otherwise
+    """
+    if lookup['exact_id']:
+        logger.info(f"Exact match found for theorem name and statement: '{name_ru}' (ID: {lookup['exact_id']})")
+        return lookup['exact_id']
+    
+    candidates = list(lookup['candidates'])
+    if recent_ids:
+        candidates += get_index(db_name, 'theorems').top_k(
+            {'name_ru': name_ru, 'statement_ru': statement_ru},
+            THEOREM_WEIGHTS, k=2, min_score=0.1, ids=recent_ids
+        )
+        candidates = sorted(candidates, key=lambda c: c[1], reverse=True)[:2]
+    
+    if not candidates:
+        return None
+    return _verify_theorem_candidates(name_ru, statement_ru, candidates, db_name, concurrent)
+
 def get_all_theorems(db_name='math_base.db'):
     """
     Retrieve all theorems from database.
@@ -290,7 +705,7 @@ def get_all_theorems(db_name='math_base.db'):
         list: List of theorem dictionaries with id, name_ru, statement_ru
     """
     try:
-        conn = sqlite3.connect(db_name)
+        conn = get_connection(db_name)
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -299,7 +714,6 @@ def get_all_theorems(db_name='math_base.db'):
         ''')
         
         results = cursor.fetchall()
-        conn.close()
         
         theorems = []
         for row in results:
@@ -315,70 +729,7 @@ def get_all_theorems(db_name='math_base.db'):
         logger.error(f"Error retrieving theorems: {e}")
         return []
 
-def calculate_theorem_similarity_scores(query_name, query_statement, theorems):
-    """
-    Calculate TF-IDF similarity scores between query theorem and existing theorems.
-    
-    Args:
-        query_name (str): Preprocessed query theorem name
-        query_statement (str): Preprocessed query theorem statement
-        theorems (list): List of existing theorems
-        
-    Returns:
-        list: Similarity scores for each theorem
-    """
-    try:
-        # Prepare corpus
-        names = [preprocess_text(t['name_ru']) for t in theorems]
-        statements = [preprocess_text(t['statement_ru']) for t in theorems]
-        
-        # Add query to corpus
-        all_names = names + [query_name]
-        all_statements = statements + [query_statement]
-        
-        # Calculate TF-IDF for names
-        vectorizer_names = TfidfVectorizer(
-            ngram_range=(1, 2),
-            min_df=1,
-            stop_words=None
-        )
-        
-        if any(all_names):  # Check if there are non-empty names
-            tfidf_names = vectorizer_names.fit_transform(all_names)
-            name_similarities = cosine_similarity(
-                tfidf_names[-1:], tfidf_names[:-1]
-            )[0]
-        else:
-            name_similarities = [0.0] * len(theorems)
-        
-        # Calculate TF-IDF for statements  
-        vectorizer_statements = TfidfVectorizer(
-            ngram_range=(1, 2),
-            min_df=1,
-            stop_words=None
-        )
-        
-        if any(all_statements):  # Check if there are non-empty statements
-            tfidf_statements = vectorizer_statements.fit_transform(all_statements)
-            statement_similarities = cosine_similarity(
-                tfidf_statements[-1:], tfidf_statements[:-1]
-            )[0]
-        else:
-            statement_similarities = [0.0] * len(theorems)
-        
-        # Combine similarities: 30% name, 70% statement (statements are more important for theorems)
-        combined_scores = [
-            0.3 * name_sim + 0.7 * statement_sim
-            for name_sim, statement_sim in zip(name_similarities, statement_similarities)
-        ]
-        
-        return combined_scores
-        
-    except Exception as e:
-        logger.error(f"Error calculating theorem similarity: {e}")
-        return [0.0] * len(theorems)
-
-def verify_theorem_match_with_llm(query_name, query_statement, candidate_name, candidate_statement):
+def verify_theorem_match_with_llm(query_name, query_statement, candidate_name, candidate_statement, score=None):
     """
     Use LLM to verify if query theorem matches candidate theorem.
     
@@ -387,23 +738,24 @@ def verify_theorem_match_with_llm(query_name, query_statement, candidate_name, c
         query_statement (str): Query theorem statement
         candidate_name (str): Candidate theorem name  
         candidate_statement (str): Candidate theorem statement
+        score (float): Similarity score of the candidate, cached with the verdict for calibration.py
         
     Returns:
         bool: True if theorems are equivalent, False otherwise
     """
+    gateway = get_gateway()
+    inputs = (query_name, query_statement, candidate_name, candidate_statement)
+    cached = get_verdict_cache().get('theorem', gateway.model, inputs, gateway.temperature,
+                                     VERIFY_PROMPT_VERSIONS['theorem'])
+    if cached is not None:
+        return cached
+    
     try:
         # Log what we're sending to the LLM
         logger.info(f"Verifying theorem match with LLM:")
         logger.info(f"  Query: '{query_name}' (length: {len(query_statement)} chars)")
         logger.info(f"  Candidate: '{candidate_name}' (length: {len(candidate_statement)} chars)")
         
-        llm = ChatOpenAI(
-            openai_api_key=os.getenv("OPENROUTER_API_KEY"),
-            base_url="https://openrouter.ai/api/v1",
-            model_name="meta-llama/llama-4-maverick",
-            temperature=0.1
-        )
-        
         prompt = f"""
 Определи, являются ли эти две математические теоремы одинаковыми или эквивалентными по смыслу.
 
@@ -419,11 +771,13 @@ def verify_theorem_match_with_llm(query_name, query_statement, candidate_name, c
 Учитывай, что разные формулировки могут выражать одну и ту же математическую идею.
 """
         
-        response = llm.invoke([HumanMessage(content=prompt)])
-        answer = response.content.strip().upper()
+        answer = gateway.complete(prompt).upper()
         
         logger.info(f"  LLM response: {answer}")
-        return "ДА" in answer
+        verdict = "ДА" in answer
+        get_verdict_cache().put('theorem', gateway.model, inputs, verdict, score,
+                                gateway.temperature, VERIFY_PROMPT_VERSIONS['theorem'])
+        return verdict
         
     except Exception as e:
         logger.error(f"Error calling LLM API: {e}")
@@ -441,39 +795,26 @@ def find_definition_by_term(term_ru, db_name='math_base.db'):
         int or None: ID of existing definition if found, None otherwise
     """
     try:
-        # Get all definitions from database
-        definitions = get_all_definitions(db_name)
-        
-        if not definitions:
-            return None
-        
         # First check for exact matches to avoid unnecessary LLM calls
-        for def_id, def_term, _ in definitions:
-            # Case-insensitive exact match
-            if def_term.lower().strip() == term_ru.lower().strip():
-                logger.info(f"Exact term match found: '{term_ru}' = '{def_term}' (ID: {def_id})")
-                return def_id
+        exact_id = find_exact_definition(term_ru, db_name=db_name)
+        if exact_id:
+            logger.info(f"Exact term match found: '{term_ru}' (ID: {exact_id})")
+            return exact_id
             
-        # Preprocess query term
-        query_term = preprocess_text(term_ru)
-        
-        # Calculate similarity scores for terms only
-        similarity_scores = calculate_term_similarity_scores(query_term, definitions)
-        
         # Get top 2 candidates with similarity > 0.2 (higher threshold for name-only search)
-        top_candidates = [
-            (idx, score) for idx, score in enumerate(similarity_scores) 
-            if score > 0.2
-        ]
-        top_candidates.sort(key=lambda x: x[1], reverse=True)
-        top_candidates = top_candidates[:2]
+        top_candidates = get_index(db_name, 'definitions').top_k(
+            {'term_ru': term_ru}, {'term_ru': 1.0}, k=2, min_score=0.2
+        )
+        terms_by_id = _fetch_rows(db_name, 'definitions', ('term_ru',), [definition_id for definition_id, _ in top_candidates])
         
         # Check each candidate with LLM
-        for idx, score in top_candidates:
-            definition = definitions[idx]
-            logger.info(f"Checking term similarity with LLM: '{term_ru}' vs '{definition[1]}' (score: {score:.2f})")
-            if verify_term_match_with_llm(term_ru, definition[1]):
-                return definition[0]
+        for definition_id, score in top_candidates:
+            if definition_id not in terms_by_id:
+                continue
+            candidate_term = terms_by_id[definition_id][0]
+            logger.info(f"Checking term similarity with LLM: '{term_ru}' vs '{candidate_term}' (score: {score:.2f})")
+            if verify_term_match_with_llm(term_ru, candidate_term):
+                return definition_id
                 
         return None
         
@@ -493,39 +834,26 @@ def find_theorem_by_name(name_ru, db_name='math_base.db'):
         int or None: ID of existing theorem if found, None otherwise
     """
     try:
-        # Get all theorems from database
-        theorems = get_all_theorems(db_name)
-        
-        if not theorems:
-            return None
-        
         # First check for exact matches to avoid unnecessary LLM calls
-        for theorem in theorems:
-            # Case-insensitive exact match
-            if theorem['name_ru'].lower().strip() == name_ru.lower().strip():
-                logger.info(f"Exact theorem name match found: '{name_ru}' = '{theorem['name_ru']}' (ID: {theorem['id']})")
-                return theorem['id']
+        exact_id = find_exact_theorem(name_ru, db_name=db_name)
+        if exact_id:
+            logger.info(f"Exact theorem name match found: '{name_ru}' (ID: {exact_id})")
+            return exact_id
             
-        # Preprocess query name
-        query_name = preprocess_text(name_ru)
-        
-        # Calculate similarity scores for names only
-        similarity_scores = calculate_theorem_name_similarity_scores(query_name, theorems)
-        
         # Get top 2 candidates with similarity > 0.2 (higher threshold for name-only search)
-        top_candidates = [
-            (idx, score) for idx, score in enumerate(similarity_scores) 
-            if score > 0.2
-        ]
-        top_candidates.sort(key=lambda x: x[1], reverse=True)
-        top_candidates = top_candidates[:2]
+        top_candidates = get_index(db_name, 'theorems').top_k(
+            {'name_ru': name_ru}, {'name_ru': 1.0}, k=2, min_score=0.2
+        )
+        names_by_id = _fetch_rows(db_name, 'theorems', ('name_ru',), [theorem_id for theorem_id, _ in top_candidates])
         
         # Check each candidate with LLM
-        for idx, score in top_candidates:
-            theorem = theorems[idx]
-            logger.info(f"Checking theorem name similarity with LLM: '{name_ru}' vs '{theorem['name_ru']}' (score: {score:.2f})")
-            if verify_theorem_name_match_with_llm(name_ru, theorem['name_ru']):
-                return theorem['id']
+        for theorem_id, score in top_candidates:
+            if theorem_id not in names_by_id:
+                continue
+            candidate_name = names_by_id[theorem_id][0]
+            logger.info(f"Checking theorem name similarity with LLM: '{name_ru}' vs '{candidate_name}' (score: {score:.2f})")
+            if verify_theorem_name_match_with_llm(name_ru, candidate_name):
+                return theorem_id
                 
         return None
         
@@ -533,84 +861,6 @@ def find_theorem_by_name(name_ru, db_name='math_base.db'):
         logger.error(f"Error in find_theorem_by_name: {e}")
         return None
 
-def calculate_term_similarity_scores(query_term, definitions):
-    """
-    Calculate TF-IDF similarity scores between query term and existing definition terms.
-    
-    Args:
-        query_term (str): Preprocessed query term
-        definitions (list): List of existing definitions
-        
-    Returns:
-        list: Similarity scores for each definition term
-    """
-    try:
-        # Prepare corpus of terms
-        terms = [preprocess_text(d[1]) for d in definitions]
-        
-        # Add query to corpus
-        all_terms = terms + [query_term]
-        
-        # Calculate TF-IDF for terms
-        vectorizer = TfidfVectorizer(
-            ngram_range=(1, 2),
-            min_df=1,
-            stop_words=None
-        )
-        
-        if any(all_terms):  # Check if there are non-empty terms
-            tfidf_matrix = vectorizer.fit_transform(all_terms)
-            similarities = cosine_similarity(
-                tfidf_matrix[-1:], tfidf_matrix[:-1]
-            )[0]
-        else:
-            similarities = [0.0] * len(definitions)
-        
-        return similarities
-        
-    except Exception as e:
-        logger.error(f"Error calculating term similarity: {e}")
-        return [0.0] * len(definitions)
-
-def calculate_theorem_name_similarity_scores(query_name, theorems):
-    """
-    Calculate TF-IDF similarity scores between query theorem name and existing theorem names.
-    
-    Args:
-        query_name (str): Preprocessed query theorem name
-        theorems (list): List of existing theorems
-        
-    Returns:
-        list: Similarity scores for each theorem name
-    """
-    try:
-        # Prepare corpus of theorem names
-        names = [preprocess_text(t['name_ru']) for t in theorems]
-        
-        # Add query to corpus
-        all_names = names + [query_name]
-        
-        # Calculate TF-IDF for names
-        vectorizer = TfidfVectorizer(
-            ngram_range=(1, 2),
-            min_df=1,
-            stop_words=None
-        )
-        
-        if any(all_names):  # Check if there are non-empty names
-            tfidf_matrix = vectorizer.fit_transform(all_names)
-            similarities = cosine_similarity(
-                tfidf_matrix[-1:], tfidf_matrix[:-1]
-            )[0]
-        else:
-            similarities = [0.0] * len(theorems)
-        
-        return similarities
-        
-    except Exception as e:
-        logger.error(f"Error calculating theorem name similarity: {e}")
-        return [0.0] * len(theorems)
-
 def verify_term_match_with_llm(query_term, candidate_term):
     """
     Use LLM to verify if query term matches candidate term.
@@ -623,9 +873,16 @@ def verify_term_match_with_llm(query_term, candidate_term):
         bool: True if terms are equivalent, False otherwise
     """
     # First check for exact matches to avoid unnecessary LLM calls
-    if query_term.lower().strip() == candidate_term.lower().strip():
+    if normalize_key(query_term) == normalize_key(candidate_term):
         logger.info(f"Exact term match found without LLM: '{query_term}' = '{candidate_term}'")
         return True
+    
+    gateway = get_gateway()
+    inputs = (query_term, candidate_term)
+    cached = get_verdict_cache().get('term', gateway.model, inputs, gateway.temperature,
+                                     VERIFY_PROMPT_VERSIONS['term'])
+    if cached is not None:
+        return cached
         
     try:
         # Log what we're sending to the LLM
@@ -633,13 +890,6 @@ def verify_term_match_with_llm(query_term, candidate_term):
         logger.info(f"  Query term: '{query_term}' (length: {len(query_term)} chars)")
         logger.info(f"  Candidate term: '{candidate_term}' (length: {len(candidate_term)} chars)")
         
-        llm = ChatOpenAI(
-            openai_api_key=os.getenv("OPENROUTER_API_KEY"),
-            base_url="https://openrouter.ai/api/v1",
-            model_name="meta-llama/llama-4-maverick",
-            temperature=0.1
-        )
-        
         prompt = f"""
 Определи, являются ли эти два математических термина одинаковыми или эквивалентными по смыслу.
 
@@ -650,11 +900,13 @@ def verify_term_match_with_llm(query_term, candidate_term):
 Учитывай синонимы и разные формулировки одного понятия.
 """
         
-        response = llm.invoke([HumanMessage(content=prompt)])
-        answer = response.content.strip().upper()
+        answer = gateway.complete(prompt).upper()
         
         logger.info(f"  LLM response: {answer}")
-        return "ДА" in answer
+        verdict = "ДА" in answer
+        get_verdict_cache().put('term', gateway.model, inputs, verdict, None,
+                                gateway.temperature, VERIFY_PROMPT_VERSIONS['term'])
+        return verdict
         
     except Exception as e:
         logger.error(f"Error calling LLM API for term verification: {e}")
@@ -671,13 +923,14 @@ def verify_theorem_name_match_with_llm(query_name, candidate_name):
     Returns:
         bool: True if theorem names are equivalent, False otherwise
     """
+    gateway = get_gateway()
+    inputs = (query_name, candidate_name)
+    cached = get_verdict_cache().get('theorem_name', gateway.model, inputs, gateway.temperature,
+                                     VERIFY_PROMPT_VERSIONS['theorem_name'])
+    if cached is not None:
+        return cached
+    
     try:
-        llm = ChatOpenAI(
-            openai_api_key=os.getenv("OPENROUTER_API_KEY"),
-            base_url="https://openrouter.ai/api/v1",
-            model_name="meta-llama/llama-4-maverick"
-        )
-        
         prompt = f"""
 Определи, являются ли эти два названия математических теорем одинаковыми или эквивалентными по смыслу.
 
@@ -688,10 +941,12 @@ def verify_theorem_name_match_with_llm(query_name, candidate_name):
 Учитывай синонимы и разные формулировки одного понятия.
 """
         
-        response = llm.invoke([HumanMessage(content=prompt)])
-        answer = response.content.strip().upper()
+        answer = gateway.complete(prompt).upper()
         
-        return "ДА" in answer
+        verdict = "ДА" in answer
+        get_verdict_cache().put('theorem_name', gateway.model, inputs, verdict, None,
+                                gateway.temperature, VERIFY_PROMPT_VERSIONS['theorem_name'])
+        return verdict
         
     except Exception as e:
         logger.error(f"Error calling LLM API for theorem name verification: {e}")
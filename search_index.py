@@ -0,0 +1,446 @@
+"""
+Persistent TF-IDF index for definitions and theorems.
+
+Instead of fitting a new TfidfVectorizer over the whole table on every lookup,
+the index stores raw term counts (hashed word 1-2 grams of the preprocessed text)
+for every row and keeps the document frequencies of the terms up to date as rows
+are appended. The count matrix is never reweighted: IDF is applied to the query,
+and the TF-IDF norms of the rows are one sparse matrix-vector product. IDF and
+norms are recomputed only after the corpus has grown by REWEIGHT_GROWTH; until
+then new rows get norms under the previous IDF, so an insert does not touch the
+rest of the corpus, and a top-k query is one sparse dot product.
+
+The index is pickled next to the SQLite file (e.g. `math_base.db.definitions.idx`)
+and caught up with the table every time it is requested. Only inserts and deletes
+are detected: a row whose text is edited in place keeps its old vector until the
+index is rebuilt (delete the .idx files).
+"""
+
+import os
+import atexit
+import pickle
+import sqlite3
+import logging
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+
+from text_processing import preprocess_texts
+from db import get_connection
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+N_FEATURES = 2 ** 20
+# IDF weights and row norms are recomputed once the corpus has grown by this fraction;
+# rows added in between are weighted with the previous IDF
+REWEIGHT_GROWTH = 0.05
+
+# Indexed text columns for every table
+TABLE_FIELDS = {
+    'definitions': ('term_ru', 'definition_ru'),
+    'theorems': ('name_ru', 'statement_ru'),
+}
+
+# Same analyzer as TfidfVectorizer(ngram_range=(1, 2)), but stateless
+_vectorizer = HashingVectorizer(
+    n_features=N_FEATURES,
+    ngram_range=(1, 2),
+    alternate_sign=False,
+    norm=None
+)
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def _l2_normalize(matrix):
+    """Normalizes rows of a sparse matrix to unit length (empty matrices are returned as is)."""
+    matrix = sparse.csr_matrix(matrix)
+    if matrix.shape[0] == 0:
+        return matrix
+    return normalize(matrix, norm='l2')
+
+
+def index_path(db_name, table):
+    """Returns the file path of the index stored next to the database."""
+    return f"{db_name}.{table}.idx"
+
+
+class SearchIndex:
+    """Incrementally updated TF-IDF index over the text columns of one table."""
+
+    def __init__(self, table: str, path: Optional[str] = None):
+        self.table = table
+        self.fields = TABLE_FIELDS[table]
+        self.path = path
+        self.lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.ids: List[int] = []
+        self._positions = {}
+        self.max_id = 0
+        self._counts = {field: sparse.csr_matrix((0, N_FEATURES)) for field in self.fields}
+        self._pending = {field: [] for field in self.fields}
+        self._df = {field: np.zeros(N_FEATURES, dtype=np.int64) for field in self.fields}
+        self._weights = None
+        # Rows covered by the IDF and by the norms of _weights
+        self._weighted_rows = 0
+        self._normed_rows = 0
+        self.dirty = False
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, row_id: int, texts: Dict[str, str]):
+        """Adds a single row. `texts` maps field name to raw (unprocessed) text."""
+        self.add_many([(row_id, texts)])
+
+    def add_many(self, rows: List[Tuple[int, Dict[str, str]]]):
+        """Adds several rows at once, skipping ids that are already indexed."""
+        with self.lock:
+            rows = [(row_id, texts) for row_id, texts in rows if row_id not in self._positions]
+            if not rows:
+                return
+
+            for field in self.fields:
+                cleaned = preprocess_texts([texts.get(field) for _, texts in rows])
+                counts = _vectorizer.transform(cleaned)
+                np.add.at(self._df[field], counts.indices, 1)
+                self._pending[field].append(counts)
+
+            for row_id, _ in rows:
+                self._positions[row_id] = len(self.ids)
+                self.ids.append(row_id)
+                self.max_id = max(self.max_id, row_id)
+
+            self.dirty = True
+
+    def _count_matrix(self, field):
+        """Merges pending rows into the count matrix of a field."""
+        if self._pending[field]:
+            self._counts[field] = sparse.vstack(
+                [self._counts[field]] + self._pending[field], format='csr'
+            )
+            self._pending[field] = []
+        return self._counts[field]
+
+    def _field_weights(self):
+        """
+        Returns {field: (idf, row_norms)} for the corpus, where row_norms are the L2 norms
+        of the TF-IDF rows (1 for empty rows).
+        Uses the smoothed IDF of TfidfVectorizer: ln((1 + n) / (1 + df)) + 1. It is refreshed
+        once the corpus has grown by REWEIGHT_GROWTH; until then only the norms of new rows
+        are computed.
+        """
+        n_rows = len(self.ids)
+        if self._weights is None or n_rows - self._weighted_rows > REWEIGHT_GROWTH * self._weighted_rows:
+            self._weights = {
+                field: (np.log((1 + n_rows) / (1 + self._df[field])) + 1.0, np.zeros(0)) for field in self.fields
+            }
+            self._weighted_rows, self._normed_rows = n_rows, 0
+        if self._normed_rows < n_rows:
+            for field in self.fields:
+                idf, norms = self._weights[field]
+                added = np.sqrt(self._count_matrix(field)[self._normed_rows:].power(2) @ (idf ** 2))
+                added[added == 0] = 1.0
+                self._weights[field] = (idf, np.concatenate([norms, added]))
+            self._normed_rows = n_rows
+        return self._weights
+
+    def _tfidf_matrix(self, field, positions=None):
+        """Builds the L2-normalized TF-IDF rows of a field (all rows or the given positions)."""
+        idf, norms = self._field_weights()[field]
+        counts = self._count_matrix(field)
+        if positions is not None:
+            counts, norms = counts[positions], norms[positions]
+        return sparse.diags(1.0 / norms) @ sparse.csr_matrix(counts.multiply(idf))
+
+    def similarity(self, queries: Dict[str, List[str]], weights: Dict[str, float],
+                   ids: Optional[List[int]] = None) -> np.ndarray:
+        """
+        Calculates weighted cosine similarity of several queries against the indexed rows.
+
+        Args:
+            queries (dict): Field name -> list of raw query texts (same length for all fields)
+            weights (dict): Field name -> weight of that field in the combined score
+            ids (list): Score only these rows (in this order) instead of the whole index
+
+        Returns:
+            np.ndarray: Matrix of shape (n_queries, n_rows)
+        """
+        with self.lock:
+            n_queries = len(next(iter(queries.values())))
+            positions = None
+            if ids is not None:
+                positions = [self._positions[row_id] for row_id in ids if row_id in self._positions]
+            n_rows = len(self.ids) if positions is None else len(positions)
+            scores = np.zeros((n_queries, n_rows))
+            if not n_rows:
+                return scores
+
+            field_weights = self._field_weights()
+            for field, weight in weights.items():
+                idf, norms = field_weights[field]
+                counts = self._count_matrix(field)
+                if positions is not None:
+                    counts, norms = counts[positions], norms[positions]
+                # Both IDF factors go on the query side: the counts stay unweighted
+                query_matrix = sparse.csr_matrix(self._query_matrix(queries[field], idf).multiply(idf))
+                scores += weight * (query_matrix @ counts.T).toarray() / norms
+            return scores
+
+    @staticmethod
+    def _query_matrix(texts, idf):
+        """Vectorizes raw query texts with the corpus IDF weights."""
+        cleaned = preprocess_texts(texts)
+        return _l2_normalize(_vectorizer.transform(cleaned).multiply(idf))
+
+    def pairwise_similarity(self, queries: Dict[str, List[str]], weights: Dict[str, float]) -> np.ndarray:
+        """
+        Calculates weighted cosine similarity between the queries themselves,
+        using the IDF weights of the indexed corpus.
+
+        Returns:
+            np.ndarray: Symmetric matrix of shape (n_queries, n_queries)
+        """
+        with self.lock:
+            n_queries = len(next(iter(queries.values())))
+            scores = np.zeros((n_queries, n_queries))
+            field_weights = self._field_weights()
+            for field, weight in weights.items():
+                query_matrix = self._query_matrix(queries[field], field_weights[field][0])
+                scores += weight * (query_matrix @ query_matrix.T).toarray()
+            return scores
+
+    def similar_pairs(self, weights: Dict[str, float], min_score: float,
+                      block_size: int = 1000) -> Iterator[Tuple[int, int, float]]:
+        """
+        Finds all pairs of indexed rows whose weighted cosine similarity reaches min_score.
+
+        The rows are multiplied by the whole corpus one block of `block_size` rows at a
+        time and every product stays sparse, so memory grows with the block and the
+        number of overlapping rows, never with n x n.
+
+        Yields:
+            tuple: (row_id, other_row_id, score) with row_id < other_row_id
+        """
+        with self.lock:
+            matrices = {field: self._tfidf_matrix(field) for field in weights}
+            ids = np.array(self.ids)
+            n_rows = len(ids)
+            for start in range(0, n_rows, block_size):
+                stop = min(start + block_size, n_rows)
+                block = sparse.csr_matrix((stop - start, n_rows))
+                for field, weight in weights.items():
+                    matrix = matrices[field]
+                    block = block + weight * (matrix[start:stop] @ matrix.T)
+                block = block.tocoo()
+                rows = block.row + start
+                keep = (block.data >= min_score) & (block.col != rows)
+                for a, b, score in zip(ids[rows[keep]].tolist(), ids[block.col[keep]].tolist(),
+                                       block.data[keep].tolist()):
+                    # Every pair is seen from both of its rows
+                    if a < b:
+                        yield a, b, score
+
+    def pair_similarity(self, pairs: List[Tuple[int, int]], weights: Dict[str, float]) -> np.ndarray:
+        """
+        Calculates weighted cosine similarity of given pairs of indexed rows.
+
+        Returns:
+            np.ndarray: One score per pair (0 for a pair with an unknown row)
+        """
+        with self.lock:
+            scores = np.zeros(len(pairs))
+            known = [i for i, (a, b) in enumerate(pairs) if a in self._positions and b in self._positions]
+            if not known:
+                return scores
+            first = [self._positions[pairs[i][0]] for i in known]
+            second = [self._positions[pairs[i][1]] for i in known]
+            field_weights = self._field_weights()
+            for field, weight in weights.items():
+                idf, norms = field_weights[field]
+                counts = self._count_matrix(field)
+                products = counts[first].multiply(counts[second]) @ (idf ** 2)
+                scores[known] += weight * products / (norms[first] * norms[second])
+            return scores
+
+    def top_k(self, query: Dict[str, str], weights: Dict[str, float], k: int = 2,
+              min_score: float = 0.0, ids: Optional[List[int]] = None) -> List[Tuple[int, float]]:
+        """
+        Returns up to k (row_id, score) pairs with score > min_score, best first.
+        """
+        return self.top_k_batch(
+            {field: [text] for field, text in query.items()}, weights, k, min_score, ids
+        )[0]
+
+    def top_k_batch(self, queries: Dict[str, List[str]], weights: Dict[str, float], k: int = 2,
+                    min_score: float = 0.0, ids: Optional[List[int]] = None,
+                    max_id: Optional[int] = None) -> List[List[Tuple[int, float]]]:
+        """
+        Ranks candidates for many queries with one sparse matrix-matrix product.
+        Returns a list of top-k (row_id, score) lists, one per query.
+        With `max_id`, only rows up to that id (a snapshot of the table) are ranked.
+        """
+        with self.lock:
+            if max_id is not None and max_id < self.max_id:
+                ids = [row_id for row_id in (self.ids if ids is None else ids) if row_id <= max_id]
+            scores = self.similarity(queries, weights, ids)
+            if ids is None:
+                row_ids = self.ids
+            else:
+                row_ids = [row_id for row_id in ids if row_id in self._positions]
+            return [self._rank(row, row_ids, k, min_score) for row in scores]
+
+    @staticmethod
+    def _rank(scores, row_ids, k, min_score):
+        if scores.size == 0:
+            return []
+        k = min(k, scores.size)
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind='stable')]
+        return [(row_ids[i], float(scores[i])) for i in best if scores[i] > min_score]
+
+    def sync(self, conn: sqlite3.Connection):
+        """
+        Brings the index up to date with the table: appends rows inserted since the
+        last sync and rebuilds from scratch if rows were removed. Only the row count
+        and the largest id are compared, so texts edited in place are not re-indexed.
+
+        Indexed rows with ids above the table's AUTOINCREMENT counter are kept: they were
+        added by a writer whose transaction this connection does not see yet.
+        """
+        with self.lock:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT COUNT(*), COALESCE(MAX(id), 0) FROM {self.table}")
+            row_count, max_id = cursor.fetchone()
+            visible_count, visible_max_id = self._visible_rows(max(max_id, self._sequence(cursor)))
+            if row_count == visible_count and max_id == visible_max_id:
+                return
+
+            if row_count > visible_count and max_id > visible_max_id:
+                self._load_rows(cursor, visible_max_id)
+                if row_count == self._visible_rows(max_id)[0]:
+                    return
+
+            logger.info(f"Rebuilding search index for '{self.table}' ({row_count} rows)")
+            self._reset()
+            self._load_rows(cursor, 0)
+
+    def _sequence(self, cursor):
+        """Largest id ever committed to the table (sqlite_sequence), 0 if unknown."""
+        try:
+            cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (self.table,))
+        except sqlite3.OperationalError:
+            return 0
+        row = cursor.fetchone()
+        return row[0] if row else 0
+
+    def _visible_rows(self, max_id):
+        """
+        Returns the number and the largest id of indexed rows with id <= max_id.
+        Ids are appended in increasing order, so only the tail above max_id is scanned.
+        """
+        position = len(self.ids)
+        while position and self.ids[position - 1] > max_id:
+            position -= 1
+        return position, (self.ids[position - 1] if position else 0)
+
+    def _load_rows(self, cursor, after_id):
+        columns = ', '.join(self.fields)
+        cursor.execute(
+            f"SELECT id, {columns} FROM {self.table} WHERE id > ? ORDER BY id", (after_id,)
+        )
+        self.add_many([
+            (row[0], dict(zip(self.fields, row[1:]))) for row in cursor.fetchall()
+        ])
+
+    def save(self):
+        """Writes the index to disk if it has unsaved rows."""
+        with self.lock:
+            if not self.path or not self.dirty or not self.ids:
+                return
+            if not os.path.isdir(os.path.dirname(os.path.abspath(self.path))):
+                return
+            state = {
+                'version': INDEX_VERSION,
+                'table': self.table,
+                'ids': self.ids,
+                'counts': {field: self._count_matrix(field) for field in self.fields},
+            }
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+
+    @classmethod
+    def load(cls, table: str, path: str) -> 'SearchIndex':
+        """Loads an index from disk, or returns an empty one if the file is missing or outdated."""
+        index = cls(table, path)
+        if not os.path.exists(path):
+            return index
+        try:
+            with open(path, 'rb') as f:
+                state = pickle.load(f)
+            if state.get('version') != INDEX_VERSION or state.get('table') != table:
+                logger.info(f"Ignoring outdated search index {path}")
+                return index
+            index.ids = list(state['ids'])
+            index._positions = {row_id: position for position, row_id in enumerate(index.ids)}
+            index.max_id = max(index.ids, default=0)
+            index._counts = state['counts']
+            index._df = {
+                field: np.bincount(counts.indices, minlength=N_FEATURES) for field, counts in index._counts.items()
+            }
+        except Exception as e:
+            logger.error(f"Error loading search index {path}: {e}")
+            index = cls(table, path)
+        return index
+
+
+def get_index(db_name='math_base.db', table='definitions'):
+    """
+    Returns the shared index of a table, loading it from disk on first use
+    and syncing it with the database on every call.
+    """
+    key = (os.path.abspath(db_name), table)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = SearchIndex.load(table, index_path(db_name, table))
+            _indexes[key] = index
+
+    index.sync(get_connection(db_name))
+    return index
+
+
+def forget_indexes(db_name='math_base.db'):
+    """
+    Drops the in-memory indexes of a database, e.g. after a rolled back transaction
+    whose rows were already indexed. They are reloaded from disk on next use.
+    """
+    db_path = os.path.abspath(db_name)
+    with _indexes_lock:
+        for key in [key for key in _indexes if key[0] == db_path]:
+            del _indexes[key]
+
+
+def save_indexes():
+    """Persists every index that has unsaved rows."""
+    with _indexes_lock:
+        indexes = list(_indexes.values())
+    for index in indexes:
+        try:
+            index.save()
+        except Exception as e:
+            logger.error(f"Error saving search index {index.path}: {e}")
+
+
+atexit.register(save_indexes)
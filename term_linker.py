@@ -0,0 +1,288 @@
+"""
+Deterministic detector of definition terms mentioned in a text.
+
+Every `definitions.term_ru` is reduced to the stems of its words
+(`text_processing.word_stems`) and inserted into a word-level Aho-Corasick
+automaton. Scanning a theorem statement, a proof or a definition is then one
+linear pass over its stems, and a literal mention of a term in any inflected
+form ("ограниченного сверху множества" for "Ограниченное сверху множество")
+becomes an edge without an LLM call.
+
+Stems shared by several definitions (the same term defined twice, homonyms)
+make a mention ambiguous: the linker reports all candidates instead of picking
+one, and the agent's hybrid mode leaves such mentions to the LLM. So do terms
+that lose words with their formulas: "Функция $x^{\alpha}$" is indexed as
+"функция", and a plain "функция" in a text must not become a certain edge.
+Terms left without any words (" $x^{-\frac{m}{n}}$") are not indexed.
+
+`TheoremNameLinker` does the same for references to theorems by name
+("по лемме Кантора"). Every theorem is indexed under its name without
+parenthesized notes and under each note ("Теорема о вложенных отрезках (лемма
+Кантора)"), and the words теорема/лемма/утверждение/предложение/следствие are
+interchangeable, so "теорема Кантора" finds "Лемма Кантора".
+
+The automatons are kept per database and caught up with their table on every
+use. New rows are inserted into the trie; failure links are rebuilt lazily
+before the next scan. Like the search indexes, they only append rows, so after
+rows are rolled back or deleted call `forget_term_linkers()`.
+
+Usage:
+    linker = get_term_linker('math_base.db')
+    found, ambiguous = linker.link("Всякое ограниченное сверху множество имеет супремум")
+    found, ambiguous = get_theorem_linker('math_base.db').link("Применим лемму Кантора")
+"""
+
+import os
+import re
+import sqlite3
+import logging
+import threading
+from collections import deque
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from text_processing import word_stems, stem_russian
+from db import get_connection
+
+logger = logging.getLogger(__name__)
+
+# Formulas and parenthesized notes are not part of the words of a term: "Отрезок $[a, b]$", "Предел (функции)"
+_TERM_NOISE = re.compile(r'\$.*?\$|\(.*?\)|\[.*?\]')
+_FORMULA = re.compile(r'\$(.*?)\$')
+_NOTE = re.compile(r'\((.*?)\)')
+_WORD = re.compile(r'[^\W\d_]+')
+
+# Kinds of statements that name the same theorem interchangeably, in every case form
+# (their stems are unreliable: "теорему" stems to "теор", like "теория"), and the token standing for all of them
+_THEOREM_WORDS = (
+    {base + ending for base in ('теорем', 'лемм') for ending in ('', 'а', 'ы', 'е', 'у', 'ой', 'ою', 'ам', 'ами', 'ах')} |
+    {base + ending for base in ('утвержден', 'предложен', 'следств')
+     for ending in ('ие', 'ия', 'ию', 'ием', 'ии', 'ий', 'иям', 'иями', 'иях')}
+)
+THEOREM_WORD = '<теорема>'
+
+_linkers = {}
+_linkers_lock = threading.Lock()
+
+
+class Mention(NamedTuple):
+    """A term found in a text: the rows with that term and its word positions [start, end)."""
+    ids: Tuple[int, ...]
+    start: int
+    end: int
+
+
+def term_stems(term: str) -> List[str]:
+    """Stems of the words of a term, without formulas and parenthesized notes."""
+    return word_stems(_TERM_NOISE.sub(' ', term or ''), min_length=1)
+
+
+def loses_formula_words(term: str) -> bool:
+    """Whether a term has formulas with letters in them, which term_stems drops ("Функция $x^{\\alpha}$")."""
+    return any(word_stems(formula, min_length=1) for formula in _FORMULA.findall(term or ''))
+
+
+def _theorem_word_stems(text: str) -> List[str]:
+    """Stems of a text with the kind of statement ("лемма", "теоремы", ...) replaced by THEOREM_WORD."""
+    return [THEOREM_WORD if word in _THEOREM_WORDS else stem_russian(word) for word in _WORD.findall((text or '').lower())]
+
+
+def theorem_name_forms(name: str) -> List[List[str]]:
+    """
+    Stemmed forms a theorem is referred to by: its name without parenthesized notes and each note
+    ("Теорема о вложенных отрезках (лемма Кантора)"). Forms that are only a kind of statement
+    with a number ("Лемма 2") are dropped.
+    """
+    forms = []
+    for form in [_TERM_NOISE.sub(' ', name or '')] + _NOTE.findall(name or ''):
+        stems = _theorem_word_stems(re.sub(r'\$.*?\$', ' ', form))
+        if any(stem != THEOREM_WORD for stem in stems) and stems not in forms:
+            forms.append(stems)
+    return forms
+
+
+def mention_span(text: str, mention: Mention) -> Tuple[int, int]:
+    """Character span of a mention found in a text."""
+    words = list(_WORD.finditer(text))
+    return words[mention.start].start(), words[mention.end - 1].end()
+
+
+class TermLinker:
+    """Word-level Aho-Corasick automaton over the stemmed terms of the definitions table."""
+
+    # Rows added since the last sync: (id, term)
+    _ROWS_QUERY = "SELECT id, term_ru FROM definitions WHERE id > ? ORDER BY id"
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._depth: List[int] = [0]
+        self._ids: Dict[int, List[int]] = {}
+        # Rows whose mentions are always ambiguous: their stems are only part of the term
+        self._uncertain = set()
+        self._fail: List[int] = [0]
+        self._output_link: List[int] = [0]
+        self._links_built = True
+        self.max_id = 0
+        self.terms = 0
+
+    def __len__(self):
+        return self.terms
+
+    def _forms(self, term: str) -> List[List[str]]:
+        """Stemmed phrases a row is found by."""
+        stems = term_stems(term)
+        return [stems] if stems else []
+
+    def _text_stems(self, text: str) -> List[str]:
+        # Single letters are kept so that "O-большое" does not match every "большой"
+        return word_stems(text, min_length=1)
+
+    def add(self, row_id: int, term: str):
+        """Inserts the term of one row (terms without words are ignored)."""
+        forms = self._forms(term)
+        with self.lock:
+            self.max_id = max(self.max_id, row_id)
+            if forms and loses_formula_words(term):
+                self._uncertain.add(row_id)
+            for stems in forms:
+                self._insert(row_id, stems)
+
+    def _insert(self, row_id: int, stems: List[str]):
+        node = 0
+        for stem in stems:
+            child = self._goto[node].get(stem)
+            if child is None:
+                child = len(self._goto)
+                self._goto[node][stem] = child
+                self._goto.append({})
+                self._depth.append(self._depth[node] + 1)
+            node = child
+        ids = self._ids.setdefault(node, [])
+        if row_id not in ids:
+            ids.append(row_id)
+        self._links_built = False
+        self.terms += 1
+
+    def sync(self, conn: sqlite3.Connection):
+        """Adds the rows inserted since the last sync."""
+        with self.lock:
+            rows = conn.execute(self._ROWS_QUERY, (self.max_id,)).fetchall()
+            for row_id, term in rows:
+                self.add(row_id, term)
+
+    def _build_links(self):
+        """Computes failure links and output links (nearest proper suffix that ends a term) by BFS."""
+        n_nodes = len(self._goto)
+        self._fail = [0] * n_nodes
+        self._output_link = [0] * n_nodes
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for stem, child in self._goto[node].items():
+                fallback = self._fail[node]
+                while fallback and stem not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(stem, 0)
+                self._fail[child] = target if target != child else 0
+                suffix = self._fail[child]
+                self._output_link[child] = suffix if suffix in self._ids else self._output_link[suffix]
+                queue.append(child)
+        self._links_built = True
+
+    def find(self, text: str) -> List[Mention]:
+        """
+        Finds every term mentioned in a text in one pass over its stems.
+        A mention inside a longer one ("множество" in "ограниченное сверху множество") is dropped.
+
+        Returns:
+            list: Mentions ordered by position
+        """
+        stems = self._text_stems(text)
+        mentions = []
+        with self.lock:
+            if not self._links_built:
+                self._build_links()
+            node = 0
+            for position, stem in enumerate(stems):
+                while node and stem not in self._goto[node]:
+                    node = self._fail[node]
+                node = self._goto[node].get(stem, 0)
+                match = node if node in self._ids else self._output_link[node]
+                while match:
+                    mentions.append(Mention(tuple(self._ids[match]),
+                                            position + 1 - self._depth[match], position + 1))
+                    match = self._output_link[match]
+
+        mentions.sort(key=lambda mention: (mention.start, mention.start - mention.end))
+        longest = []
+        for mention in mentions:
+            if not any(kept.start <= mention.start and mention.end <= kept.end for kept in longest):
+                longest.append(mention)
+        return longest
+
+    def link(self, text: str, exclude_id: Optional[int] = None) -> Tuple[List[int], List[List[int]]]:
+        """
+        Resolves the mentions of a text to rows.
+
+        Args:
+            text (str): Theorem statement, proof or definition text
+            exclude_id (int): Row that must not be linked (e.g. the definition being scanned)
+
+        Returns:
+            tuple: (IDs of unambiguously mentioned rows,
+                    candidate ID lists of ambiguous mentions), without repeats.
+                   A mention of a term that lost words with its formulas is always ambiguous.
+        """
+        found, ambiguous = [], []
+        for mention in self.find(text):
+            candidates = [row_id for row_id in mention.ids if row_id != exclude_id]
+            if len(candidates) == 1 and candidates[0] not in self._uncertain:
+                if candidates[0] not in found:
+                    found.append(candidates[0])
+            elif candidates and candidates not in ambiguous:
+                ambiguous.append(candidates)
+        return found, ambiguous
+
+
+class TheoremNameLinker(TermLinker):
+    """Automaton over the names of the theorems table and their short forms."""
+
+    _ROWS_QUERY = "SELECT id, name_ru FROM theorems WHERE id > ? ORDER BY id"
+
+    def _forms(self, name: str) -> List[List[str]]:
+        return theorem_name_forms(name)
+
+    def _text_stems(self, text: str) -> List[str]:
+        return _theorem_word_stems(text)
+
+
+def _get_linker(db_name: str, linker_class) -> TermLinker:
+    key = (os.path.abspath(db_name), linker_class)
+    with _linkers_lock:
+        linker = _linkers.get(key)
+        if linker is None:
+            linker = _linkers[key] = linker_class()
+
+    linker.sync(get_connection(db_name))
+    return linker
+
+
+def get_term_linker(db_name='math_base.db') -> TermLinker:
+    """Returns the shared linker of a database, synced with its definitions table."""
+    return _get_linker(db_name, TermLinker)
+
+
+def get_theorem_linker(db_name='math_base.db') -> TheoremNameLinker:
+    """Returns the shared theorem name linker of a database, synced with its theorems table."""
+    return _get_linker(db_name, TheoremNameLinker)
+
+
+def forget_term_linkers(db_name='math_base.db'):
+    """Drops the linkers of a database, e.g. after rolled back or deleted rows."""
+    key = os.path.abspath(db_name)
+    with _linkers_lock:
+        for linker_key in [linker_key for linker_key in _linkers if linker_key[0] == key]:
+            del _linkers[linker_key]
@@ -0,0 +1,21 @@
+"""
+Shared test helpers for the fixture database tests/math_base.db.
+"""
+
+import os
+import shutil
+import sqlite3
+
+from create_database import migrate_database
+
+FIXTURE_DB = os.path.join(os.path.dirname(__file__), 'math_base.db')
+
+
+def migrated_fixture(tmp_dir):
+    """Copies the fixture database into tmp_dir and migrates the copy; tests/math_base.db is never changed."""
+    db_name = os.path.join(tmp_dir, 'math_base.db')
+    shutil.copyfile(FIXTURE_DB, db_name)
+    conn = sqlite3.connect(db_name)
+    migrate_database(conn)
+    conn.close()
+    return db_name
@@ -0,0 +1,100 @@
+import unittest
+import sys
+import os
+import json
+import time
+import sqlite3
+import tempfile
+from unittest.mock import patch
+
+# Add parent directory to path to import search modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from create_database import create_database
+from db import close_connection
+from algorithmic_agent import AlgorithmicAgent
+
+LECTURES = {
+    'lecture_1.json': [
+        ("Отрезок", "Множество точек числовой прямой между a и b включительно"),
+        ("Интервал", "Множество точек числовой прямой строго между a и b"),
+    ],
+    'lecture_2.json': [
+        ("Предел последовательности", "Число a, к которому сколь угодно близко подходят члены последовательности"),
+        ("Отрезок", "Множество точек числовой прямой между a и b включительно"),
+    ],
+    'lecture_3.json': [
+        ("Супремум", "Точная верхняя грань ограниченного сверху множества"),
+        ("Инфимум", "Точная нижняя грань ограниченного снизу множества"),
+    ],
+    'lecture_4.json': [
+        ("Отрезок", "Множество точек числовой прямой между a и b включительно"),
+        ("Сходящийся ряд", "Ряд, последовательность частичных сумм которого имеет предел"),
+    ],
+}
+
+
+def slow_rejection(*args):
+    """LLM stand-in that takes a while and never confirms a duplicate."""
+    time.sleep(0.05)
+    return False
+
+
+class TestParallelIngestion(unittest.TestCase):
+    """Files prepared in parallel should give the same database as sequential processing."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.lectures_dir = os.path.join(self.tmp_dir.name, 'lectures')
+        os.mkdir(self.lectures_dir)
+        for file_name, definitions in LECTURES.items():
+            with open(os.path.join(self.lectures_dir, file_name), 'w', encoding='utf-8') as f:
+                json.dump({
+                    'definitions': [{'term_ru': term, 'definition_ru': text} for term, text in definitions],
+                    'theorems': [],
+                }, f, ensure_ascii=False)
+
+    def tearDown(self):
+        close_connection()
+        self.tmp_dir.cleanup()
+
+    def _run(self, workers, linked=None):
+        db_name = os.path.join(self.tmp_dir.name, f'workers_{workers}.db')
+        create_database(db_name)
+        agent = AlgorithmicAgent(db_name, self.lectures_dir, workers=workers)
+
+        def record_links(theorems, definitions):
+            if linked is not None:
+                linked.append(sorted(item['term_ru'] for item in definitions))
+
+        with patch('search.verify_with_llm', side_effect=slow_rejection), \
+                patch.object(agent, '_find_connections_for_new_items', side_effect=record_links):
+            agent.run()
+
+        conn = sqlite3.connect(db_name)
+        terms = sorted(row[0] for row in conn.execute("SELECT term_ru FROM definitions"))
+        conn.close()
+        return agent.stats, terms
+
+    def test_same_result_as_sequential(self):
+        sequential_stats, sequential_terms = self._run(workers=1)
+        parallel_stats, parallel_terms = self._run(workers=4)
+
+        self.assertEqual(parallel_terms, sequential_terms)
+        self.assertEqual(parallel_terms.count("Отрезок"), 1, "A definition repeated across files is added once")
+        self.assertEqual(parallel_stats['files_processed'], 4)
+        self.assertEqual(parallel_stats['definitions_added'], 6)
+        self.assertEqual(parallel_stats['definitions_duplicates'], 2)
+        self.assertEqual(parallel_stats, sequential_stats)
+
+    def test_each_file_links_only_its_own_items(self):
+        for workers in (1, 4):
+            linked = []
+            _, terms = self._run(workers, linked)
+            # Items of earlier files are not linked again with every later file
+            self.assertEqual(sorted(term for file_terms in linked for term in file_terms), terms)
+            self.assertEqual(len(linked), len(LECTURES))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
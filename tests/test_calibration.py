@@ -0,0 +1,152 @@
+import unittest
+import sys
+import os
+import sqlite3
+import tempfile
+from unittest.mock import patch
+
+# Add parent directory to path to import search modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from calibration import Band, Calibration, fit_bands, configure_calibration
+from llm_cache import VerdictCache
+from llm_gateway import get_gateway
+from create_database import create_database
+from db import close_connection, get_connection
+import search
+
+
+def make_labels(errors=()):
+    """100 verdicts: "НЕТ" below score 0.5, "ДА" from 0.5, with the given scores flipped."""
+    labels = []
+    for i in range(100):
+        score = i / 100
+        labels.append((score, (score >= 0.5) != (score in errors)))
+    return labels
+
+
+class TestFitBands(unittest.TestCase):
+    """Test cases for learning the accept/reject score bands (calibration.py)."""
+
+    def test_separable_verdicts(self):
+        accept, reject = fit_bands(make_labels(), max_error=0.05)
+        self.assertEqual((accept.verdict, accept.bound, accept.samples, accept.errors), (True, 0.5, 50, 0))
+        self.assertEqual((reject.verdict, reject.bound, reject.samples), (False, 0.49, 50))
+        self.assertAlmostEqual(accept.error_rate, 1 / 52)
+
+    def test_wrong_verdicts_shrink_the_band(self):
+        accept, _ = fit_bands(make_labels(errors=(0.55, 0.6)), max_error=0.05)
+        # Including both wrong "ДА" verdicts would exceed 5% estimated error
+        self.assertGreater(accept.bound, 0.55)
+        self.assertLessEqual(accept.error_rate, 0.05)
+
+    def test_few_verdicts_give_no_band(self):
+        self.assertEqual(fit_bands([(0.9, True)] * 10 + [(0.2, False)] * 10, max_error=0.02), [])
+
+    def test_equal_scores_are_not_split(self):
+        labels = [(0.9, True)] * 60 + [(0.5, True)] * 5 + [(0.5, False)] * 5
+        accept = fit_bands(labels, max_error=0.05)[0]
+        self.assertEqual((accept.bound, accept.samples), (0.9, 60))
+
+
+class TestCalibratedVerification(unittest.TestCase):
+    """Candidates inside a band are decided without the LLM."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_name = os.path.join(self.tmp_dir.name, 'math_base.db')
+        create_database(self.db_name)
+        conn = get_connection(self.db_name)
+        conn.executemany("INSERT INTO definitions (term_ru, definition_ru) VALUES (?, ?)",
+                         [("Супремум", "Точная верхняя грань"), ("Инфимум", "Точная нижняя грань")])
+        conn.commit()
+        self.path = os.path.join(self.tmp_dir.name, 'calibration.json')
+        Calibration({'definition': [Band(True, 0.8, 100, 0), Band(False, 0.3, 100, 1)]}).save(self.path)
+        self.calibration = configure_calibration(self.path)
+
+    def tearDown(self):
+        configure_calibration(None)
+        close_connection()
+        self.tmp_dir.cleanup()
+
+    def _verify(self, candidates):
+        with patch('search.verify_with_llm', return_value=False) as mock_llm:
+            found = search._verify_definition_candidates("Точная грань", "Грань множества", candidates, self.db_name)
+        return found, mock_llm
+
+    def test_accept_band(self):
+        found, mock_llm = self._verify([(2, 0.9), (1, 0.5)])
+        self.assertEqual(found, 2)
+        mock_llm.assert_not_called()
+
+    def test_reject_band(self):
+        found, mock_llm = self._verify([(2, 0.2), (1, 0.1)])
+        self.assertIsNone(found)
+        mock_llm.assert_not_called()
+        self.assertIn("Calibrated definition reject band: 2 LLM calls saved, estimated error 2.0%",
+                      self.calibration.report())
+
+    def test_uncertain_scores_go_to_the_llm(self):
+        found, mock_llm = self._verify([(2, 0.5), (1, 0.2)])
+        self.assertIsNone(found)
+        mock_llm.assert_called_once()
+        # The score is passed on so that the verdict becomes a label
+        self.assertEqual(mock_llm.call_args[0][-1], 0.5)
+
+    def test_bands_of_another_model_are_ignored(self):
+        Calibration({'definition': [Band(True, 0.8, 100, 0)]}, 'other/model').save(self.path)
+        configure_calibration(self.path)
+        with self.assertLogs('calibration', level='WARNING'):
+            found, mock_llm = self._verify([(2, 0.9)])
+        self.assertIsNone(found)
+        mock_llm.assert_called_once()
+
+        Calibration({'definition': [Band(True, 0.8, 100, 0)]}, get_gateway().model).save(self.path)
+        configure_calibration(self.path)
+        found, mock_llm = self._verify([(2, 0.9)])
+        self.assertEqual(found, 2)
+        mock_llm.assert_not_called()
+
+    def test_disabled_by_default(self):
+        configure_calibration(None)
+        _, mock_llm = self._verify([(2, 0.9), (1, 0.1)])
+        self.assertEqual(mock_llm.call_count, 2)
+
+
+class TestLabels(unittest.TestCase):
+    """The verdict cache keeps the candidate score as a label."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'llm_cache.db')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_labels_of_kind_and_model(self):
+        cache = VerdictCache(self.path)
+        cache.put('definition', 'model-a', ("A", "B"), True, 0.75)
+        cache.put('definition', 'model-b', ("A", "C"), False, 0.25)
+        cache.put('definition', 'model-a', ("A", "D"), False)
+        cache.put('theorem', 'model-a', ("A", "E"), True, 0.5)
+        self.assertEqual(sorted(cache.labels('definition')), [(0.25, False), (0.75, True)])
+        self.assertEqual(cache.labels('definition', 'model-a'), [(0.75, True)])
+        cache.close()
+
+    def test_cache_without_scores_is_migrated(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute("""CREATE TABLE verdicts (key TEXT PRIMARY KEY, kind TEXT NOT NULL, model TEXT NOT NULL,
+                        verdict INTEGER NOT NULL, last_used REAL NOT NULL)""")
+        conn.execute("INSERT INTO verdicts VALUES ('k', 'definition', 'model', 1, 0)")
+        conn.commit()
+        conn.close()
+
+        cache = VerdictCache(self.path)
+        self.assertEqual(cache.labels('definition'), [])
+        cache.put('definition', 'model', ("A", "B"), True, 0.9)
+        self.assertEqual(cache.labels('definition'), [(0.9, True)])
+        cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,134 @@
+import unittest
+import sys
+import os
+import json
+import sqlite3
+import tempfile
+import threading
+from unittest.mock import patch
+
+# Add parent directory to path to import search modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from create_database import create_database
+from db import get_connection, close_connection, transaction
+from algorithmic_agent import AlgorithmicAgent
+
+
+class TestConnections(unittest.TestCase):
+    """Test cases for the shared SQLite connections (db.py)."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_name = os.path.join(self.tmp_dir.name, 'math_base.db')
+        create_database(self.db_name)
+
+    def tearDown(self):
+        close_connection()
+        self.tmp_dir.cleanup()
+
+    def _count(self, table='definitions'):
+        conn = sqlite3.connect(self.db_name)
+        count = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        conn.close()
+        return count
+
+    def test_connection_is_reused_per_thread(self):
+        conn = get_connection(self.db_name)
+        self.assertIs(get_connection(self.db_name), conn)
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], 'wal')
+
+        other = []
+        thread = threading.Thread(target=lambda: other.append(get_connection(self.db_name)))
+        thread.start()
+        thread.join()
+        self.assertIsNot(other[0], conn)
+
+    def test_replaced_file_gets_new_connection(self):
+        conn = get_connection(self.db_name)
+        close_connection(self.db_name)
+        os.remove(self.db_name)
+        create_database(self.db_name)
+        self.assertIsNot(get_connection(self.db_name), conn)
+
+    def test_transaction_commits_once(self):
+        with transaction(self.db_name) as conn:
+            conn.execute("INSERT INTO definitions (term_ru, definition_ru) VALUES ('a', 'b')")
+            conn.execute("INSERT INTO definitions (term_ru, definition_ru) VALUES ('c', 'd')")
+            self.assertEqual(self._count(), 0, "Rows should not be visible before commit")
+        self.assertEqual(self._count(), 2)
+
+    def test_transaction_rolls_back_on_error(self):
+        with self.assertRaises(RuntimeError):
+            with transaction(self.db_name) as conn:
+                conn.execute("INSERT INTO definitions (term_ru, definition_ru) VALUES ('a', 'b')")
+                raise RuntimeError("failure")
+        self.assertEqual(self._count(), 0)
+
+
+class TestAgentUnitOfWork(unittest.TestCase):
+    """The agent should write a lecture file in one transaction."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_name = os.path.join(self.tmp_dir.name, 'math_base.db')
+        create_database(self.db_name)
+        self.lecture = os.path.join(self.tmp_dir.name, 'lecture.json')
+        with open(self.lecture, 'w', encoding='utf-8') as f:
+            json.dump({
+                'definitions': [
+                    {'term_ru': "Отрезок", 'definition_ru': "Множество точек между a и b"},
+                    {'term_ru': "Интервал", 'definition_ru': "Множество точек строго между a и b"},
+                ],
+                'theorems': [],
+            }, f, ensure_ascii=False)
+
+    def tearDown(self):
+        close_connection()
+        self.tmp_dir.cleanup()
+
+    @patch('search.verify_with_llm', return_value=False)
+    def test_file_is_committed(self, mock_llm):
+        agent = AlgorithmicAgent(self.db_name, self.tmp_dir.name)
+        with patch.object(agent, '_find_connections_for_new_items'):
+            agent._process_file(self.lecture)
+
+        conn = sqlite3.connect(self.db_name)
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM definitions").fetchone()[0], 2)
+        conn.close()
+        self.assertEqual(agent.stats['definitions_added'], 2)
+
+    @patch('search.verify_with_llm', return_value=False)
+    def test_failed_file_is_rolled_back(self, mock_llm):
+        agent = AlgorithmicAgent(self.db_name, self.tmp_dir.name)
+        with patch.object(agent, '_find_connections_for_new_items', side_effect=RuntimeError("failure")):
+            agent._process_file(self.lecture)
+
+        conn = sqlite3.connect(self.db_name)
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM definitions").fetchone()[0], 0)
+        conn.close()
+        self.assertEqual(agent.stats['definitions_added'], 0)
+        self.assertEqual(agent.newly_added_definitions, [])
+
+    @patch('search.verify_with_llm', return_value=False)
+    def test_failed_insert_rolls_back_the_file(self, mock_llm):
+        """A row whose buckets cannot be written must not be committed without them."""
+        agent = AlgorithmicAgent(self.db_name, self.tmp_dir.name)
+        with patch('algorithmic_agent.add_to_lsh', side_effect=[None, RuntimeError("failure")]), \
+                patch.object(agent, '_find_connections_for_new_items') as mock_link:
+            self.assertIsNone(agent._process_file(self.lecture))
+
+        mock_link.assert_not_called()
+        self.assertEqual(self._count(), 0)
+        self.assertEqual(self._count('lsh_buckets'), 0)
+        self.assertEqual(agent.stats['definitions_added'], 0)
+
+    def _count(self, table='definitions'):
+        conn = sqlite3.connect(self.db_name)
+        count = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        conn.close()
+        return count
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
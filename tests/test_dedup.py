@@ -0,0 +1,70 @@
+import unittest
+import sys
+import os
+
+import numpy as np
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dedup import UnionFind, cluster_by_similarity
+from search import cluster_definitions
+
+
+class TestUnionFind(unittest.TestCase):
+    """Test cases for the union-find structure."""
+
+    def test_union_and_find(self):
+        union_find = UnionFind(range(5))
+        union_find.union(0, 3)
+        union_find.union(3, 4)
+        self.assertEqual(union_find.find(0), union_find.find(4))
+        self.assertNotEqual(union_find.find(0), union_find.find(1))
+
+    def test_groups_keep_order(self):
+        """Groups are ordered by their first member and keep insertion order."""
+        union_find = UnionFind(range(5))
+        union_find.union(4, 1)
+        union_find.union(2, 0)
+        self.assertEqual(union_find.groups(), [[0, 2], [1, 4], [3]])
+
+    def test_items_added_on_demand(self):
+        union_find = UnionFind()
+        union_find.union(10, 20)
+        self.assertEqual(union_find.groups(), [[10, 20]])
+
+
+class TestClustering(unittest.TestCase):
+    """Test clustering of a batch by pairwise similarity."""
+
+    def test_cluster_by_similarity(self):
+        similarity = np.array([
+            [1.0, 0.95, 0.1],
+            [0.95, 1.0, 0.2],
+            [0.1, 0.2, 1.0],
+        ])
+        self.assertEqual(cluster_by_similarity(similarity, 0.9), [[0, 1], [2]])
+
+    def test_cluster_definitions(self):
+        """Copies of the same definition inside a batch end up in one cluster."""
+        db_name = os.path.join(os.path.dirname(__file__), 'math_base.db')
+        clusters = cluster_definitions([
+            ("Супремум", "Точная верхняя грань ограниченного сверху множества"),
+            ("Инфимум", "Точная нижняя грань ограниченного снизу множества"),
+            ("супремум", "Точная  верхняя грань ограниченного сверху  Множества"),
+        ], db_name)
+        self.assertEqual(clusters, [[0, 2], [1]])
+
+    def test_similar_items_with_different_keys_are_not_copies(self):
+        """Items that differ only in formulas or numbers are kept apart for the duplicate check."""
+        db_name = os.path.join(os.path.dirname(__file__), 'math_base.db')
+        clusters = cluster_definitions([
+            ("Функция $\\arcsin x$", "Обратная функция к $\\sin x$ на отрезке $[-\\pi/2, \\pi/2]$"),
+            ("Функция $\\arccos x$", "Обратная функция к $\\cos x$ на отрезке $[0, \\pi]$"),
+            ("Функция $\\arcsin x$", "Обратная функция к $\\sin x$ на отрезке $[-\\pi/2, \\pi/2]$"),
+        ], db_name, threshold=0.5)
+        self.assertEqual(clusters, [[0, 2], [1]])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
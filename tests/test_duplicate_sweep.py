@@ -0,0 +1,90 @@
+import unittest
+import sys
+import os
+import tempfile
+from unittest.mock import patch
+
+import numpy as np
+
+# Add parent directory to path to import search modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from create_database import create_database
+from db import close_connection, get_connection
+from search_index import get_index, forget_indexes
+from search import DEFINITION_WEIGHTS
+from duplicate_sweep import sweep_duplicates, candidate_pairs, confirm_pairs
+
+DEFINITIONS = [
+    ("Супремум", "Точная верхняя грань ограниченного сверху множества"),
+    ("Отрезок", "Множество точек числовой прямой между a и b включительно"),
+    ("Верхняя грань множества", "Точная верхняя грань множества, ограниченного сверху"),
+    ("Интервал", "Множество точек числовой прямой строго между a и b"),
+    ("Инфимум", "Точная нижняя грань ограниченного снизу множества"),
+]
+
+
+class TestDuplicateSweep(unittest.TestCase):
+    """Test cases for the offline duplicate sweep (duplicate_sweep.py)."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_name = os.path.join(self.tmp_dir.name, 'math_base.db')
+        create_database(self.db_name)
+        conn = get_connection(self.db_name)
+        conn.executemany("INSERT INTO definitions (term_ru, definition_ru) VALUES (?, ?)", DEFINITIONS)
+        conn.commit()
+
+    def tearDown(self):
+        forget_indexes(self.db_name)
+        close_connection()
+        self.tmp_dir.cleanup()
+
+    def _pairs(self):
+        return [(pair['item_id'], pair['other_id']) for pair in candidate_pairs(self.db_name, kind='definition')]
+
+    def test_blocks_match_dense_similarity(self):
+        index = get_index(self.db_name, 'definitions')
+        texts = {field: [text[i] for text in DEFINITIONS] for i, field in enumerate(('term_ru', 'definition_ru'))}
+        dense = index.similarity(texts, DEFINITION_WEIGHTS)
+        expected = {(a + 1, b + 1) for a, b in zip(*np.nonzero(np.triu(dense >= 0.3, k=1)))}
+
+        for block_size in (1, 2, 100):
+            pairs = {(a, b) for a, b, _ in index.similar_pairs(DEFINITION_WEIGHTS, 0.3, block_size)}
+            self.assertEqual(pairs, expected)
+        self.assertIn((2, 4), expected)
+
+    def test_pairs_are_ranked(self):
+        found = sweep_duplicates(self.db_name, threshold=0.3, block_size=2)
+        self.assertEqual(found['definition'], len(self._pairs()))
+        scores = [pair['score'] for pair in candidate_pairs(self.db_name)]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertIn((1, 3), self._pairs())
+
+    def test_lsh_sweep_scores_bucket_pairs(self):
+        sweep_duplicates(self.db_name, threshold=0.3)
+        all_pairs = set(self._pairs())
+        sweep_duplicates(self.db_name, threshold=0.3, use_lsh=True)
+        self.assertIn((1, 3), self._pairs())
+        self.assertLessEqual(set(self._pairs()), all_pairs)
+
+    def test_confirmation_and_rerun(self):
+        sweep_duplicates(self.db_name, threshold=0.3)
+        pending = len(self._pairs())
+
+        def same_concept(query_term, query_definition, candidate_term, candidate_definition, score=None):
+            return {query_term, candidate_term} == {"Супремум", "Верхняя грань множества"}
+
+        with patch('duplicate_sweep.verify_with_llm', side_effect=same_concept) as mock_llm:
+            counts = confirm_pairs(self.db_name)
+        self.assertEqual(mock_llm.call_count, pending)
+        self.assertEqual(counts['duplicate'], 1)
+        self.assertEqual(candidate_pairs(self.db_name, status='duplicate')[0]['item_id'], 1)
+
+        # Checked pairs are not swept again
+        sweep_duplicates(self.db_name, threshold=0.3)
+        self.assertEqual(self._pairs(), [])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,67 @@
+import unittest
+import sys
+import os
+import sqlite3
+import tempfile
+
+# Add parent directory to path to import search modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from create_database import create_database
+from edge_buffer import EdgeBuffer
+
+
+class TestEdgeBuffer(unittest.TestCase):
+    """Test cases for the bulk edge writer (edge_buffer.py)."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        db_name = os.path.join(self.tmp_dir.name, 'math_base.db')
+        create_database(db_name)
+        self.conn = sqlite3.connect(db_name)
+        self.conn.execute("INSERT INTO theorem_uses_definition (theorem_id, definition_id, context) VALUES (1, 1, 'statement')")
+        self.conn.commit()
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmp_dir.cleanup()
+
+    def _edges(self, table):
+        return sorted(self.conn.execute(f"SELECT * FROM {table}").fetchall())
+
+    def test_known_and_repeated_edges_are_skipped(self):
+        buffer = EdgeBuffer()
+        self.assertFalse(buffer.add(self.conn, 'theorem_definition', 1, 1, 'statement'))
+        self.assertTrue(buffer.add(self.conn, 'theorem_definition', 1, 2, 'statement'))
+        self.assertFalse(buffer.add(self.conn, 'theorem_definition', 1, 2, 'proof'))
+        self.assertTrue(buffer.add(self.conn, 'definition_definition', 3, 4))
+        self.assertEqual(len(buffer), 2)
+
+    def test_flush_writes_every_table(self):
+        buffer = EdgeBuffer()
+        buffer.add(self.conn, 'theorem_definition', 1, 2, 'statement')
+        buffer.add(self.conn, 'theorem_theorem', 2, 1, 'proof')
+        buffer.add(self.conn, 'definition_definition', 3, 4)
+
+        self.assertEqual(buffer.flush(self.conn), 3)
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(self._edges('theorem_uses_definition'), [(1, 1, 'statement'), (1, 2, 'statement')])
+        self.assertEqual(self._edges('theorem_uses_theorem'), [(2, 1, 'proof')])
+        self.assertEqual(self._edges('definition_uses_definition'), [(3, 4)])
+
+        # Flushed edges count as stored
+        self.assertFalse(buffer.add(self.conn, 'definition_definition', 3, 4))
+
+    def test_reset_reloads_stored_edges(self):
+        buffer = EdgeBuffer()
+        buffer.add(self.conn, 'definition_definition', 3, 4)
+        buffer.flush(self.conn)
+        self.conn.rollback()
+
+        buffer.reset()
+        self.assertEqual(len(buffer), 0)
+        self.assertTrue(buffer.add(self.conn, 'definition_definition', 3, 4))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
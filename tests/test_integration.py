@@ -2,22 +2,32 @@ import unittest
 import sys
 import os
 import sqlite3
+import tempfile
 from unittest.mock import patch, MagicMock
 
 # Add parent directory to path to import search module
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from search import find_definition
+from db import close_connection
+from search_index import forget_indexes
+from tests.fixtures import FIXTURE_DB, migrated_fixture
 
 
 class TestSearchIntegration(unittest.TestCase):
     """Integration tests for find_definition using real database and real LLM calls."""
     
     def setUp(self):
-        """Set up test database path."""
-        self.db_name = os.path.join(os.path.dirname(__file__), 'math_base.db')
+        """Set up a migrated copy of the test database."""
         # Verify database exists
-        self.assertTrue(os.path.exists(self.db_name), "Database file not found")
+        self.assertTrue(os.path.exists(FIXTURE_DB), "Database file not found")
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_name = migrated_fixture(self.tmp_dir.name)
+    
+    def tearDown(self):
+        forget_indexes(self.db_name)
+        close_connection(self.db_name)
+        self.tmp_dir.cleanup()
     
     def test_integration_with_real_llm_exact_match(self):
         """Integration test with real LLM for exact match (requires API key)."""
@@ -66,8 +76,14 @@ class TestSearchManualVerification(unittest.TestCase):
     """Manual verification tests that print results for human inspection."""
     
     def setUp(self):
-        """Set up test database path."""
-        self.db_name = os.path.join(os.path.dirname(__file__), 'math_base.db')
+        """Set up a migrated copy of the test database."""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_name = migrated_fixture(self.tmp_dir.name)
+    
+    def tearDown(self):
+        forget_indexes(self.db_name)
+        close_connection(self.db_name)
+        self.tmp_dir.cleanup()
     
     @patch('search.verify_with_llm')
     def test_manual_verify_top_candidates(self, mock_llm):
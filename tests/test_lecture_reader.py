@@ -0,0 +1,96 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+
+# Add parent directory to path to import search modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lecture_reader import detect_encoding, iter_items
+
+OUTPUT = {
+    'lecture': 1,
+    'definitions': [
+        {'term_ru': "Отрезок", 'definition_ru': "Множество точек между a и b", 'page': 12.5},
+        {'term_ru': "Интервал", 'definition_ru': "Множество точек строго между a и b", 'tags': [1, None, True]},
+    ],
+    'theorems': [
+        {'name_ru': "Теорема Больцано-Коши", 'statement_ru': "Непрерывная функция принимает промежуточные значения"},
+    ],
+}
+OTHER_OUTPUT = {
+    'definitions': [{'term_ru': "Супремум", 'definition_ru': "Точная верхняя грань"}],
+    'theorems': None,
+}
+
+
+class TestLectureReader(unittest.TestCase):
+    """Test cases for the streaming lecture reader (lecture_reader.py)."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'lecture.json')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _write(self, data, encoding='utf-8'):
+        with open(self.path, 'w', encoding=encoding) as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+    def _items(self, chunk_size=7):
+        return list(iter_items(self.path, chunk_size=chunk_size))
+
+    def _expected(self, *outputs):
+        definitions = [('definition', item) for output in outputs for item in output['definitions'] or []]
+        theorems = [('theorem', item) for output in outputs for item in output['theorems'] or []]
+        return definitions, theorems
+
+    def _split(self, items):
+        return ([item for item in items if item[0] == 'definition'],
+                [item for item in items if item[0] == 'theorem'])
+
+    def test_single_output(self):
+        self._write(OUTPUT)
+        self.assertEqual(self._split(self._items()), self._expected(OUTPUT))
+
+    def test_list_of_outputs(self):
+        self._write([{'output': OUTPUT}, {'input': "text"}, {'output': OTHER_OUTPUT}])
+        self.assertEqual(self._split(self._items()), self._expected(OUTPUT, OTHER_OUTPUT))
+
+    def test_export_reads_only_first_element(self):
+        self._write([
+            {'output': OTHER_OUTPUT, 'data': [{'output': OUTPUT}, {'output': OTHER_OUTPUT}]},
+            {'output': OUTPUT},
+        ])
+        self.assertEqual(self._split(self._items()), self._expected(OUTPUT, OTHER_OUTPUT))
+
+    def test_chunk_size_does_not_change_items(self):
+        self._write([{'output': OUTPUT}, {'output': OTHER_OUTPUT}])
+        expected = self._items(chunk_size=1 << 16)
+        for chunk_size in (1, 2, 3, 5, 64):
+            self.assertEqual(self._items(chunk_size), expected)
+
+    def test_cp1251_file(self):
+        self._write(OUTPUT, encoding='cp1251')
+        self.assertEqual(self._split(self._items()), self._expected(OUTPUT))
+
+    def test_detect_encoding(self):
+        text = "Определение: множество точек"
+        self.assertEqual(detect_encoding(text.encode('utf-8')), 'utf-8')
+        # A character cut off at the end of the prefix
+        self.assertEqual(detect_encoding(text.encode('utf-8')[:-1]), 'utf-8')
+        self.assertEqual(detect_encoding(b'\xef\xbb\xbf' + text.encode('utf-8')), 'utf-8-sig')
+        self.assertEqual(detect_encoding(text.encode('cp1251')), 'cp1251')
+        self.assertEqual(detect_encoding("Définition".encode('latin1')), 'latin1')
+
+    def test_invalid_json_raises(self):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write('{"definitions": [{"term_ru": "Отрезок"}')
+        with self.assertRaises(ValueError):
+            self._items()
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
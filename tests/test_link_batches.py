@@ -0,0 +1,124 @@
+import unittest
+import sys
+import os
+import re
+import json
+import sqlite3
+import tempfile
+from unittest.mock import patch
+
+# Add parent directory to path to import search modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from create_database import create_database
+from db import close_connection
+from algorithmic_agent import AlgorithmicAgent
+from search import shortlist_definitions
+
+DEFINITIONS = [
+    ("Отрезок", "Множество точек числовой прямой между a и b включительно"),
+    ("Интервал", "Множество точек числовой прямой строго между a и b"),
+    ("Ограниченное сверху множество", "Множество, все элементы которого не больше некоторого числа"),
+    ("Супремум", "Точная верхняя грань ограниченного сверху множества"),
+    ("Инфимум", "Точная нижняя грань ограниченного снизу множества"),
+]
+
+THEOREMS = [
+    ("Теорема о супремуме",
+     "Всякое непустое ограниченное сверху множество вещественных чисел имеет супремум"),
+    ("Теорема о вложенных отрезках",
+     "Всякая последовательность вложенных отрезков числовой прямой имеет общую точку"),
+]
+
+
+def link_everything(prompt, max_tokens=None):
+    """LLM stand-in: links every text of a batched prompt to the first two definitions."""
+    texts = re.findall(r'^ТЕКСТ (\d+)\.', prompt, re.MULTILINE)
+    return json.dumps({number: [1, 2] for number in texts})
+
+
+class TestBatchedLinking(unittest.TestCase):
+    """Test cases for batched connection analysis (AlgorithmicAgent link_batch_size)."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_name = os.path.join(self.tmp_dir.name, 'math_base.db')
+        create_database(self.db_name)
+        self.lectures_dir = os.path.join(self.tmp_dir.name, 'lectures')
+        os.mkdir(self.lectures_dir)
+        with open(os.path.join(self.lectures_dir, 'lecture_1.json'), 'w', encoding='utf-8') as f:
+            json.dump({
+                'definitions': [{'term_ru': term, 'definition_ru': text} for term, text in DEFINITIONS],
+                'theorems': [{'name_ru': name, 'statement_ru': text} for name, text in THEOREMS],
+            }, f, ensure_ascii=False)
+
+    def tearDown(self):
+        close_connection()
+        self.tmp_dir.cleanup()
+
+    def _run(self, response=link_everything, **options):
+        agent = AlgorithmicAgent(self.db_name, self.lectures_dir, **options)
+        with patch('search.verify_with_llm', return_value=False), \
+                patch.object(agent, '_call_llm', side_effect=response) as mock_llm:
+            agent.run()
+
+        conn = sqlite3.connect(self.db_name)
+        edges = conn.execute("SELECT COUNT(*) FROM theorem_uses_definition").fetchone()[0]
+        edges += conn.execute("SELECT COUNT(*) FROM definition_uses_definition").fetchone()[0]
+        self_links = conn.execute(
+            "SELECT COUNT(*) FROM definition_uses_definition WHERE definition_id = used_definition_id"
+        ).fetchone()[0]
+        conn.close()
+        return agent, mock_llm, edges, self_links
+
+    def test_items_share_requests(self):
+        agent, mock_llm, edges, self_links = self._run(link_batch_size=4)
+
+        # 2 theorems and 5 definitions in batches of at most 4
+        self.assertEqual(mock_llm.call_count, 2)
+        prompt = mock_llm.call_args_list[0][0][0]
+        self.assertIn("ТЕКСТ 1. Теорема «Теорема о супремуме»", prompt)
+        self.assertIn("ТЕКСТ 4. Определение", prompt)
+        self.assertGreater(edges, 0)
+        self.assertEqual(edges, agent.stats['connections_created'])
+        self.assertEqual(self_links, 0)
+
+    def test_over_budget_batches_are_split(self):
+        with patch('algorithmic_agent.LINK_PROMPT_TOKENS', 1):
+            _, mock_llm, _, _ = self._run(link_batch_size=4)
+        # Every batch is halved down to single items
+        self.assertEqual(mock_llm.call_count, 7)
+        for call in mock_llm.call_args_list:
+            self.assertNotIn("ТЕКСТ 2.", call[0][0])
+
+    def test_unparsable_answer_creates_no_edges(self):
+        agent, _, edges, _ = self._run(response=lambda prompt, max_tokens=None: "- 1: Отрезок", link_batch_size=4)
+        self.assertEqual(edges, 0)
+        self.assertEqual(agent.stats['connections_created'], 0)
+
+    def test_pipeline_batches(self):
+        agent, mock_llm, edges, _ = self._run(link_batch_size=4, pipeline=True, workers=2)
+        self.assertEqual(mock_llm.call_count, 2)
+        self.assertGreater(edges, 0)
+        self.assertEqual(edges, agent.stats['connections_created'])
+
+    def test_items_are_shortlisted_once_per_run(self):
+        with open(os.path.join(self.lectures_dir, 'lecture_2.json'), 'w', encoding='utf-8') as f:
+            json.dump({'definitions': [{'term_ru': "Промежуток", 'definition_ru': "Отрезок, интервал или полуинтервал"}],
+                       'theorems': []}, f, ensure_ascii=False)
+        with patch('algorithmic_agent.shortlist_definitions', wraps=shortlist_definitions) as mock_shortlist:
+            self._run()
+        # Items of the first file are not shortlisted again with the second one
+        shortlisted = [text for call in mock_shortlist.call_args_list for text in call[0][0]]
+        self.assertEqual(len(shortlisted), len(THEOREMS) + len(DEFINITIONS) + 1)
+
+    def test_parse_batch_links(self):
+        parse = AlgorithmicAgent._parse_batch_links
+        self.assertEqual(parse('Ответ: {"1": [2, "3"], "ТЕКСТ 2": []}'), {1: [2, 3], 2: []})
+        self.assertEqual(parse("НЕТ СВЯЗЕЙ"), {})
+        self.assertIsNone(parse('{"1": [2,'))
+        self.assertIsNone(parse("[1, 2]"))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,131 @@
+import unittest
+import sys
+import os
+import tempfile
+from unittest.mock import patch, MagicMock
+
+# Add parent directory to path to import search module
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import llm_cache
+from llm_cache import VerdictCache, configure_verdict_cache, make_key
+from search import verify_with_llm
+
+
+class TestVerdictCache(unittest.TestCase):
+    """Test cases for the on-disk LLM verdict cache."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'llm_cache.db')
+        self.cache = VerdictCache(self.path, max_entries=10)
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmp_dir.cleanup()
+
+    def test_put_and_get(self):
+        """A stored verdict should be returned and counted as a hit."""
+        self.assertIsNone(self.cache.get('term', 'model', ("A", "B")))
+        self.cache.put('term', 'model', ("A", "B"), True)
+        self.assertTrue(self.cache.get('term', 'model', ("A", "B")))
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.assertEqual(self.cache.stats()['misses'], 1)
+
+    def test_key_normalization(self):
+        """Whitespace differences should map to the same key, case differences should not."""
+        self.assertEqual(
+            make_key('term', 'model', ["Супремум  множества "]),
+            make_key('term', 'model', ["Супремум множества"])
+        )
+        # "A" and "a" may name different objects
+        self.assertNotEqual(
+            make_key('term', 'model', ["Множество A"]),
+            make_key('term', 'model', ["Множество a"])
+        )
+        self.assertNotEqual(
+            make_key('term', 'model-a', ["Супремум"]),
+            make_key('term', 'model-b', ["Супремум"])
+        )
+
+    def test_temperature_and_prompt_version_are_part_of_the_key(self):
+        """A verdict is only reused for the same temperature and prompt template."""
+        self.cache.put('term', 'model', ("A", "B"), True, temperature=0.1, prompt_version=1)
+        self.assertTrue(self.cache.get('term', 'model', ("A", "B"), 0.1, 1))
+        self.assertIsNone(self.cache.get('term', 'model', ("A", "B"), 0.7, 1))
+        self.assertIsNone(self.cache.get('term', 'model', ("A", "B"), 0.1, 2))
+
+    def test_hits_touch_entries_at_most_once_per_interval(self):
+        """A hit only writes when the entry was last used more than TOUCH_INTERVAL ago."""
+        with patch('llm_cache.time.time', return_value=1000.0):
+            self.cache.put('term', 'model', ("A", "B"), True)
+        with patch('llm_cache.time.time', return_value=1000.0 + llm_cache.TOUCH_INTERVAL):
+            self.cache.get('term', 'model', ("A", "B"))
+        self.assertEqual(self._last_used(), 1000.0)
+        with patch('llm_cache.time.time', return_value=1001.0 + llm_cache.TOUCH_INTERVAL):
+            self.cache.get('term', 'model', ("A", "B"))
+        self.assertEqual(self._last_used(), 1001.0 + llm_cache.TOUCH_INTERVAL)
+
+    def _last_used(self):
+        return self.cache._conn.execute('SELECT last_used FROM verdicts').fetchone()[0]
+
+    def test_persistence(self):
+        """Verdicts should survive reopening the cache file."""
+        self.cache.put('theorem', 'model', ("X", "Y", "Z", "W"), False)
+        reopened = VerdictCache(self.path)
+        self.assertIs(reopened.get('theorem', 'model', ("X", "Y", "Z", "W")), False)
+        reopened.close()
+
+    def test_eviction(self):
+        """The cache should not grow past max_entries."""
+        with patch.object(llm_cache, 'EVICTION_CHECK_INTERVAL', 1):
+            for i in range(25):
+                self.cache.put('term', 'model', (str(i), "B"), True)
+        self.assertEqual(self.cache.stats()['size'], 10)
+        # The most recent verdicts are kept
+        self.assertTrue(self.cache.get('term', 'model', ("24", "B")))
+
+    def test_invalidate_per_model(self):
+        """Invalidating one model should keep verdicts of the others."""
+        self.cache.put('term', 'model-a', ("A", "B"), True)
+        self.cache.put('term', 'model-b', ("A", "B"), True)
+        self.assertEqual(self.cache.invalidate('model-a'), 1)
+        self.assertIsNone(self.cache.get('term', 'model-a', ("A", "B")))
+        self.assertTrue(self.cache.get('term', 'model-b', ("A", "B")))
+
+
+class TestVerifyUsesCache(unittest.TestCase):
+    """verify_*_with_llm functions should only call the LLM once per pair."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        configure_verdict_cache(os.path.join(self.tmp_dir.name, 'llm_cache.db'))
+
+    def tearDown(self):
+        configure_verdict_cache(None)
+        self.tmp_dir.cleanup()
+
+    @patch('search.get_gateway')
+    def test_second_call_is_cached(self, mock_gateway):
+        mock_instance = MagicMock(model="test-model")
+        mock_instance.complete.return_value = "ДА"
+        mock_gateway.return_value = mock_instance
+
+        args = ("Супремум", "Точная верхняя грань", "Супремум", "Наименьшая верхняя грань")
+        self.assertTrue(verify_with_llm(*args))
+        self.assertTrue(verify_with_llm(*args))
+        self.assertEqual(mock_instance.complete.call_count, 1)
+
+    @patch('search.get_gateway')
+    def test_errors_are_not_cached(self, mock_gateway):
+        mock_instance = MagicMock(model="test-model")
+        mock_instance.complete.side_effect = [Exception("API Error"), "ДА"]
+        mock_gateway.return_value = mock_instance
+
+        args = ("Инфимум", "Точная нижняя грань", "Инфимум", "Наибольшая нижняя грань")
+        self.assertFalse(verify_with_llm(*args))
+        self.assertTrue(verify_with_llm(*args))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,82 @@
+import unittest
+import sys
+import os
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add parent directory to path to import modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_gateway import LLMGateway
+
+
+class FakeCompletionsHandler(BaseHTTPRequestHandler):
+    """Minimal OpenAI-compatible /chat/completions endpoint."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.requests.append(body)
+        self.server.client_ports.add(self.client_address[1])
+        payload = json.dumps({
+            "id": "test",
+            "object": "chat.completion",
+            "created": 0,
+            "model": body["model"],
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": " ДА \n"}
+            }]
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestLLMGateway(unittest.TestCase):
+    """Test the gateway against a local OpenAI-compatible stand-in."""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeCompletionsHandler)
+        self.server.requests = []
+        self.server.client_ports = set()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.gateway = LLMGateway(
+            base_url=f"http://127.0.0.1:{self.server.server_port}/v1",
+            api_key="test",
+            model="test-model",
+            temperature=0.0,
+            timeout=5
+        )
+
+    def tearDown(self):
+        self.gateway.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_complete(self):
+        """The answer text should be returned stripped, with configured settings sent."""
+        self.assertEqual(self.gateway.complete("Вопрос", max_tokens=5), "ДА")
+        request = self.server.requests[0]
+        self.assertEqual(request["model"], "test-model")
+        self.assertEqual(request["max_tokens"], 5)
+        self.assertEqual(request["messages"][0]["content"], "Вопрос")
+
+    def test_connection_reused(self):
+        """Sequential calls should go over one kept-alive connection."""
+        for _ in range(3):
+            self.gateway.complete("Вопрос")
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(len(self.server.client_ports), 1)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
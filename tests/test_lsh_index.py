@@ -0,0 +1,143 @@
+import unittest
+import sys
+import os
+import json
+import tempfile
+from unittest.mock import patch
+
+# Add parent directory to path to import search modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from create_database import create_database
+from db import close_connection, get_connection
+from search_index import forget_indexes
+from algorithmic_agent import AlgorithmicAgent
+from lsh_index import minhash_signature, shingles, add_item, remove_items, ensure_lsh_index, lsh_candidates, lsh_pairs
+import search
+
+DEFINITIONS = [
+    ("Супремум", "Точная верхняя грань ограниченного сверху множества вещественных чисел"),
+    ("Отрезок", "Множество точек числовой прямой между a и b включительно"),
+    ("Интервал", "Множество точек числовой прямой строго между a и b"),
+    ("Предел последовательности", "Число, к которому сколь угодно близко подходят члены последовательности"),
+]
+
+
+class TestMinHash(unittest.TestCase):
+    """Test cases for MinHash signatures (lsh_index.py)."""
+
+    def test_signature_estimates_jaccard(self):
+        a = "точная верхняя грань ограниченного сверху множества вещественных чисел"
+        b = "точная верхняя грань ограниченного снизу множества вещественных чисел"
+        shingles_a, shingles_b = shingles(a), shingles(b)
+        jaccard = len(shingles_a & shingles_b) / len(shingles_a | shingles_b)
+        estimate = (minhash_signature(a) == minhash_signature(b)).mean()
+        self.assertAlmostEqual(estimate, jaccard, delta=0.2)
+        self.assertTrue((minhash_signature(a) == minhash_signature(a.upper())).all())
+
+    def test_short_and_empty_texts(self):
+        self.assertEqual(shingles("Супремум"), {"супремум"})
+        self.assertEqual(minhash_signature("", None).size, 0)
+
+
+class TestLSHBuckets(unittest.TestCase):
+    """Test cases for LSH candidate blocking."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_name = os.path.join(self.tmp_dir.name, 'math_base.db')
+        create_database(self.db_name)
+        self.conn = get_connection(self.db_name)
+        self.conn.executemany("INSERT INTO definitions (term_ru, definition_ru) VALUES (?, ?)", DEFINITIONS)
+        self.conn.commit()
+
+    def tearDown(self):
+        forget_indexes(self.db_name)
+        close_connection()
+        self.tmp_dir.cleanup()
+
+    def test_backfill_and_candidates(self):
+        self.assertEqual(ensure_lsh_index(self.conn), 4)
+        self.assertEqual(ensure_lsh_index(self.conn), 0)
+
+        found = lsh_candidates(self.conn, 'definition', "Отрезок",
+                               "Множество точек числовой прямой между a и b, включая концы")
+        self.assertIn(2, found)
+        self.assertNotIn(4, found)
+        self.assertEqual(lsh_candidates(self.conn, 'theorem', "Отрезок", "Множество точек"), set())
+
+        remove_items(self.conn, 'definition', [2])
+        self.assertNotIn(2, lsh_candidates(self.conn, 'definition', *DEFINITIONS[1]))
+        add_item(self.conn, 'definition', 2, *DEFINITIONS[1])
+        self.assertIn((2, 3), set(lsh_pairs(self.conn, 'definition')))
+
+    def test_backfill_of_rows_below_a_hashed_one(self):
+        # Rows 1-3 were inserted without buckets while the agent hashed row 4
+        add_item(self.conn, 'definition', 4, *DEFINITIONS[3])
+        self.conn.commit()
+        self.assertEqual(ensure_lsh_index(self.conn), 3)
+        self.assertIn(2, lsh_candidates(self.conn, 'definition', *DEFINITIONS[1]))
+
+    def test_oversized_buckets_are_skipped(self):
+        ensure_lsh_index(self.conn)
+        self.assertIn((2, 3), set(lsh_pairs(self.conn, 'definition')))
+        with self.assertLogs('lsh_index', level='WARNING'):
+            self.assertEqual(list(lsh_pairs(self.conn, 'definition', max_bucket_size=1)), [])
+
+    def test_blocked_lookup_hashes_stored_rows(self):
+        # Rows inserted without buckets, as load_lecture_1.py does
+        with patch('search.LSH_BLOCKING', True), \
+                patch('search.verify_with_llm', return_value=False) as mock_llm:
+            search.find_definition("Супремум множества", "Точная верхняя грань ограниченного сверху множества",
+                                   self.db_name)
+        self.assertEqual([call[0][2] for call in mock_llm.call_args_list], ["Супремум"])
+        self.assertEqual(ensure_lsh_index(self.conn), 0)
+
+    def test_search_ranks_only_candidates(self):
+        ensure_lsh_index(self.conn)
+        query = ("Супремум множества", "Точная верхняя грань ограниченного сверху множества")
+        with patch('search.LSH_BLOCKING', True), \
+                patch('search.lsh_candidates', wraps=search.lsh_candidates) as mock_lsh, \
+                patch('search.verify_with_llm', return_value=False) as mock_llm:
+            self.assertIsNone(search.find_definition(*query, self.db_name))
+            lookup = search.find_definitions_batch([query], self.db_name)[0]
+        mock_lsh.assert_called()
+        # Only the definition sharing a bucket is ranked and verified
+        self.assertEqual([call[0][2] for call in mock_llm.call_args_list], ["Супремум"])
+        self.assertEqual([candidate_id for candidate_id, _ in lookup['candidates']], [1])
+
+
+class TestAgentUpdatesBuckets(unittest.TestCase):
+    """New items are hashed in the transaction that inserts them."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_name = os.path.join(self.tmp_dir.name, 'math_base.db')
+        create_database(self.db_name)
+        self.lectures_dir = os.path.join(self.tmp_dir.name, 'lectures')
+        os.mkdir(self.lectures_dir)
+        with open(os.path.join(self.lectures_dir, 'lecture_1.json'), 'w', encoding='utf-8') as f:
+            json.dump({
+                'definitions': [{'term_ru': term, 'definition_ru': text} for term, text in DEFINITIONS[:2]],
+                'theorems': [{'name_ru': "Теорема о супремуме",
+                              'statement_ru': "Ограниченное сверху множество имеет супремум"}],
+            }, f, ensure_ascii=False)
+
+    def tearDown(self):
+        forget_indexes(self.db_name)
+        close_connection()
+        self.tmp_dir.cleanup()
+
+    def test_inserted_items_are_candidates(self):
+        agent = AlgorithmicAgent(self.db_name, self.lectures_dir)
+        with patch('search.verify_with_llm', return_value=False), \
+                patch.object(agent, '_call_llm', return_value="НЕТ СВЯЗЕЙ"):
+            agent.run()
+        conn = get_connection(self.db_name)
+        self.assertEqual(lsh_candidates(conn, 'definition', *DEFINITIONS[0]), {1})
+        self.assertEqual(lsh_candidates(conn, 'theorem', "Теорема о супремуме",
+                                        "Ограниченное сверху множество имеет супремум"), {1})
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
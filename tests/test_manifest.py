@@ -0,0 +1,146 @@
+import unittest
+import sys
+import os
+import json
+import sqlite3
+import tempfile
+from unittest.mock import patch
+
+# Add parent directory to path to import search modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from create_database import create_database
+from db import close_connection
+from algorithmic_agent import AlgorithmicAgent
+from manifest import STATUS_DONE, STATUS_FAILED, get_entry
+import search
+
+DEFINITIONS = [
+    ("Отрезок", "Множество точек числовой прямой между a и b включительно"),
+    ("Интервал", "Множество точек числовой прямой строго между a и b"),
+    ("Супремум", "Точная верхняя грань ограниченного сверху множества"),
+    ("Инфимум", "Точная нижняя грань ограниченного снизу множества"),
+    ("Сходящийся ряд", "Ряд, последовательность частичных сумм которого имеет предел"),
+]
+
+
+class TestIncrementalIngestion(unittest.TestCase):
+    """Test cases for the lecture file manifest (manifest.py)."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_name = os.path.join(self.tmp_dir.name, 'math_base.db')
+        create_database(self.db_name)
+        self.lectures_dir = os.path.join(self.tmp_dir.name, 'lectures')
+        os.mkdir(self.lectures_dir)
+        self.lecture = os.path.join(self.lectures_dir, 'lecture_1.json')
+        self._write_lecture(DEFINITIONS)
+
+    def tearDown(self):
+        close_connection()
+        self.tmp_dir.cleanup()
+
+    def _write_lecture(self, definitions):
+        with open(self.lecture, 'w', encoding='utf-8') as f:
+            json.dump({
+                'definitions': [{'term_ru': term, 'definition_ru': text} for term, text in definitions],
+                'theorems': [],
+            }, f, ensure_ascii=False)
+
+    def _run(self, linked=None):
+        agent = AlgorithmicAgent(self.db_name, self.lectures_dir)
+
+        def record_links(theorems, definitions):
+            if linked is not None:
+                linked.extend(item['term_ru'] for item in definitions)
+
+        with patch('search.verify_with_llm', return_value=False) as mock_llm, \
+                patch.object(agent, '_find_connections_for_new_items', side_effect=record_links):
+            agent.run()
+        return agent, mock_llm
+
+    def _terms(self):
+        conn = sqlite3.connect(self.db_name)
+        terms = [row[0] for row in conn.execute("SELECT term_ru FROM definitions ORDER BY id")]
+        conn.close()
+        return terms
+
+    def _entry(self):
+        conn = sqlite3.connect(self.db_name)
+        entry = get_entry(conn, self.lecture)
+        conn.close()
+        return entry
+
+    def test_unchanged_file_is_skipped(self):
+        self._run()
+        self.assertEqual(self._entry()['status'], STATUS_DONE)
+
+        agent, mock_llm = self._run()
+        self.assertEqual(agent.stats['files_unchanged'], 1)
+        self.assertEqual(agent.stats['definitions_processed'], 0)
+        mock_llm.assert_not_called()
+        self.assertEqual(len(self._terms()), len(DEFINITIONS))
+
+    def test_edited_file_is_processed_again(self):
+        self._run()
+        new_definition = ("Предел функции", "Число, к которому стремятся значения функции")
+        self._write_lecture([new_definition] + DEFINITIONS)
+
+        with patch('algorithmic_agent.find_definitions_batch', wraps=search.find_definitions_batch) as lookup:
+            agent, _ = self._run()
+        self.assertEqual(agent.stats['files_unchanged'], 0)
+        # Only the added definition is looked up; the others keep their stored rows
+        self.assertEqual(agent.stats['items_unchanged'], len(DEFINITIONS))
+        self.assertEqual(agent.stats['definitions_processed'], 1)
+        self.assertEqual(agent.stats['definitions_added'], 1)
+        self.assertEqual(lookup.call_args[0][0], [new_definition])
+
+        # Provenance follows the items to their new positions
+        conn = sqlite3.connect(self.db_name)
+        provenance = conn.execute(
+            "SELECT s.position, d.term_ru FROM source_items s JOIN definitions d ON d.id = s.item_id "
+            "WHERE s.kind = 'definition' ORDER BY s.position"
+        ).fetchall()
+        conn.close()
+        self.assertEqual([term for _, term in provenance], [term for term, _ in [new_definition] + DEFINITIONS])
+        self.assertEqual([position for position, _ in provenance], list(range(len(DEFINITIONS) + 1)))
+
+    def test_edited_item_is_processed_again(self):
+        self._run()
+        edited = [("Отрезок", "Множество точек прямой от a до b, включая концы")] + DEFINITIONS[1:]
+        self._write_lecture(edited)
+
+        agent, _ = self._run()
+        self.assertEqual(agent.stats['items_unchanged'], len(DEFINITIONS) - 1)
+        self.assertEqual(agent.stats['definitions_processed'], 1)
+
+    @patch('algorithmic_agent.CHECKPOINT_ITEMS', 2)
+    def test_failed_file_resumes_from_last_checkpoint(self):
+        calls = []
+
+        def fail_on_fourth(*args):
+            calls.append(args)
+            if len(calls) == 4:
+                raise RuntimeError("failure")
+            return search.index_definition(*args)
+
+        with patch('algorithmic_agent.index_definition', side_effect=fail_on_fourth):
+            agent, _ = self._run()
+        # The first checkpoint was committed, the third definition was rolled back
+        self.assertEqual(self._terms(), ["Отрезок", "Интервал"])
+        self.assertEqual(agent.stats['definitions_added'], 2)
+        entry = self._entry()
+        self.assertEqual(entry['status'], STATUS_FAILED)
+        self.assertEqual(entry['next_item'], 2)
+
+        linked = []
+        agent, _ = self._run(linked)
+        self.assertEqual(agent.stats['definitions_processed'], 3)
+        self.assertEqual(self._terms(), [term for term, _ in DEFINITIONS])
+        # Definitions committed before the failure are linked together with the rest
+        self.assertEqual(sorted(linked), sorted(term for term, _ in DEFINITIONS))
+        self.assertEqual(self._entry()['status'], STATUS_DONE)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
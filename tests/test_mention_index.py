@@ -0,0 +1,159 @@
+import unittest
+import sys
+import os
+import json
+import sqlite3
+import tempfile
+from unittest.mock import patch
+
+# Add parent directory to path to import search modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from create_database import create_database
+from db import close_connection, get_connection
+from algorithmic_agent import AlgorithmicAgent
+from mention_index import index_item, remove_items, ensure_mention_index, items_mentioning
+from term_linker import forget_term_linkers, term_stems
+
+OLD_THEOREMS = [
+    ("Теорема о супремуме",
+     "Всякое непустое ограниченное сверху множество вещественных чисел имеет точную верхнюю грань"),
+    ("Теорема о пределе",
+     "Монотонная ограниченная последовательность вещественных чисел имеет конечный предел"),
+]
+
+
+class TestMentionIndex(unittest.TestCase):
+    """Test cases for the inverted index of item words (mention_index.py)."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_name = os.path.join(self.tmp_dir.name, 'math_base.db')
+        create_database(self.db_name)
+        self.conn = get_connection(self.db_name)
+
+    def tearDown(self):
+        close_connection()
+        self.tmp_dir.cleanup()
+
+    def test_items_containing_every_stem(self):
+        index_item(self.conn, 'theorem', 1, "Множество, ограниченное сверху, имеет супремум", None)
+        index_item(self.conn, 'theorem', 2, "Ограниченная последовательность", "Множество значений")
+        index_item(self.conn, 'definition', 3, "Ограниченного сверху множества элементы")
+
+        found = items_mentioning(self.conn, term_stems("Ограниченное сверху множество"))
+        self.assertEqual(found, {'theorem': {1}, 'definition': {3}})
+        # Words of the proof are indexed too
+        self.assertEqual(items_mentioning(self.conn, term_stems("множество значений"))['theorem'], {2})
+
+        remove_items(self.conn, 'theorem', [1])
+        self.assertEqual(items_mentioning(self.conn, term_stems("супремум"))['theorem'], set())
+
+    def test_backfill_of_existing_rows(self):
+        self.conn.execute("INSERT INTO theorems (name_ru, statement_ru) VALUES ('Т', 'Всякий отрезок компактен')")
+        self.conn.execute("INSERT INTO definitions (term_ru, definition_ru) VALUES ('Интервал', 'Часть прямой')")
+        self.conn.commit()
+
+        self.assertEqual(ensure_mention_index(self.conn), 2)
+        self.assertEqual(items_mentioning(self.conn, term_stems("отрезок"))['theorem'], {1})
+        # Indexed rows are not indexed again
+        self.assertEqual(ensure_mention_index(self.conn), 0)
+
+    def test_backfill_of_rows_below_an_indexed_one(self):
+        # Another writer inserted row 2 without postings, the agent indexed row 3
+        for item_id, text in ((1, 'Всякий отрезок компактен'), (2, 'Всякий интервал открыт'), (3, 'Шар')):
+            self.conn.execute("INSERT INTO theorems (id, name_ru, statement_ru) VALUES (?, 'Т', ?)", (item_id, text))
+        index_item(self.conn, 'theorem', 1, 'Всякий отрезок компактен')
+        index_item(self.conn, 'theorem', 3, 'Шар')
+        self.conn.commit()
+
+        self.assertEqual(ensure_mention_index(self.conn), 1)
+        self.assertEqual(items_mentioning(self.conn, term_stems("интервал"))['theorem'], {2})
+
+
+class TestReverseLinking(unittest.TestCase):
+    """Test cases for linking existing items to the definitions that arrive after them."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_name = os.path.join(self.tmp_dir.name, 'math_base.db')
+        create_database(self.db_name)
+        self.lectures_dir = os.path.join(self.tmp_dir.name, 'lectures')
+        os.mkdir(self.lectures_dir)
+
+    def tearDown(self):
+        forget_term_linkers(self.db_name)
+        close_connection()
+        self.tmp_dir.cleanup()
+
+    def _ingest(self, file_name, definitions, theorems, linker, response="НЕТ СВЯЗЕЙ"):
+        with open(os.path.join(self.lectures_dir, file_name), 'w', encoding='utf-8') as f:
+            json.dump({
+                'definitions': [{'term_ru': term, 'definition_ru': text} for term, text in definitions],
+                'theorems': [{'name_ru': name, 'statement_ru': text} for name, text in theorems],
+            }, f, ensure_ascii=False)
+        agent = AlgorithmicAgent(self.db_name, self.lectures_dir, linker=linker)
+        with patch('search.verify_with_llm', return_value=False), \
+                patch.object(agent, '_call_llm', return_value=response) as mock_llm:
+            agent.run()
+        return agent, mock_llm
+
+    def _theorem_edges(self):
+        conn = sqlite3.connect(self.db_name)
+        edges = set(conn.execute("""
+            SELECT t.name_ru, d.term_ru FROM theorem_uses_definition e
+            JOIN theorems t ON t.id = e.theorem_id JOIN definitions d ON d.id = e.definition_id
+        """).fetchall())
+        conn.close()
+        return edges
+
+    def test_terms_linker_links_earlier_theorem(self):
+        self._ingest('lecture_1.json', [], OLD_THEOREMS, 'terms')
+        self.assertEqual(self._theorem_edges(), set())
+
+        agent, _ = self._ingest('lecture_2.json', [
+            ("Ограниченное сверху множество", "Множество, все элементы которого не больше некоторого числа"),
+        ], [], 'terms')
+
+        self.assertEqual(self._theorem_edges(), {("Теорема о супремуме", "Ограниченное сверху множество")})
+        self.assertEqual(agent.stats['connections_created'], 1)
+
+    def test_llm_linker_offers_only_new_definitions(self):
+        self._ingest('lecture_1.json', [
+            ("Супремум", "Точная верхняя грань ограниченного сверху множества"),
+        ], OLD_THEOREMS, 'llm')
+
+        _, mock_llm = self._ingest('lecture_2.json', [
+            ("Точная верхняя грань", "Наименьшая из верхних границ множества"),
+        ], [], 'llm', response="- 1: Точная верхняя грань")
+
+        # The new definition's own prompt plus one for the only theorem that mentions it
+        prompts = [call[0][0] for call in mock_llm.call_args_list]
+        theorem_prompts = [prompt for prompt in prompts if "АНАЛИЗИРУЕМЫЙ ТЕКСТ" in prompt]
+        self.assertEqual(len(theorem_prompts), 1)
+        self.assertIn("точную верхнюю грань", theorem_prompts[0])
+        self.assertIn("1. Точная верхняя грань", theorem_prompts[0])
+        self.assertNotIn("Супремум:", theorem_prompts[0])
+        self.assertIn(("Теорема о супремуме", "Точная верхняя грань"), self._theorem_edges())
+
+    def test_earlier_file_of_the_same_run(self):
+        with open(os.path.join(self.lectures_dir, 'lecture_1.json'), 'w', encoding='utf-8') as f:
+            json.dump({
+                'definitions': [{'term_ru': "Супремум", 'definition_ru': "Точная верхняя грань ограниченного сверху множества"}],
+                'theorems': [{'name_ru': name, 'statement_ru': text} for name, text in OLD_THEOREMS],
+            }, f, ensure_ascii=False)
+        _, mock_llm = self._ingest('lecture_2.json', [
+            ("Точная верхняя грань", "Наименьшая из верхних границ множества"),
+        ], [], 'llm', response="- 1: Точная верхняя грань")
+
+        # Theorems of the first file are offered only the second file's definition when it arrives
+        prompts = [call[0][0] for call in mock_llm.call_args_list]
+        theorem_prompts = [prompt for prompt in prompts if "АНАЛИЗИРУЕМЫЙ ТЕКСТ" in prompt]
+        self.assertEqual(len(theorem_prompts), 2)
+        self.assertIn("1. Точная верхняя грань", theorem_prompts[-1])
+        self.assertNotIn("Супремум:", theorem_prompts[-1])
+        self.assertIn(("Теорема о супремуме", "Точная верхняя грань"), self._theorem_edges())
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
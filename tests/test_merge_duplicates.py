@@ -0,0 +1,90 @@
+import unittest
+import sys
+import os
+import tempfile
+
+# Add parent directory to path to import search modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from create_database import create_database
+from db import close_connection, get_connection
+from search_index import forget_indexes
+from mention_index import index_item, items_mentioning
+from term_linker import term_stems
+from merge_duplicates import duplicate_clusters, merge_duplicates
+
+
+class TestMergeDuplicates(unittest.TestCase):
+    """Test cases for collapsing confirmed duplicates (merge_duplicates.py)."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_name = os.path.join(self.tmp_dir.name, 'math_base.db')
+        create_database(self.db_name)
+        self.conn = get_connection(self.db_name)
+        self.conn.executemany("INSERT INTO definitions (term_ru, definition_ru) VALUES (?, ?)", [
+            ("Супремум", "Точная верхняя грань"),
+            ("Отрезок", "Множество точек между a и b"),
+            ("Точная верхняя грань", "Наименьшая верхняя граница"),
+            ("Верхняя грань", "Точная верхняя граница множества"),
+        ])
+        self.conn.executemany("INSERT INTO theorems (name_ru, statement_ru) VALUES (?, ?)", [
+            ("Теорема о супремуме", "Ограниченное множество имеет супремум"),
+            ("Принцип полноты", "Ограниченное множество имеет супремум"),
+            ("Теорема о пределе", "Монотонная ограниченная последовательность сходится"),
+        ])
+        self.conn.executemany("INSERT INTO theorem_uses_definition VALUES (?, ?, ?)", [
+            (1, 1, 'statement'), (2, 3, 'statement'), (3, 4, 'proof'), (3, 2, 'statement'),
+        ])
+        self.conn.executemany("INSERT INTO theorem_uses_theorem VALUES (?, ?, ?)", [
+            (3, 2, 'proof'), (1, 2, 'proof'),
+        ])
+        self.conn.executemany("INSERT INTO definition_uses_definition VALUES (?, ?)", [(4, 1), (3, 2)])
+        self.conn.execute("INSERT INTO source_items VALUES ('lecture_1.json', 'definition', 0, 'h', 4)")
+        index_item(self.conn, 'definition', 3, "Наименьшая верхняя граница")
+        # Definitions 1~3 and 3~4 form one cluster; theorems 1~2 another
+        self.conn.executemany(
+            "INSERT INTO duplicate_candidates (kind, item_id, other_id, score, status) VALUES (?, ?, ?, ?, ?)", [
+                ('definition', 1, 3, 0.8, 'duplicate'), ('definition', 3, 4, 0.7, 'duplicate'),
+                ('definition', 1, 2, 0.4, 'distinct'), ('definition', 2, 4, 0.3, 'pending'),
+                ('theorem', 1, 2, 0.9, 'duplicate'),
+            ])
+        self.conn.commit()
+
+    def tearDown(self):
+        forget_indexes(self.db_name)
+        close_connection()
+        self.tmp_dir.cleanup()
+
+    def _rows(self, query):
+        return sorted(self.conn.execute(query).fetchall())
+
+    def test_clusters(self):
+        self.assertEqual(duplicate_clusters(self.db_name), {'definition': [[1, 3, 4]], 'theorem': [[1, 2]]})
+
+    def test_edges_point_at_canonical_rows(self):
+        self.assertEqual(merge_duplicates(self.db_name), {'definition': 2, 'theorem': 1})
+
+        self.assertEqual(self._rows("SELECT id FROM definitions"), [(1,), (2,)])
+        self.assertEqual(self._rows("SELECT id FROM theorems"), [(1,), (3,)])
+        # 2→3 became 1→1, a duplicate of the existing edge
+        self.assertEqual(self._rows("SELECT * FROM theorem_uses_definition"),
+                         [(1, 1, 'statement'), (3, 1, 'proof'), (3, 2, 'statement')])
+        # 1→2 became a self-loop and was dropped
+        self.assertEqual(self._rows("SELECT * FROM theorem_uses_theorem"), [(3, 1, 'proof')])
+        self.assertEqual(self._rows("SELECT * FROM definition_uses_definition"), [(1, 2)])
+
+        self.assertEqual(self._rows("SELECT item_id FROM source_items"), [(1,)])
+        self.assertEqual(self._rows("SELECT kind, item_id, other_id, status FROM duplicate_candidates"),
+                         [('definition', 1, 2, 'distinct')])
+        self.assertEqual(items_mentioning(self.conn, term_stems("граница"))['definition'], set())
+
+    def test_nothing_to_merge(self):
+        self.conn.execute("DELETE FROM duplicate_candidates WHERE status = 'duplicate'")
+        self.conn.commit()
+        self.assertEqual(merge_duplicates(self.db_name), {'definition': 0, 'theorem': 0})
+        self.assertEqual(len(self._rows("SELECT * FROM theorem_uses_definition")), 4)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
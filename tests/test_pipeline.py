@@ -0,0 +1,131 @@
+import unittest
+import sys
+import os
+import json
+import time
+import sqlite3
+import tempfile
+import threading
+from unittest.mock import patch
+
+# Add parent directory to path to import search modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from create_database import create_database
+from db import close_connection
+from algorithmic_agent import AlgorithmicAgent
+from manifest import STATUS_DONE, STATUS_INSERTED, get_entry
+
+LECTURES = {
+    'lecture_1.json': [
+        ("Отрезок", "Множество точек числовой прямой между a и b включительно"),
+        ("Интервал", "Множество точек числовой прямой строго между a и b"),
+    ],
+    'lecture_2.json': [
+        ("Предел последовательности", "Число a, к которому сколь угодно близко подходят члены последовательности"),
+        ("Отрезок", "Множество точек числовой прямой между a и b включительно"),
+    ],
+    'lecture_3.json': [
+        ("Супремум", "Точная верхняя грань ограниченного сверху множества"),
+        ("Инфимум", "Точная нижняя грань ограниченного снизу множества"),
+    ],
+}
+
+
+class SlowLinker:
+    """LLM stand-in for connection analysis that records how many calls overlap."""
+
+    def __init__(self, response="- 1: Отрезок"):
+        self.response = response
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+
+    def __call__(self, prompt, max_tokens=150):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(0.05)
+        with self.lock:
+            self.running -= 1
+        return self.response
+
+
+class TestLecturePipeline(unittest.TestCase):
+    """Test cases for the asyncio pipeline mode (pipeline.py)."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.lectures_dir = os.path.join(self.tmp_dir.name, 'lectures')
+        os.mkdir(self.lectures_dir)
+        for file_name, definitions in LECTURES.items():
+            with open(os.path.join(self.lectures_dir, file_name), 'w', encoding='utf-8') as f:
+                json.dump({
+                    'definitions': [{'term_ru': term, 'definition_ru': text} for term, text in definitions],
+                    'theorems': [],
+                }, f, ensure_ascii=False)
+
+    def tearDown(self):
+        close_connection()
+        self.tmp_dir.cleanup()
+
+    def _run(self, fail_linking=False, fail_flush=False, db_file=None, **options):
+        db_name = os.path.join(self.tmp_dir.name,
+                               db_file or f"{'pipeline' if options.get('pipeline') else 'sequential'}.db")
+        if not os.path.exists(db_name):
+            create_database(db_name)
+        agent = AlgorithmicAgent(db_name, self.lectures_dir, **options)
+        linker = SlowLinker()
+        with patch('search.verify_with_llm', return_value=False), \
+                patch.object(agent, '_call_llm', side_effect=linker), \
+                patch.object(agent, '_plan_links', side_effect=RuntimeError("failure") if fail_linking else None,
+                             wraps=agent._plan_links), \
+                patch.object(agent.edges, 'flush', side_effect=RuntimeError("failure") if fail_flush else None,
+                             wraps=agent.edges.flush):
+            agent.run()
+
+        conn = sqlite3.connect(db_name)
+        terms = sorted(row[0] for row in conn.execute("SELECT term_ru FROM definitions"))
+        edges = conn.execute("SELECT COUNT(*) FROM definition_uses_definition").fetchone()[0]
+        conn.close()
+        return agent, linker, terms, edges
+
+    def test_same_items_as_sequential(self):
+        _, _, sequential_terms, _ = self._run()
+        agent, _, pipeline_terms, edges = self._run(pipeline=True, workers=3)
+
+        self.assertEqual(pipeline_terms, sequential_terms)
+        self.assertEqual(agent.stats['files_processed'], 3)
+        self.assertEqual(agent.stats['definitions_added'], 5)
+        self.assertEqual(agent.stats['definitions_duplicates'], 1)
+        # Edges found by the link stage are written by the writer thread
+        self.assertEqual(edges, agent.stats['connections_created'])
+        self.assertGreater(edges, 0)
+
+    def _statuses(self, db_file):
+        conn = sqlite3.connect(os.path.join(self.tmp_dir.name, db_file))
+        statuses = {get_entry(conn, os.path.join(self.lectures_dir, name))['status'] for name in LECTURES}
+        conn.close()
+        return statuses
+
+    def test_unlinked_files_are_linked_on_the_next_run(self):
+        for failure in ('fail_linking', 'fail_flush'):
+            db_file = f'{failure}.db'
+            _, _, terms, edges = self._run(pipeline=True, workers=3, db_file=db_file, **{failure: True})
+            self.assertEqual(edges, 0)
+            # The items are committed, but the files are not done without their edges
+            self.assertEqual(self._statuses(db_file), {STATUS_INSERTED})
+
+            agent, _, rerun_terms, edges = self._run(pipeline=True, workers=3, db_file=db_file)
+            self.assertEqual(rerun_terms, terms)
+            self.assertEqual(agent.stats['definitions_processed'], 0)
+            self.assertGreater(edges, 0)
+            self.assertEqual(self._statuses(db_file), {STATUS_DONE})
+
+    def test_link_calls_run_concurrently(self):
+        _, linker, _, _ = self._run(pipeline=True, workers=3)
+        self.assertGreater(linker.max_running, 1)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,121 @@
+import unittest
+import sys
+import os
+import json
+import sqlite3
+import tempfile
+from unittest.mock import patch
+
+# Add parent directory to path to import search modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from create_database import create_database
+from db import close_connection
+from algorithmic_agent import AlgorithmicAgent
+
+DEFINITIONS = [
+    ("Фундаментальная последовательность", "Последовательность, члены которой с ростом номера сколь угодно близки"),
+    ("Ограниченная последовательность", "Последовательность, все члены которой по модулю не больше некоторого числа"),
+    ("Подпоследовательность", "Последовательность, составленная из членов данной с возрастающими номерами"),
+]
+
+LEMMA = ("Лемма Больцано-Вейерштрасса",
+         "Из всякой ограниченной последовательности можно выделить сходящуюся подпоследовательность", None)
+
+CRITERION = ("Критерий Коши",
+             "Числовая последовательность сходится тогда и только тогда, когда она фундаментальна",
+             ' '.join([
+                 "Пусть последовательность фундаментальна. Тогда она ограниченная последовательность.",
+                 "По лемме Больцано-Вейерштрасса из нее можно выделить сходящуюся подпоследовательность.",
+             ] * 8))
+
+
+def answer_proof_chunks(prompt, max_tokens=None):
+    """LLM stand-in: every proof chunk uses the first definition and the first theorem of its lists."""
+    if "ФРАГМЕНТ ДОКАЗАТЕЛЬСТВА" in prompt:
+        return json.dumps({"определения": [1], "теоремы": [1]})
+    return "НЕТ СВЯЗЕЙ"
+
+
+class TestProofLinking(unittest.TestCase):
+    """Test cases for chunked proof analysis (AlgorithmicAgent analyze_proofs)."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_name = os.path.join(self.tmp_dir.name, 'math_base.db')
+        create_database(self.db_name)
+        self.lectures_dir = os.path.join(self.tmp_dir.name, 'lectures')
+        os.mkdir(self.lectures_dir)
+        with open(os.path.join(self.lectures_dir, 'lecture_1.json'), 'w', encoding='utf-8') as f:
+            json.dump({
+                'definitions': [{'term_ru': term, 'definition_ru': text} for term, text in DEFINITIONS],
+                'theorems': [{'name_ru': name, 'statement_ru': statement, 'proof_ru': proof}
+                             for name, statement, proof in (LEMMA, CRITERION)],
+            }, f, ensure_ascii=False)
+
+    def tearDown(self):
+        close_connection()
+        self.tmp_dir.cleanup()
+
+    def _run(self, **options):
+        agent = AlgorithmicAgent(self.db_name, self.lectures_dir, **options)
+        with patch('search.verify_with_llm', return_value=False), \
+                patch('algorithmic_agent.PROOF_CHUNK_TOKENS', 100), \
+                patch('algorithmic_agent.PROOF_CHUNK_OVERLAP_TOKENS', 20), \
+                patch.object(agent, '_call_llm', side_effect=answer_proof_chunks) as mock_llm:
+            agent.run()
+
+        prompts = [call[0][0] for call in mock_llm.call_args_list if "ФРАГМЕНТ ДОКАЗАТЕЛЬСТВА" in call[0][0]]
+        conn = sqlite3.connect(self.db_name)
+        definition_edges = conn.execute("SELECT theorem_id, definition_id, context FROM theorem_uses_definition").fetchall()
+        theorem_edges = conn.execute("SELECT theorem_id, used_theorem_id, context FROM theorem_uses_theorem").fetchall()
+        conn.close()
+        return agent, prompts, definition_edges, theorem_edges
+
+    def test_chunks_are_merged_into_proof_edges(self):
+        agent, prompts, definition_edges, theorem_edges = self._run(analyze_proofs=True)
+
+        # The long proof is split; the lemma has no proof
+        self.assertGreater(len(prompts), 2)
+        self.assertTrue(all("«Критерий Коши»" in prompt for prompt in prompts))
+        # Every chunk reports the same connections, stored once with the 'proof' context
+        self.assertEqual(len(definition_edges), 1)
+        self.assertEqual(definition_edges[0][2], 'proof')
+        self.assertEqual(theorem_edges, [(2, 1, 'proof')])
+        self.assertEqual(agent.stats['connections_created'], 2)
+
+    def test_later_files_do_not_repeat_proofs(self):
+        _, single_file_prompts, _, _ = self._run(analyze_proofs=True)
+        self.db_name = os.path.join(self.tmp_dir.name, 'two_files.db')
+        create_database(self.db_name)
+        with open(os.path.join(self.lectures_dir, 'lecture_2.json'), 'w', encoding='utf-8') as f:
+            json.dump({'definitions': [], 'theorems': [
+                {'name_ru': "Теорема о пределе монотонной последовательности",
+                 'statement_ru': "Монотонная ограниченная последовательность сходится"},
+            ]}, f, ensure_ascii=False)
+        _, prompts, _, theorem_edges = self._run(analyze_proofs=True)
+        # The first file's proof is not analyzed again with the second file
+        self.assertEqual(prompts, single_file_prompts)
+        self.assertEqual(theorem_edges, [(2, 1, 'proof')])
+
+    def test_token_budget_limits_chunks(self):
+        with patch('algorithmic_agent.PROOF_TOKEN_BUDGET', 1):
+            _, prompts, _, _ = self._run(analyze_proofs=True)
+        # Only the first chunk of the proof fits
+        self.assertEqual(len(prompts), 1)
+
+    def test_pipeline_links_proofs(self):
+        _, prompts, definition_edges, theorem_edges = self._run(analyze_proofs=True, pipeline=True, workers=2)
+        self.assertGreater(len(prompts), 2)
+        self.assertEqual(theorem_edges, [(2, 1, 'proof')])
+
+    def test_proofs_not_analyzed_by_default(self):
+        _, prompts, definition_edges, theorem_edges = self._run()
+        self.assertEqual(prompts, [])
+        self.assertEqual(definition_edges, [])
+        # The lemma cited by name is still linked, without the LLM
+        self.assertEqual(theorem_edges, [(2, 1, 'proof')])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
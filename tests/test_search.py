@@ -7,7 +7,19 @@ from unittest.mock import patch, MagicMock
 # Add parent directory to path to import search module
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from search import find_definition, preprocess_text, calculate_tfidf_similarity, get_all_definitions
+import time
+import threading
+
+import tempfile
+
+from search import (
+    find_definition, preprocess_text, calculate_tfidf_similarity, get_all_definitions, verify_candidates,
+    find_definitions_batch, find_theorems_batch, resolve_definition, shortlist_definitions
+)
+from create_database import create_database, migrate_database
+from db import close_connection, get_connection
+from search_index import forget_indexes
+from tests.fixtures import FIXTURE_DB, migrated_fixture
 
 
 class TestSearchFunctions(unittest.TestCase):
@@ -57,10 +69,16 @@ class TestFindDefinitionRealData(unittest.TestCase):
     """Test find_definition function with real data from the database."""
     
     def setUp(self):
-        """Set up test database path."""
-        self.db_name = os.path.join(os.path.dirname(__file__), 'math_base.db')
+        """Set up a migrated copy of the test database."""
         # Verify database exists
-        self.assertTrue(os.path.exists(self.db_name), "Database file not found")
+        self.assertTrue(os.path.exists(FIXTURE_DB), "Database file not found")
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_name = migrated_fixture(self.tmp_dir.name)
+    
+    def tearDown(self):
+        forget_indexes(self.db_name)
+        close_connection(self.db_name)
+        self.tmp_dir.cleanup()
     
     @patch('search.verify_with_llm')
     def test_exact_match_infinite_set(self, mock_llm):
@@ -174,10 +192,15 @@ class TestFindDefinitionRealData(unittest.TestCase):
         conn.close()
         
         try:
+            # Lookups do not migrate an old schema; the agent does at startup
+            with self.assertRaises(RuntimeError):
+                find_definition("Любой термин", "Любое определение", temp_db)
+            migrate_database(get_connection(temp_db))
             result = find_definition("Любой термин", "Любое определение", temp_db)
             self.assertIsNone(result, "Should return None for empty database")
         finally:
             # Clean up
+            close_connection(temp_db)
             if os.path.exists(temp_db):
                 os.remove(temp_db)
     
@@ -194,13 +217,14 @@ class TestFindDefinitionRealData(unittest.TestCase):
         # LLM might not even be called if similarity is too low
         self.assertIsNone(result, "Should filter out low similarity candidates")
     
-    @patch('search.ChatOpenAI')
-    def test_llm_api_error_handling(self, mock_chat):
+    @patch('search.get_gateway')
+    def test_llm_api_error_handling(self, mock_gateway):
         """Test handling of LLM API errors."""
         # Mock LLM to raise an exception
         mock_instance = MagicMock()
-        mock_instance.invoke.side_effect = Exception("API Error")
-        mock_chat.return_value = mock_instance
+        mock_instance.model = "test-model"
+        mock_instance.complete.side_effect = Exception("API Error")
+        mock_gateway.return_value = mock_instance
         
         term = "Бесконечное множество"
         definition = "Множество A называется бесконечным"
@@ -213,8 +237,14 @@ class TestTfidfSimilarity(unittest.TestCase):
     """Test TF-IDF similarity calculation with real data."""
     
     def setUp(self):
-        """Set up test database path."""
-        self.db_name = os.path.join(os.path.dirname(__file__), 'math_base.db')
+        """Set up a migrated copy of the test database."""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_name = migrated_fixture(self.tmp_dir.name)
+    
+    def tearDown(self):
+        forget_indexes(self.db_name)
+        close_connection(self.db_name)
+        self.tmp_dir.cleanup()
     
     def test_calculate_similarity_scores(self):
         """Test TF-IDF similarity calculation."""
@@ -259,6 +289,142 @@ class TestTfidfSimilarity(unittest.TestCase):
         self.assertEqual(scores, [], "Should return empty list for no definitions")
 
 
+class TestBatchLookup(unittest.TestCase):
+    """Test batch duplicate lookup with real data."""
+    
+    def setUp(self):
+        """Set up a migrated copy of the test database."""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_name = migrated_fixture(self.tmp_dir.name)
+    
+    def tearDown(self):
+        forget_indexes(self.db_name)
+        close_connection(self.db_name)
+        self.tmp_dir.cleanup()
+    
+    def test_definitions_batch(self):
+        """Every query should get its own exact match and candidate list."""
+        lookups = find_definitions_batch([
+            ("Бесконечное множество", "Множество $A$ называется \\textit{бесконечным}, если оно эквивалентно своей правильной части. То есть $\\exists B \\subset A, B \\neq A$: $A \\sim B.$"),
+            ("Декартово произведение множеств", "Декартовым произведением называется множество упорядоченных пар"),
+            ("Геометрическая прогрессия", "Последовательность где каждый следующий элемент получается умножением на константу"),
+        ], self.db_name)
+        
+        self.assertEqual(len(lookups), 3)
+        self.assertEqual(lookups[0]['exact_id'], 1)
+        self.assertIsNone(lookups[1]['exact_id'])
+        self.assertEqual(lookups[1]['candidates'][0][0], 2)
+        self.assertLessEqual(len(lookups[1]['candidates']), 2)
+        self.assertEqual(lookups[2]['candidates'], [])
+    
+    def test_theorems_batch(self):
+        """Theorem queries should be ranked against the theorems table."""
+        lookups = find_theorems_batch([
+            ("Лемма Архимеда", "Множество натуральных чисел неограниченно сверху"),
+        ], self.db_name)
+        self.assertEqual(lookups[0]['candidates'][0][0], 4)
+    
+    def test_empty_batch(self):
+        self.assertEqual(find_definitions_batch([], self.db_name), [])
+    
+    @patch('search.verify_with_llm')
+    def test_resolve_uses_precomputed_candidates(self, mock_llm):
+        """resolve_definition verifies the candidates from the batch lookup."""
+        mock_llm.return_value = True
+        term = "Декартово произведение множеств"
+        definition = "Декартовым произведением называется множество упорядоченных пар"
+        lookup = find_definitions_batch([(term, definition)], self.db_name)[0]
+        self.assertEqual(resolve_definition(term, definition, lookup, self.db_name), 2)
+        mock_llm.assert_called()
+
+
+class TestLinkShortlist(unittest.TestCase):
+    """Test the definition shortlist used by the connection prompts."""
+    
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_name = os.path.join(self.tmp_dir.name, 'math_base.db')
+        create_database(self.db_name)
+        conn = sqlite3.connect(self.db_name)
+        # The relevant definitions come after the first 40 rows
+        rows = [(f"Понятие {i}", f"Служебное описание объекта номер {i} из раздела {i % 7}") for i in range(50)]
+        rows += [
+            ("Компактное множество", "Множество, из любого открытого покрытия которого можно выделить конечное подпокрытие"),
+            ("Метрическое пространство", "Множество с функцией расстояния между точками"),
+        ]
+        conn.executemany("INSERT INTO definitions (term_ru, definition_ru) VALUES (?, ?)", rows)
+        conn.commit()
+        conn.close()
+    
+    def tearDown(self):
+        close_connection(self.db_name)
+        self.tmp_dir.cleanup()
+    
+    def test_relevant_definitions_beyond_first_rows(self):
+        shortlists = shortlist_definitions([
+            "Всякое компактное множество в метрическом пространстве замкнуто и ограничено",
+            "Текст без общих слов с определениями",
+        ], self.db_name, top_k=5)
+        
+        terms = [definition['term_ru'] for definition in shortlists[0]]
+        self.assertEqual(len(shortlists), 2)
+        self.assertLessEqual(len(terms), 5)
+        self.assertEqual(terms[0], "Компактное множество")
+        self.assertIn("Метрическое пространство", terms)
+        self.assertEqual(shortlists[1], [])
+    
+    def test_excluded_definition_is_left_out(self):
+        # The excluded row does not take one of the top_k places
+        shortlist = shortlist_definitions(["Компактное множество"], self.db_name, top_k=1, exclude_ids=[51])[0]
+        self.assertEqual([definition['term_ru'] for definition in shortlist], ["Метрическое пространство"])
+
+
+class TestConcurrentVerification(unittest.TestCase):
+    """Test concurrent LLM verification of ranked candidates."""
+    
+    def test_best_ranked_match_wins(self):
+        """A faster lower-ranked confirmation must not beat the top candidate."""
+        def verify(delay, verdict):
+            time.sleep(delay)
+            return verdict
+        
+        candidates = [(1, (0.2, True)), (2, (0.0, True))]
+        self.assertEqual(verify_candidates(candidates, verify), 1)
+    
+    def test_lower_ranked_match_after_rejection(self):
+        """The second candidate is returned once the first one is rejected."""
+        candidates = [(1, (False,)), (2, (True,))]
+        self.assertEqual(verify_candidates(candidates, lambda verdict: verdict), 2)
+    
+    def test_no_match(self):
+        """None is returned when every candidate is rejected."""
+        candidates = [(1, (False,)), (2, (False,))]
+        self.assertIsNone(verify_candidates(candidates, lambda verdict: verdict))
+    
+    def test_checks_run_concurrently(self):
+        """All checks should be in flight at the same time."""
+        barrier = threading.Barrier(2, timeout=5)
+        
+        def verify(verdict):
+            barrier.wait()
+            return verdict
+        
+        candidates = [(1, (False,)), (2, (True,))]
+        self.assertEqual(verify_candidates(candidates, verify), 2)
+    
+    def test_sequential_mode(self):
+        """With concurrent=False candidates are checked in order and checking stops at a match."""
+        calls = []
+        
+        def verify(candidate_id):
+            calls.append(candidate_id)
+            return True
+        
+        candidates = [(1, (1,)), (2, (2,))]
+        self.assertEqual(verify_candidates(candidates, verify, concurrent=False), 1)
+        self.assertEqual(calls, [1])
+
+
 if __name__ == '__main__':
     # Run tests with verbose output
     unittest.main(verbosity=2)
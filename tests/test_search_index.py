@@ -0,0 +1,151 @@
+import unittest
+import sys
+import os
+import sqlite3
+import tempfile
+from unittest.mock import patch
+
+import numpy as np
+
+# Add parent directory to path to import search modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from create_database import create_database
+from search_index import SearchIndex, get_index, index_path
+
+
+class TestSearchIndex(unittest.TestCase):
+    """Test cases for the persistent TF-IDF index."""
+
+    def setUp(self):
+        """Create a small temporary database."""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_name = os.path.join(self.tmp_dir.name, 'math_base.db')
+        create_database(self.db_name)
+        self._insert_definitions([
+            ("Бесконечное множество", "Множество называется бесконечным, если оно эквивалентно своей правильной части"),
+            ("Декартово произведение", "Множество упорядоченных пар элементов двух множеств"),
+            ("Отрезок", "Множество точек числовой прямой между a и b включительно"),
+        ])
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _insert_definitions(self, rows):
+        conn = sqlite3.connect(self.db_name)
+        conn.executemany("INSERT INTO definitions (term_ru, definition_ru) VALUES (?, ?)", rows)
+        conn.commit()
+        conn.close()
+
+    def test_top_k_finds_best_match(self):
+        """The most similar row should be ranked first."""
+        index = get_index(self.db_name, 'definitions')
+        results = index.top_k(
+            {'term_ru': "Произведение множеств", 'definition_ru': "Множество упорядоченных пар"},
+            {'term_ru': 0.4, 'definition_ru': 0.6}, k=2
+        )
+        self.assertEqual(results[0][0], 2)
+        self.assertLessEqual(len(results), 2)
+        self.assertGreaterEqual(results[0][1], results[-1][1])
+
+    def test_sync_picks_up_new_rows(self):
+        """Rows inserted after the index was built should become searchable."""
+        index = get_index(self.db_name, 'definitions')
+        self.assertEqual(len(index), 3)
+
+        self._insert_definitions([("Супремум", "Точная верхняя грань множества")])
+        index = get_index(self.db_name, 'definitions')
+        self.assertEqual(len(index), 4)
+        results = index.top_k({'term_ru': "Супремум"}, {'term_ru': 1.0}, k=1)
+        self.assertEqual(results[0][0], 4)
+
+    def test_appended_rows_match_a_full_build(self):
+        """Rows added after a lookup should score as in an index built at once, without a TF-IDF rebuild."""
+        query = {'term_ru': ["Супремум", "Отрезок"], 'definition_ru': ["Верхняя грань", "Точки прямой"]}
+        weights = {'term_ru': 0.4, 'definition_ru': 0.6}
+        index = get_index(self.db_name, 'definitions')
+        index.similarity(query, weights)
+        self._insert_definitions([("Супремум", "Точная верхняя грань множества")])
+        with patch.object(index, '_tfidf_matrix', wraps=index._tfidf_matrix) as rebuild:
+            index = get_index(self.db_name, 'definitions')
+            scores = index.similarity(query, weights)
+            rebuild.assert_not_called()
+
+        full = SearchIndex('definitions')
+        conn = sqlite3.connect(self.db_name)
+        full.sync(conn)
+        conn.close()
+        np.testing.assert_allclose(scores, full.similarity(query, weights))
+        np.testing.assert_allclose(index.pair_similarity([(1, 3), (3, 4)], weights),
+                                   full.pair_similarity([(1, 3), (3, 4)], weights))
+
+    def test_idf_is_refreshed_in_batches(self):
+        """Until the corpus has grown by REWEIGHT_GROWTH, an insert only adds the norm of its row."""
+        index = get_index(self.db_name, 'definitions')
+        index.top_k({'term_ru': "Отрезок"}, {'term_ru': 1.0})
+        idf = index._field_weights()['term_ru'][0]
+        with patch('search_index.REWEIGHT_GROWTH', 0.5):
+            index.add(4, {'term_ru': "Супремум", 'definition_ru': "Точная верхняя грань"})
+            self.assertEqual(index.top_k({'term_ru': "Супремум"}, {'term_ru': 1.0}, k=1)[0][0], 4)
+            self.assertIs(index._field_weights()['term_ru'][0], idf)
+            self.assertEqual(len(index._field_weights()['term_ru'][1]), 4)
+
+            index.add(5, {'term_ru': "Инфимум", 'definition_ru': "Точная нижняя грань"})
+            self.assertIsNot(index._field_weights()['term_ru'][0], idf)
+
+    def test_add_ignores_known_ids(self):
+        """Adding an already indexed row should not duplicate it."""
+        index = get_index(self.db_name, 'definitions')
+        index.add(1, {'term_ru': "Бесконечное множество", 'definition_ru': "..."})
+        self.assertEqual(len(index), 3)
+
+    def test_save_and_load(self):
+        """An index written to disk should be loaded back with the same rows."""
+        index = get_index(self.db_name, 'definitions')
+        index.save()
+        path = index_path(self.db_name, 'definitions')
+        self.assertTrue(os.path.exists(path))
+
+        loaded = SearchIndex.load('definitions', path)
+        self.assertEqual(loaded.ids, index.ids)
+        self.assertEqual(
+            loaded.top_k({'term_ru': "Отрезок"}, {'term_ru': 1.0}, k=1),
+            index.top_k({'term_ru': "Отрезок"}, {'term_ru': 1.0}, k=1)
+        )
+
+    def test_rebuild_after_delete(self):
+        """Deleted rows should disappear from the index."""
+        get_index(self.db_name, 'definitions')
+        conn = sqlite3.connect(self.db_name)
+        conn.execute("DELETE FROM definitions WHERE id = 2")
+        conn.commit()
+        conn.close()
+
+        index = get_index(self.db_name, 'definitions')
+        self.assertEqual(sorted(index.ids), [1, 3])
+
+    def test_uncommitted_rows_of_another_connection_are_kept(self):
+        """Rows indexed by a writer before its commit should not trigger a rebuild on other connections."""
+        index = get_index(self.db_name, 'definitions')
+        writer = sqlite3.connect(self.db_name)
+        cursor = writer.execute("INSERT INTO definitions (term_ru, definition_ru) VALUES ('Супремум', 'Точная верхняя грань')")
+        index.add(cursor.lastrowid, {'term_ru': 'Супремум', 'definition_ru': 'Точная верхняя грань'})
+
+        with patch.object(index, '_reset', wraps=index._reset) as reset:
+            index = get_index(self.db_name, 'definitions')
+            reset.assert_not_called()
+        self.assertEqual(len(index), 4)
+        self.assertEqual(index.top_k({'term_ru': 'Супремум'}, {'term_ru': 1.0}, k=1)[0][0], 4)
+        snapshot = index.top_k_batch({'term_ru': ['Супремум']}, {'term_ru': 1.0}, k=4, max_id=3)[0]
+        self.assertNotIn(4, [row_id for row_id, _ in snapshot])
+        writer.rollback()
+        writer.close()
+
+    def test_empty_table(self):
+        """An empty table should give no candidates."""
+        index = get_index(self.db_name, 'theorems')
+        self.assertEqual(index.top_k({'name_ru': "Лемма"}, {'name_ru': 1.0}), [])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
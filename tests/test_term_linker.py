@@ -0,0 +1,199 @@
+import unittest
+import sys
+import os
+import json
+import sqlite3
+import tempfile
+from unittest.mock import patch
+
+# Add parent directory to path to import search modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from create_database import create_database
+from db import close_connection, get_connection
+from algorithmic_agent import AlgorithmicAgent
+from text_processing import stem_russian, word_stems
+from term_linker import TermLinker, get_term_linker, forget_term_linkers, term_stems, loses_formula_words
+
+
+class TestRussianStemmer(unittest.TestCase):
+    """Test cases for the Russian stemmer (text_processing.stem_russian)."""
+
+    def test_inflected_forms_share_a_stem(self):
+        for forms in (("множество", "множества", "множестве", "множеством"),
+                      ("компактное", "компактном", "компактного"),
+                      ("ограниченное", "ограниченного", "ограниченным")):
+            self.assertEqual(len({stem_russian(form) for form in forms}), 1, forms)
+
+    def test_different_words_keep_different_stems(self):
+        self.assertNotEqual(stem_russian("предел"), stem_russian("последовательность"))
+
+    def test_word_stems_drops_single_letters_by_default(self):
+        self.assertEqual(word_stems("Множество A"), [stem_russian("множество")])
+        self.assertEqual(len(word_stems("Множество A", min_length=1)), 2)
+
+    def test_term_stems_ignore_formulas_and_notes(self):
+        self.assertEqual(term_stems("Отрезок $[a, b]$"), term_stems("отрезок"))
+        self.assertEqual(term_stems("Верхняя (нижняя) грань"), term_stems("верхняя грань"))
+        self.assertTrue(loses_formula_words("Функция $x^{\\alpha}$"))
+        self.assertFalse(loses_formula_words("Предел (функции)"))
+
+
+class TestTermLinker(unittest.TestCase):
+    """Test cases for the Aho-Corasick term linker (term_linker.py)."""
+
+    def setUp(self):
+        self.linker = TermLinker()
+        self.linker.add(1, "Множество")
+        self.linker.add(2, "Ограниченное сверху множество")
+        self.linker.add(3, "Супремум")
+
+    def test_inflected_multi_word_mention(self):
+        found, ambiguous = self.linker.link("Всякое непустое ограниченное сверху множество имеет супремум")
+        self.assertEqual(found, [2, 3])
+        self.assertEqual(ambiguous, [])
+
+        found, _ = self.linker.link("Супремум ограниченного сверху множества единственен")
+        self.assertEqual(found, [3, 2])
+
+    def test_longest_mention_wins(self):
+        found, _ = self.linker.link("ограниченное сверху множество")
+        self.assertNotIn(1, found)
+
+        found, _ = self.linker.link("множество и ограниченное сверху множество")
+        self.assertEqual(sorted(found), [1, 2])
+
+    def test_shared_term_is_ambiguous(self):
+        self.linker.add(4, "Супремум")
+        found, ambiguous = self.linker.link("супремума")
+        self.assertEqual(found, [])
+        self.assertEqual(ambiguous, [[3, 4]])
+
+        # Excluding one candidate resolves the mention to the other
+        found, ambiguous = self.linker.link("супремума", exclude_id=4)
+        self.assertEqual(found, [3])
+        self.assertEqual(ambiguous, [])
+
+    def test_terms_with_formulas_are_ambiguous(self):
+        self.linker.add(4, "Функция $x^{\\alpha}$")
+        self.linker.add(5, " $x^{-\\frac{m}{n}}$")
+        found, ambiguous = self.linker.link("Всякая непрерывная на отрезке функция ограничена")
+        self.assertEqual(found, [])
+        self.assertEqual(ambiguous, [[4]])
+        self.assertEqual(len(self.linker), 4)
+
+    def test_single_letters_are_part_of_terms(self):
+        self.linker.add(5, "O-большое")
+        found, _ = self.linker.link("большое множество")
+        self.assertEqual(found, [1])
+        found, _ = self.linker.link("это o-большое от g")
+        self.assertEqual(found, [5])
+
+    def test_terms_added_after_a_scan(self):
+        self.linker.link("супремум")
+        self.linker.add(6, "Точная верхняя грань")
+        found, _ = self.linker.link("точной верхней грани")
+        self.assertEqual(found, [6])
+
+    def test_sync_with_database(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_name = os.path.join(tmp_dir, 'math_base.db')
+            create_database(db_name)
+            conn = get_connection(db_name)
+            conn.execute("INSERT INTO definitions (term_ru, definition_ru) VALUES ('Отрезок', '...')")
+            conn.commit()
+            try:
+                linker = get_term_linker(db_name)
+                self.assertEqual(len(linker), 1)
+
+                conn.execute("INSERT INTO definitions (term_ru, definition_ru) VALUES ('Интервал', '...')")
+                conn.commit()
+                self.assertIs(get_term_linker(db_name), linker)
+                self.assertEqual(len(linker), 2)
+                self.assertEqual(linker.link("интервала и отрезок")[0], [2, 1])
+            finally:
+                forget_term_linkers(db_name)
+                close_connection()
+
+
+class TestAgentTermLinking(unittest.TestCase):
+    """Test cases for the 'terms' and 'hybrid' linkers of AlgorithmicAgent."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_name = os.path.join(self.tmp_dir.name, 'math_base.db')
+        create_database(self.db_name)
+        self.lectures_dir = os.path.join(self.tmp_dir.name, 'lectures')
+        os.mkdir(self.lectures_dir)
+        with open(os.path.join(self.lectures_dir, 'lecture_1.json'), 'w', encoding='utf-8') as f:
+            json.dump({
+                'definitions': [
+                    {'term_ru': "Ограниченное сверху множество",
+                     'definition_ru': "Множество, все элементы которого не больше некоторого числа"},
+                    {'term_ru': "Супремум",
+                     'definition_ru': "Наименьшая из верхних границ ограниченного сверху множества"},
+                    {'term_ru': "Последовательность",
+                     'definition_ru': "Функция, заданная на множестве натуральных чисел"},
+                ],
+                'theorems': [
+                    {'name_ru': "Теорема о супремуме",
+                     'statement_ru': "Всякое непустое ограниченное сверху множество вещественных чисел имеет супремум",
+                     'proof_ru': "Рассмотрим последовательность приближений к верхней границе"},
+                ],
+            }, f, ensure_ascii=False)
+
+    def tearDown(self):
+        forget_term_linkers(self.db_name)
+        close_connection()
+        self.tmp_dir.cleanup()
+
+    def _run(self, linker, response="НЕТ СВЯЗЕЙ"):
+        agent = AlgorithmicAgent(self.db_name, self.lectures_dir, linker=linker)
+        with patch('search.verify_with_llm', return_value=False), \
+                patch.object(agent, '_call_llm', return_value=response) as mock_llm:
+            agent.run()
+
+        conn = sqlite3.connect(self.db_name)
+        theorem_edges = set(conn.execute("""
+            SELECT d.term_ru, e.context FROM theorem_uses_definition e JOIN definitions d ON d.id = e.definition_id
+        """).fetchall())
+        definition_edges = set(conn.execute("""
+            SELECT a.term_ru, b.term_ru FROM definition_uses_definition e
+            JOIN definitions a ON a.id = e.definition_id JOIN definitions b ON b.id = e.used_definition_id
+        """).fetchall())
+        conn.close()
+        return agent, mock_llm, theorem_edges, definition_edges
+
+    def test_terms_linker_makes_no_llm_calls(self):
+        agent, mock_llm, theorem_edges, definition_edges = self._run('terms')
+
+        mock_llm.assert_not_called()
+        self.assertEqual(theorem_edges, {("Ограниченное сверху множество", 'statement'),
+                                         ("Супремум", 'statement'),
+                                         ("Последовательность", 'proof')})
+        self.assertEqual(definition_edges, {("Супремум", "Ограниченное сверху множество")})
+        self.assertEqual(agent.stats['connections_created'], 4)
+
+    def test_hybrid_sends_only_ambiguous_items_to_llm(self):
+        conn = get_connection(self.db_name)
+        conn.execute("INSERT INTO definitions (term_ru, definition_ru) VALUES ('Супремум', 'Точная верхняя грань')")
+        conn.commit()
+
+        _, mock_llm, theorem_edges, _ = self._run('hybrid', response="- 1: Супремум")
+
+        # Duplicate checks are rejected, so the lecture's "Супремум" is stored next to the
+        # existing one: the theorem's mention has two candidates and only it goes to the LLM
+        self.assertEqual(mock_llm.call_count, 1)
+        prompt = mock_llm.call_args[0][0]
+        self.assertIn("1. Супремум", prompt)
+        self.assertNotIn("Последовательность:", prompt)
+        self.assertIn(("Ограниченное сверху множество", 'statement'), theorem_edges)
+        self.assertIn(("Супремум", 'statement'), theorem_edges)
+
+    def test_unknown_linker(self):
+        with self.assertRaises(ValueError):
+            AlgorithmicAgent(self.db_name, self.lectures_dir, linker='regex')
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
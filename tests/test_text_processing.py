@@ -0,0 +1,144 @@
+import unittest
+import sys
+import os
+import sqlite3
+import tempfile
+from unittest.mock import patch
+
+# Add parent directory to path to import search modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import text_processing
+from text_processing import normalize_key, preprocess_text, preprocess_texts, clear_preprocess_cache, split_overlapping
+from create_database import create_database, migrate_database
+from search import find_exact_definition, find_exact_theorem, find_definitions_batch
+
+
+class TestNormalizeKey(unittest.TestCase):
+    """Test cases for the exact-match key normalization."""
+
+    def test_case_and_whitespace(self):
+        self.assertEqual(normalize_key("  Бесконечное   МНОЖЕСТВО\n"), "бесконечное множество")
+
+    def test_yo_is_folded(self):
+        self.assertEqual(normalize_key("Ёмкость"), normalize_key("емкость"))
+
+    def test_formatting_commands_are_unwrapped(self):
+        self.assertEqual(normalize_key(r"\textit{Отрезок} $[a,b]$"), "отрезок $[a,b]$")
+        self.assertEqual(normalize_key(r"\emph{Предел}"), normalize_key("предел"))
+
+    def test_latex_spacing(self):
+        self.assertEqual(normalize_key(r"$a\,b$ и~c\quad d"), "$a b$ и c d")
+
+    def test_empty(self):
+        self.assertEqual(normalize_key(None), "")
+        self.assertEqual(normalize_key(""), "")
+
+
+class TestPreprocessCache(unittest.TestCase):
+    """Test cases for the cached batch preprocessing."""
+
+    def setUp(self):
+        clear_preprocess_cache()
+
+    def test_batch_matches_single(self):
+        texts = [r"Множество $A$ \textbf{конечно}", None, "", "Отрезок [a, b]", r"Множество $A$ \textbf{конечно}"]
+        self.assertEqual(preprocess_texts(texts), [preprocess_text(text) for text in texts])
+
+    def test_repeated_texts_are_cleaned_once(self):
+        """Texts already in the cache, or repeated in a batch, should not be cleaned again."""
+        calls = []
+        original = text_processing._clean_text
+
+        def counting_clean(text):
+            calls.append(text)
+            return original(text)
+
+        with patch('text_processing._clean_text', side_effect=counting_clean):
+            preprocess_texts(["Предел функции", "Предел функции", "Отрезок"])
+            preprocess_texts(["Отрезок", "Предел функции"])
+        self.assertEqual(sorted(calls), ["Отрезок", "Предел функции"])
+
+    def test_changed_text_is_recomputed(self):
+        self.assertEqual(preprocess_text("Предел"), "предел")
+        self.assertEqual(preprocess_text("Предел функции"), "предел функции")
+
+
+class TestKeyColumns(unittest.TestCase):
+    """Test cases for the indexed exact-match lookup."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_name = os.path.join(self.tmp_dir.name, 'math_base.db')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_migrate_old_schema(self):
+        """Key columns should be added and backfilled in a database created without them."""
+        conn = sqlite3.connect(self.db_name)
+        conn.execute("CREATE TABLE definitions (id INTEGER PRIMARY KEY, term_ru TEXT, definition_ru TEXT)")
+        conn.execute("CREATE TABLE theorems (id INTEGER PRIMARY KEY, name_ru TEXT, statement_ru TEXT)")
+        conn.execute("INSERT INTO definitions (term_ru, definition_ru) VALUES (?, ?)",
+                     ("Отрезок", "Множество  точек"))
+        migrate_database(conn)
+        row = conn.execute("SELECT term_key, definition_key FROM definitions").fetchone()
+        indexes = {row[1] for row in conn.execute("PRAGMA index_list(definitions)")}
+        conn.close()
+
+        self.assertEqual(row, ("отрезок", "множество точек"))
+        self.assertIn('idx_definitions_keys', indexes)
+
+    def test_exact_lookup_uses_normalized_keys(self):
+        """Formatting-only differences should still be an exact match."""
+        create_database(self.db_name)
+        conn = sqlite3.connect(self.db_name)
+        conn.execute("INSERT INTO definitions (term_ru, definition_ru) VALUES (?, ?)",
+                     ("Отрезок", "Множество точек между a и b"))
+        conn.execute("INSERT INTO theorems (name_ru, statement_ru) VALUES (?, ?)",
+                     ("Лемма Архимеда", "Для любого числа найдется большее натуральное"))
+        # Rows inserted without keys are backfilled by the migration at startup, not by lookups
+        migrate_database(conn)
+        conn.close()
+
+        self.assertEqual(find_exact_definition(r"\textit{отрезок}", "Множество  точек между a и b", self.db_name), 1)
+        self.assertEqual(find_exact_definition("ОТРЕЗОК", db_name=self.db_name), 1)
+        self.assertIsNone(find_exact_definition("Отрезок", "Другой текст", self.db_name))
+        self.assertEqual(find_exact_theorem("лемма архимеда", db_name=self.db_name), 1)
+
+        results = find_definitions_batch([("отрезок", "множество точек между a и b"), ("Интервал", "...")],
+                                         self.db_name)
+        self.assertEqual([result['exact_id'] for result in results], [1, None])
+
+
+
+class TestSplitOverlapping(unittest.TestCase):
+    """Test cases for splitting long proofs into overlapping chunks."""
+
+    def test_short_text_is_one_chunk(self):
+        self.assertEqual(split_overlapping("  Очевидно.  ", 100, 20), ["Очевидно."])
+        self.assertEqual(split_overlapping("", 100, 20), [])
+
+    def test_chunks_overlap_and_end_at_sentences(self):
+        text = ' '.join(f"Шаг {i}: рассмотрим последовательность." for i in range(30))
+        chunks = split_overlapping(text, 200, 50)
+
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertLessEqual(len(chunk), 200)
+        for chunk in chunks[:-1]:
+            self.assertTrue(chunk.endswith('.'))
+        # Every word of the text is in some chunk and consecutive chunks share text
+        for i in range(30):
+            self.assertTrue(any(f"Шаг {i}:" in chunk for chunk in chunks))
+        for previous, chunk in zip(chunks, chunks[1:]):
+            self.assertIn(chunk.split('.')[0], previous)
+
+    def test_text_without_spaces(self):
+        chunks = split_overlapping('a' * 1000, 300, 60)
+        self.assertEqual(''.join(chunks)[:300], 'a' * 300)
+        self.assertTrue(all(len(chunk) <= 300 for chunk in chunks))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,151 @@
+import unittest
+import sys
+import os
+import json
+import sqlite3
+import tempfile
+from unittest.mock import patch
+
+# Add parent directory to path to import search modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from create_database import create_database
+from db import close_connection
+from algorithmic_agent import AlgorithmicAgent
+from term_linker import TheoremNameLinker, THEOREM_WORD, forget_term_linkers, theorem_name_forms, mention_span
+
+
+class TestTheoremNameLinker(unittest.TestCase):
+    """Test cases for finding references to theorems by name (term_linker.TheoremNameLinker)."""
+
+    def setUp(self):
+        self.linker = TheoremNameLinker()
+        self.linker.add(1, "Теорема о вложенных отрезках (лемма Кантора)")
+        self.linker.add(2, "Лемма Архимеда")
+        self.linker.add(3, "Лемма 2")
+
+    def test_name_forms(self):
+        forms = theorem_name_forms("Теорема о вложенных отрезках (лемма Кантора)")
+        self.assertEqual(len(forms), 2)
+        self.assertEqual(forms[1][0], THEOREM_WORD)
+        self.assertEqual(theorem_name_forms("Лемма 2"), [])
+
+    def test_inflected_references(self):
+        found, _ = self.linker.link("По лемме Архимеда найдется натуральное n")
+        self.assertEqual(found, [2])
+        found, _ = self.linker.link("применим теорему о вложенных отрезках")
+        self.assertEqual(found, [1])
+
+    def test_kind_of_statement_is_interchangeable(self):
+        found, _ = self.linker.link("по теореме Кантора")
+        self.assertEqual(found, [1])
+
+    def test_numbered_names_are_not_references(self):
+        found, ambiguous = self.linker.link("Из леммы 2 следует утверждение")
+        self.assertEqual((found, ambiguous), ([], []))
+
+    def test_same_name_is_ambiguous(self):
+        self.linker.add(4, "Теорема Архимеда")
+        found, ambiguous = self.linker.link("по лемме Архимеда")
+        self.assertEqual((found, ambiguous), ([], [[2, 4]]))
+
+    def test_mention_span(self):
+        text = "Тогда по Лемме Архимеда найдется n"
+        mention = self.linker.find(text)[0]
+        start, end = mention_span(text, mention)
+        self.assertEqual(text[start:end], "Лемме Архимеда")
+
+
+class TestAgentTheoremLinking(unittest.TestCase):
+    """Test cases for theorem→theorem edges created by AlgorithmicAgent."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_name = os.path.join(self.tmp_dir.name, 'math_base.db')
+        create_database(self.db_name)
+        self.lectures_dir = os.path.join(self.tmp_dir.name, 'lectures')
+        os.mkdir(self.lectures_dir)
+
+    def tearDown(self):
+        forget_term_linkers(self.db_name)
+        close_connection()
+        self.tmp_dir.cleanup()
+
+    def _ingest(self, file_name, theorems, linker='llm', response="НЕТ СВЯЗЕЙ"):
+        with open(os.path.join(self.lectures_dir, file_name), 'w', encoding='utf-8') as f:
+            json.dump({
+                'definitions': [],
+                'theorems': [{'name_ru': name, 'statement_ru': statement, 'proof_ru': proof}
+                             for name, statement, proof in theorems],
+            }, f, ensure_ascii=False)
+        agent = AlgorithmicAgent(self.db_name, self.lectures_dir, linker=linker)
+        with patch('search.verify_with_llm', return_value=False), \
+                patch.object(agent, '_call_llm', return_value=response) as mock_llm:
+            agent.run()
+        conn = sqlite3.connect(self.db_name)
+        edges = conn.execute("SELECT theorem_id, used_theorem_id, context FROM theorem_uses_theorem").fetchall()
+        conn.close()
+        return agent, mock_llm, sorted(edges)
+
+    def test_reference_in_proof(self):
+        _, mock_llm, edges = self._ingest('lecture_1.json', [
+            ("Лемма Архимеда", "Для любых положительных чисел a и b найдется n, что na > b", None),
+            ("Плотность рациональных чисел", "Между любыми двумя числами есть рациональное",
+             "Пусть a < b. По лемме Архимеда найдется n, что n(b - a) > 1."),
+        ], linker='terms')
+        self.assertEqual(edges, [(2, 1, 'proof')])
+        mock_llm.assert_not_called()
+
+    def test_earlier_theorem_is_linked_to_a_later_one(self):
+        self._ingest('lecture_1.json', [
+            ("Плотность рациональных чисел", "Между любыми двумя числами есть рациональное",
+             "Пусть a < b. По лемме Архимеда найдется n, что n(b - a) > 1."),
+        ], linker='terms')
+        _, _, edges = self._ingest('lecture_2.json', [
+            ("Лемма Архимеда", "Для любых положительных чисел a и b найдется n, что na > b", None),
+        ], linker='terms')
+        self.assertEqual(edges, [(1, 2, 'proof')])
+
+    def test_llm_picks_among_same_named_theorems(self):
+        _, mock_llm, edges = self._ingest('lecture_1.json', [
+            ("Теорема Коши", "Непрерывная на отрезке функция принимает промежуточные значения", None),
+            ("Теорема Коши", "Если f и g дифференцируемы на интервале, то найдется точка с равенством отношений", None),
+            ("Правило Лопиталя", "Предел отношения функций равен пределу отношения производных",
+             "Применим теорему Коши к функциям f и g на отрезке."),
+        ], response="2")
+
+        prompts = [call[0][0] for call in mock_llm.call_args_list if "ТЕОРЕМЫ С ТАКИМ НАЗВАНИЕМ" in call[0][0]]
+        self.assertEqual(len(prompts), 1)
+        self.assertIn("Применим теорему Коши", prompts[0])
+        self.assertEqual(edges, [(3, 2, 'proof')])
+
+    def test_references_are_resolved_once_per_run(self):
+        with open(os.path.join(self.lectures_dir, 'lecture_2.json'), 'w', encoding='utf-8') as f:
+            json.dump({'definitions': [], 'theorems': [
+                {'name_ru': "Лемма Архимеда", 'statement_ru': "Для любых положительных чисел a и b найдется n, что na > b"},
+            ]}, f, ensure_ascii=False)
+        _, mock_llm, edges = self._ingest('lecture_1.json', [
+            ("Теорема Коши", "Непрерывная на отрезке функция принимает промежуточные значения", None),
+            ("Теорема Коши", "Если f и g дифференцируемы на интервале, то найдется точка с равенством отношений", None),
+            ("Правило Лопиталя", "Предел отношения функций равен пределу отношения производных",
+             "Применим теорему Коши к функциям f и g на отрезке."),
+        ], response="2")
+
+        # The reference from the first file is not asked about again with the second one
+        prompts = [call[0][0] for call in mock_llm.call_args_list if "ТЕОРЕМЫ С ТАКИМ НАЗВАНИЕМ" in call[0][0]]
+        self.assertEqual(len(prompts), 1)
+        self.assertEqual(edges, [(3, 2, 'proof')])
+
+    def test_terms_linker_leaves_ambiguous_references(self):
+        _, mock_llm, edges = self._ingest('lecture_1.json', [
+            ("Теорема Коши", "Непрерывная на отрезке функция принимает промежуточные значения", None),
+            ("Теорема Коши", "Если f и g дифференцируемы на интервале, то найдется точка с равенством отношений", None),
+            ("Правило Лопиталя", "Предел отношения функций равен пределу отношения производных",
+             "Применим теорему Коши к функциям f и g на отрезке."),
+        ], linker='terms')
+        self.assertEqual(edges, [])
+        mock_llm.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
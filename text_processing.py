@@ -0,0 +1,241 @@
+import re
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from functools import lru_cache
+
+_WHITESPACE = re.compile(r'\s+')
+
+# Patterns of preprocess_text, compiled once
+_INLINE_FORMULA = re.compile(r'\$.*?\$')
+_ENVIRONMENT = re.compile(r'\\begin\{.*?\}.*?\\end\{.*?\}', flags=re.DOTALL)
+_LATEX_COMMAND = re.compile(r'\\.*?(?=\s|$)')
+_LATEX_CHARACTERS = re.compile(r'[{}\\]')
+_SPECIAL_CHARACTERS = re.compile(r'[^\w\s]')
+
+# Cleaned texts keyed by a hash of the source text; an entry is recomputed only when the text changes
+PREPROCESS_CACHE_SIZE = 50000
+_preprocess_cache = OrderedDict()
+_preprocess_cache_lock = threading.Lock()
+
+
+def _clean_text(text):
+    # Remove LaTeX formulas (everything between $ signs, \[ \], and equation environments)
+    text = _INLINE_FORMULA.sub(' ', text)
+    text = _ENVIRONMENT.sub(' ', text)
+    text = _LATEX_COMMAND.sub(' ', text)  # Remove LaTeX commands
+    text = _LATEX_CHARACTERS.sub(' ', text)  # Remove remaining LaTeX characters
+
+    # Remove special characters and normalize spaces
+    text = _SPECIAL_CHARACTERS.sub(' ', text)
+    text = _WHITESPACE.sub(' ', text)
+
+    return text.lower().strip()
+
+
+def _content_hash(text):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+
+def preprocess_text(text):
+    """
+    Preprocesses text for TF-IDF analysis.
+    Removes LaTeX formulas and special characters, converts to lowercase.
+    """
+    if not text:
+        return ""
+    return preprocess_texts([text])[0]
+
+
+def preprocess_texts(texts):
+    """
+    Preprocesses many texts at once (e.g. all rows of an index build).
+    Texts seen before are taken from the cache, repeated texts are cleaned once.
+
+    Args:
+        texts (list): Source texts, None and empty strings allowed
+
+    Returns:
+        list: Cleaned texts in the same order
+    """
+    keys = [_content_hash(text) if text else None for text in texts]
+    cleaned = {}
+    with _preprocess_cache_lock:
+        for key in keys:
+            if key is not None and key in _preprocess_cache and key not in cleaned:
+                _preprocess_cache.move_to_end(key)
+                cleaned[key] = _preprocess_cache[key]
+
+    missing = {key: text for key, text in zip(keys, texts) if key is not None and key not in cleaned}
+    if missing:
+        computed = {key: _clean_text(text) for key, text in missing.items()}
+        cleaned.update(computed)
+        with _preprocess_cache_lock:
+            _preprocess_cache.update(computed)
+            while len(_preprocess_cache) > PREPROCESS_CACHE_SIZE:
+                _preprocess_cache.popitem(last=False)
+
+    return [cleaned[key] if key is not None else "" for key in keys]
+
+
+def clear_preprocess_cache():
+    """Drops all cached cleaned texts."""
+    with _preprocess_cache_lock:
+        _preprocess_cache.clear()
+
+
+# LaTeX commands that only change formatting; their argument is kept
+_FORMATTING_COMMANDS = re.compile(r'\\(?:textit|textbf|emph|text|mathrm|underline)\s*\{([^{}]*)\}')
+# LaTeX spacing: \, \; \: \! \quad \qquad \newline, escaped space and non-breaking ~
+_LATEX_SPACING = re.compile(r'\\(?:quad|qquad|newline)\b|\\[,;:! ]|~')
+
+
+def normalize_key(text):
+    """
+    Builds the exact-match key of a term, name or text: lowercase, ё → е,
+    formatting commands such as \\textit{...} unwrapped, LaTeX spacing and
+    repeated whitespace collapsed.
+    """
+    if not text:
+        return ""
+    text = unicodedata.normalize('NFC', text).lower().replace('ё', 'е')
+    text = _FORMATTING_COMMANDS.sub(r'\1', text)
+    text = _LATEX_SPACING.sub(' ', text)
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+# --- Russian stemming (Snowball algorithm) ---
+# Endings are (ending, must follow а/я) pairs, longest first within each class
+_VOWELS = set('аеиоуыэюя')
+
+
+def _endings(after_a=(), other=()):
+    pairs = [(ending, True) for ending in after_a] + [(ending, False) for ending in other]
+    return sorted(pairs, key=lambda pair: -len(pair[0]))
+
+
+_PERFECTIVE_GERUND = _endings(('в', 'вши', 'вшись'), ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'))
+_REFLEXIVE = _endings(other=('ся', 'сь'))
+_ADJECTIVE = _endings(other=('ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем', 'им', 'ым',
+                             'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею'))
+_PARTICIPLE = _endings(('ем', 'нн', 'вш', 'ющ', 'щ'), ('ивш', 'ывш', 'ующ'))
+_VERB = _endings(('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет', 'ют', 'ны', 'ть',
+                  'ешь', 'нно'),
+                 ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй', 'ил', 'ыл', 'им', 'ым',
+                  'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь',
+                  'ую', 'ю'))
+_NOUN = _endings(other=('а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии', 'и', 'ией', 'ей',
+                        'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам', 'ом', 'о', 'у', 'ах', 'иях', 'ях',
+                        'ы', 'ь', 'ию', 'ью', 'ю', 'ия', 'ья', 'я'))
+_SUPERLATIVE = _endings(other=('ейш', 'ейше'))
+_DERIVATIONAL = _endings(other=('ост', 'ость'))
+
+_WORD = re.compile(r'[^\W\d_]+')
+
+
+def _region_start(word, start):
+    """Start of the region after the first non-vowel that follows a vowel, from `start` on."""
+    for i in range(start + 1, len(word)):
+        if word[i] not in _VOWELS and word[i - 1] in _VOWELS:
+            return i + 1
+    return len(word)
+
+
+def _strip_ending(word, region, endings):
+    """Removes the longest ending that lies in the region; returns None if none matches."""
+    for ending, after_a in endings:
+        start = len(word) - len(ending)
+        if start < region or not word.endswith(ending):
+            continue
+        if after_a and (start - 1 < region or word[start - 1] not in 'ая'):
+            continue
+        return word[:start]
+    return None
+
+
+@lru_cache(maxsize=100000)
+def stem_russian(word):
+    """
+    Reduces a Russian word to its stem with the Snowball algorithm, so inflected
+    forms such as "компактное", "компактном" and "компактного" share one stem.
+    Words without vowels (and non-Russian words) are returned lowercased.
+    """
+    word = word.lower().replace('ё', 'е')
+    rv = next((i + 1 for i, char in enumerate(word) if char in _VOWELS), None)
+    if rv is None:
+        return word
+    r2 = _region_start(word, _region_start(word, 0))
+
+    # Step 1: perfective gerund, or reflexive followed by adjectival, verb or noun ending
+    stripped = _strip_ending(word, rv, _PERFECTIVE_GERUND)
+    if stripped is None:
+        word = _strip_ending(word, rv, _REFLEXIVE) or word
+        adjective = _strip_ending(word, rv, _ADJECTIVE)
+        if adjective is not None:
+            stripped = _strip_ending(adjective, rv, _PARTICIPLE) or adjective
+        else:
+            stripped = _strip_ending(word, rv, _VERB) or _strip_ending(word, rv, _NOUN) or word
+    word = stripped
+
+    # Step 2: final и
+    if word.endswith('и') and len(word) - 1 >= rv:
+        word = word[:-1]
+
+    # Step 3: derivational ending in R2
+    word = _strip_ending(word, max(rv, r2), _DERIVATIONAL) or word
+
+    # Step 4: double н, superlative ending or soft sign
+    if word.endswith('нн') and len(word) - 2 >= rv:
+        return word[:-1]
+    superlative = _strip_ending(word, rv, _SUPERLATIVE)
+    if superlative is not None:
+        return superlative[:-1] if superlative.endswith('нн') else superlative
+    if word.endswith('ь') and len(word) - 1 >= rv:
+        return word[:-1]
+    return word
+
+
+def word_stems(text, min_length=2):
+    """
+    Splits a text into words of at least `min_length` letters and stems them.
+    LaTeX commands are treated as words; by default single-letter variables are dropped.
+    """
+    if not text:
+        return []
+    return [stem_russian(word) for word in _WORD.findall(text.lower()) if len(word) >= min_length]
+
+
+_SENTENCE_END = re.compile(r'[.;!?]\s|\n')
+
+
+def split_overlapping(text, size, overlap):
+    """
+    Splits a long text into chunks of at most `size` characters, each repeating about
+    the last `overlap` characters of the previous one so that a phrase cut by a chunk
+    border is whole in one of them. Chunks end at a sentence end, or at least a space,
+    in the second half of the window when there is one.
+    """
+    text = (text or '').strip()
+    if len(text) <= size:
+        return [text] if text else []
+    overlap = min(overlap, size // 2)
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + size, len(text))
+        if end < len(text):
+            window = text[start + size // 2:end]
+            boundaries = [match.end() for match in _SENTENCE_END.finditer(window)]
+            if boundaries:
+                end = start + size // 2 + boundaries[-1]
+            elif ' ' in window:
+                end = start + size // 2 + window.rindex(' ') + 1
+        chunks.append(text[start:end].strip())
+        if end >= len(text):
+            break
+        # The next chunk starts at a word border inside the overlap
+        next_start = end - overlap
+        space = text.find(' ', next_start, end)
+        start = space + 1 if space != -1 else next_start
+    return chunks